@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Offline batch extraction of archived line sheets.
+
+Re-running extraction over an archive after a heuristics change used to
+mean uploading every PDF to /extract-assets. This runs `_extract_from_pdf`
+over a directory tree or a manifest instead, one document per task, in a
+pool of worker processes:
+
+- results are appended to <output>/results.jsonl, one JSON object per
+  document ({"path", "status", "pages", "rows", ...}); image files go to
+  <output>/extracted_images, where the rows' filenames point;
+- results.jsonl is also the checkpoint: a run skips every document it
+  already holds a successful result for, with the same size, modification
+  time, EXTRACTION_VERSION and options, so an interrupted run is resumed
+  by starting it again;
+- throughput (documents, pages and images per second) and an ETA are
+  logged as the run goes, and the totals are written to
+  <output>/summary.json at the end.
+
+A worker that dies (e.g. OOM-killed on a huge scan) takes the documents it
+was working on with it. The pool is replaced and every unfinished document
+is submitted again; only those a worker had started (a marker file under
+<output>/.running names them) count an attempt, and a document that was
+running in two pools that broke is recorded as failed. Failed documents are retried on a later run only with
+--retry-failed.
+
+Usage:
+    python batch_extract.py ARCHIVE_DIR --output rebuild/ [--workers 8] [--profile full-fidelity]
+    python batch_extract.py manifest.txt --output rebuild/   # one path per line, relative to the manifest
+
+Configuration (environment variables):
+    EXTRACTION_WORKERS   Default number of worker processes (default: CPU count)
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from observability import get_logger
+
+log = get_logger("batch_extract")
+
+RESULTS_FILE = "results.jsonl"
+SUMMARY_FILE = "summary.json"
+# One file per worker process naming the document it is extracting, relative to the output directory
+RUNNING_DIR = ".running"
+
+# Documents a worker process handles before it is replaced, bounding leaks in native libraries
+MAX_TASKS_PER_WORKER = 50
+# Broken pools a document may have been running in before it is recorded as failed
+MAX_ATTEMPTS = 2
+
+
+def find_pdfs(source: str) -> List[str]:
+    """Absolute paths of the PDFs under a directory, or listed in a manifest file, in a stable order."""
+    if os.path.isdir(source):
+        found = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            found.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".pdf"))
+        return [os.path.abspath(path) for path in found]
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(os.path.abspath(os.path.join(base, line)))
+    return list(dict.fromkeys(paths))
+
+
+def _fingerprint(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(results_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Last recorded result per document path, without its page data.
+
+    A run killed mid-write can leave a partial last line; it is cut off so
+    new results start on a fresh line.
+    """
+    done: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(results_path):
+        return done
+    good_bytes = 0
+    with open(results_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            good_bytes += len(line)
+            done[record["path"]] = {key: value for key, value in record.items() if key not in ("pages", "rows")}
+    if good_bytes != os.path.getsize(results_path):
+        log.warning("Dropping a partial record at the end of the results", path=results_path)
+        with open(results_path, "rb+") as f:
+            f.truncate(good_bytes)
+    return done
+
+
+def _is_current(record: Optional[Dict[str, Any]], path: str, options_key: str, version: int,
+                retry_failed: bool) -> bool:
+    if record is None or record.get("extraction_version") != version or record.get("options") != options_key:
+        return False
+    if record["status"] != "ok":
+        return not retry_failed
+    try:
+        return {"size": record.get("size"), "mtime_ns": record.get("mtime_ns")} == _fingerprint(path)
+    except OSError:
+        return False
+
+
+def _worker_recycling() -> Dict[str, int]:
+    # max_tasks_per_child needs Python 3.11
+    return {"max_tasks_per_child": MAX_TASKS_PER_WORKER} if sys.version_info >= (3, 11) else {}
+
+
+def _init_worker(output_dir: str) -> None:
+    # Image files are written relative to the working directory (EXTRACTED_IMAGES_DIR)
+    os.chdir(output_dir)
+
+
+@contextmanager
+def _running(path: str) -> Iterator[None]:
+    """Mark `path` as started by this worker process until the block exits; the marker survives a crash."""
+    marker = os.path.join(RUNNING_DIR, str(os.getpid()))
+    with open(marker, "w") as f:
+        f.write(path)
+    try:
+        yield
+    finally:
+        os.remove(marker)
+
+
+def _take_running(running_dir: str) -> Set[str]:
+    """Documents whose markers were left behind by the workers of a broken pool; clears the markers."""
+    started = set()
+    if os.path.isdir(running_dir):
+        for name in os.listdir(running_dir):
+            try:
+                with open(os.path.join(running_dir, name)) as f:
+                    started.add(f.read())
+            except OSError:
+                pass
+        shutil.rmtree(running_dir, ignore_errors=True)
+    os.makedirs(running_dir)
+    return started
+
+
+def _extract_document(path: str, pages: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """One document in a worker process; extraction errors become a failed record."""
+    import pdf_extractor
+
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"path": path}
+    with _running(path):
+        try:
+            record.update(_fingerprint(path))
+            page_data, rows = pdf_extractor._extract_from_pdf(path, pages, options)
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+        else:
+            if page_data:
+                record.update(status="ok", page_count=len(page_data),
+                              image_count=sum(row.get("image_count", 0) for row in rows),
+                              pages=page_data, rows=rows)
+            else:
+                record.update(status="failed", error="No pages extracted")
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+class _Progress:
+    """Throughput counters of one run, logged every `interval` seconds."""
+
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.counts = {"ok": 0, "failed": 0, "pages": 0, "images": 0}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.counts[record["status"]] += 1
+        self.counts["pages"] += record.get("page_count", 0)
+        self.counts["images"] += record.get("image_count", 0)
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            log.info("Batch progress", **self.summary())
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        finished = self.counts["ok"] + self.counts["failed"]
+        rate = finished / elapsed
+        return {
+            "documents": self.total,
+            "finished": finished,
+            **self.counts,
+            "elapsed_s": round(elapsed, 1),
+            "docs_per_s": round(rate, 3),
+            "pages_per_s": round(self.counts["pages"] / elapsed, 2),
+            "images_per_s": round(self.counts["images"] / elapsed, 2),
+            "eta_s": round((self.total - finished) / rate) if rate else None,
+        }
+
+
+def run_batch(paths: List[str], output_dir: str, workers: int, options: Dict[str, Any],
+              options_key: str, pages: Optional[str] = None, retry_failed: bool = False,
+              progress_interval: float = 30.0) -> Dict[str, Any]:
+    """Extract every document not already done in `output_dir`; returns the run summary."""
+    import pdf_extractor
+
+    os.makedirs(os.path.join(output_dir, pdf_extractor.EXTRACTED_IMAGES_DIR), exist_ok=True)
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+    checkpoint = load_checkpoint(results_path)
+    version = pdf_extractor.EXTRACTION_VERSION
+    todo = [path for path in paths
+            if not _is_current(checkpoint.get(path), path, options_key, version, retry_failed)]
+    log.info("Starting batch extraction", documents=len(paths), skipped=len(paths) - len(todo),
+             workers=workers, output=output_dir)
+
+    progress = _Progress(len(todo), progress_interval)
+    attempts: Dict[str, int] = {}
+    running_dir = os.path.join(output_dir, RUNNING_DIR)
+    _take_running(running_dir)  # markers of a run that was killed
+    pending = list(reversed(todo))
+
+    with open(results_path, "a") as results:
+        def record(result: Dict[str, Any]) -> None:
+            result.update(extraction_version=version, options=options_key)
+            results.write(json.dumps(result, default=str) + "\n")
+            results.flush()
+            progress.add(result)
+            if result["status"] != "ok":
+                log.warning("Document failed", path=result["path"], error=result.get("error"))
+
+        while pending:
+            # Each pool lives until a worker dies; the documents it held are then retried in a new pool
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(os.path.abspath(output_dir),),
+                                     **_worker_recycling()) as pool:
+                in_flight = {}
+                try:
+                    while pending or in_flight:
+                        # A bounded window keeps memory flat for archives of any size
+                        while pending and len(in_flight) < workers * 2:
+                            future = pool.submit(_extract_document, pending[-1], pages, options)
+                            in_flight[future] = pending.pop()
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            record(future.result())
+                            del in_flight[future]
+                except BrokenProcessPool:
+                    started = _take_running(running_dir)
+                    lost = []
+                    for future, path in in_flight.items():
+                        if future.done() and future.exception() is None:
+                            record(future.result())  # finished before the pool broke
+                        else:
+                            lost.append(path)
+                    log.warning("A worker process died, retrying its documents in a new pool", documents=len(lost),
+                                running=sum(path in started for path in lost))
+                    # Documents still queued did nothing wrong and are resubmitted without an attempt
+                    for path in lost:
+                        if path in started:
+                            attempts[path] = attempts.get(path, 0) + 1
+                            if attempts[path] >= MAX_ATTEMPTS:
+                                record({"path": path, "status": "failed", "error": "Worker process died"})
+                                continue
+                        pending.append(path)
+
+    shutil.rmtree(running_dir, ignore_errors=True)
+    summary = {**progress.summary(), "skipped": len(paths) - len(todo), "extraction_version": version,
+               "options": json.loads(options_key)}
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    log.info("Batch extraction finished", **summary)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Extract assets from every PDF in a directory or manifest.")
+    parser.add_argument("source", help="directory to search for PDFs, or a manifest file with one path per line")
+    parser.add_argument("--output", required=True, help="directory for results.jsonl, images and the summary")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--profile", help="extraction profile (default: EXTRACTION_PROFILE)")
+    parser.add_argument("--color-engine", help="numpy or colorthief")
+    parser.add_argument("--pages", help='1-based page range applied to every document, e.g. "1-3"')
+    parser.add_argument("--retry-failed", action="store_true", help="retry documents that failed in earlier runs")
+    parser.add_argument("--progress-interval", type=float, default=30.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    paths = find_pdfs(args.source)
+    if not paths:
+        parser.error(f"no PDFs found in {args.source}")
+    output_dir = os.path.abspath(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    # The extractor creates its directories relative to the working directory on import
+    os.chdir(output_dir)
+
+    import pdf_extractor
+
+    try:
+        options = pdf_extractor._request_options(args.color_engine, args.profile)
+    except pdf_extractor.ExtractionRequestError as e:
+        parser.error(str(e))
+    options_key = json.dumps({"pages": args.pages, "profile": args.profile or pdf_extractor.DEFAULT_PROFILE,
+                              **options}, sort_keys=True, default=str)
+    summary = run_batch(paths, output_dir, max(1, args.workers), options, options_key, args.pages,
+                        args.retry_failed, args.progress_interval)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
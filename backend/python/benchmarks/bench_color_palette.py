@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy palette engine against ColorThief.
+
+Generates synthetic garment-like images (solid garment on a light background
+with a print and sensor noise), runs both engines on the same JPEG bytes and
+reports time per image plus how far the NumPy dominant colour is from
+ColorThief's (Euclidean RGB distance). Garment and background often cover
+similar areas, where either engine's pick is arbitrary, so the report also
+gives how often ColorThief's dominant colour is among the NumPy top two and
+how closely the two palettes cover each other.
+
+Usage:
+    python benchmarks/bench_color_palette.py [--images 50] [--size 800] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from color_palette import colorthief_palette, extract_palette  # noqa: E402
+
+
+def synthetic_image(rng: np.random.Generator, size: int) -> bytes:
+    """A garment silhouette in a random colour with a contrasting print, as JPEG bytes."""
+    background = tuple(int(v) for v in rng.integers(235, 256, 3))
+    garment = tuple(int(v) for v in rng.integers(0, 256, 3))
+    accent = tuple(int(v) for v in rng.integers(0, 256, 3))
+
+    img = Image.new("RGB", (size, size), background)
+    draw = ImageDraw.Draw(img)
+    s = size / 400
+    body = [(100, 20), (150, 60), (250, 60), (300, 20), (370, 80), (330, 140), (300, 120),
+            (300, 380), (100, 380), (100, 120), (70, 140), (30, 80)]
+    draw.polygon([(x * s, y * s) for x, y in body], fill=garment)
+    draw.ellipse([160 * s, 150 * s, 240 * s, 230 * s], fill=accent)
+
+    pixels = np.asarray(img, dtype=np.int16) + rng.integers(-6, 7, (size, size, 3))
+    buf = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def time_engine(fn, images, palette_size):
+    results, timings = [], []
+    for data in images:
+        started = time.perf_counter()
+        results.append(fn(data, palette_size))
+        timings.append(time.perf_counter() - started)
+    return results, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=50, help="number of synthetic images")
+    parser.add_argument("--size", type=int, default=800, help="image side in pixels")
+    parser.add_argument("--palette-size", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = [synthetic_image(rng, args.size) for _ in range(args.images)]
+
+    numpy_results, numpy_times = time_engine(extract_palette, images, args.palette_size)
+    thief_results, thief_times = time_engine(colorthief_palette, images, args.palette_size)
+
+    distances = np.array([
+        np.linalg.norm(np.subtract(a["dominant_rgb"], b["dominant_rgb"]))
+        for a, b in zip(numpy_results, thief_results)
+    ])
+    in_top2 = np.array([
+        min(np.linalg.norm(np.subtract(p["rgb"], b["dominant_rgb"])) for p in a["palette"][:2]) <= 20
+        for a, b in zip(numpy_results, thief_results)
+    ])
+    # For every ColorThief palette colour, distance to the nearest NumPy palette colour
+    coverage = np.array([
+        min(np.linalg.norm(np.subtract(p["rgb"], q["rgb"])) for p in a["palette"])
+        for a, b in zip(numpy_results, thief_results)
+        for q in b["palette"]
+    ])
+    report = {
+        "images": args.images,
+        "size": args.size,
+        "palette_size": args.palette_size,
+        "numpy_ms_per_image": round(1000 * float(np.mean(numpy_times)), 2),
+        "colorthief_ms_per_image": round(1000 * float(np.mean(thief_times)), 2),
+        "speedup": round(float(np.mean(thief_times) / np.mean(numpy_times)), 1),
+        "dominant_distance_mean": round(float(distances.mean()), 2),
+        "dominant_distance_p95": round(float(np.percentile(distances, 95)), 2),
+        "dominant_within_20": round(float((distances <= 20).mean()), 3),
+        "colorthief_dominant_in_top2": round(float(in_top2.mean()), 3),
+        "palette_coverage_distance_median": round(float(np.median(coverage)), 2),
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
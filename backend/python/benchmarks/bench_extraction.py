@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+End-to-end extraction benchmark on a synthetic, seeded line-sheet corpus.
+
+Builds one PDF per corpus kind (see synthetic_corpus.py) and runs it through
+both pipelines in-process:
+
+    fastapi  pdf_extractor._extract_from_pdf, with the options of --profile
+    flask    image_extraction's /api/extract-pdf through the Flask test client,
+             uploading to moto's in-memory S3 (skipped if moto is not installed)
+
+Every (pipeline, kind) scenario runs in a fresh process, so its peak RSS is
+its own and not a leftover of a previous scenario. For each scenario the
+report gives documents, pages and images per second, p50/p95 latency per
+document, p50/p95/total milliseconds per stage (from the stage timers the
+pipelines already return) and peak RSS.
+
+The report is JSON; pass an earlier report as --baseline to print the
+relative change of every latency and the peak RSS next to the new numbers.
+
+Usage:
+    python benchmarks/bench_extraction.py [--pages 4] [--repeat 3] [--kinds vector,jpeg]
+                                          [--profile balanced] [--pipelines fastapi,flask]
+                                          [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_corpus import KINDS, build_corpus  # noqa: E402
+
+PIPELINES = ("fastapi", "flask")
+_BUCKET = "bench-line-sheets"
+
+
+def _peak_rss_mb() -> float:
+    # Linux keeps ru_maxrss across fork+exec, so a spawned child would report the
+    # parent's peak; the VmHWM of the child's own address space does not carry over
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+    }
+
+
+def _run_fastapi(pdf_bytes: bytes, repeat: int, profile: str):
+    import pdf_extractor
+
+    options = pdf_extractor._request_options(profile=profile)
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages, rows = pdf_extractor._extract_from_pdf(pdf_bytes, options=options)
+        runs.append({
+            "ms": (time.perf_counter() - started) * 1000,
+            "pages": len(pages),
+            "images": sum(len(row.get("tshirt_images", [])) + len(row.get("other_images", [])) for row in rows),
+            "stage_ms": [page.get("stage_ms", {}) for page in pages],
+        })
+    return runs
+
+
+def _run_flask(pdf_bytes: bytes, repeat: int, workdir: str):
+    import moto
+
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION": "us-east-1",
+        "S3_BUCKET_NAME": _BUCKET,
+        "S3_UPLOAD_INDEX": os.path.join(workdir, "index.sqlite"),
+    })
+    with moto.mock_aws():
+        from s3_uploader import make_s3_client
+        make_s3_client("testing", "testing", "us-east-1").create_bucket(Bucket=_BUCKET)
+        import image_extraction
+
+        client = image_extraction.app.test_client()
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.post("/api/extract-pdf", data={"pdf": (io.BytesIO(pdf_bytes), "sheet.pdf")},
+                                   content_type="multipart/form-data")
+            elapsed = (time.perf_counter() - started) * 1000
+            data = response.get_json()
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/extract-pdf returned {response.status_code}: {data}")
+            runs.append({
+                "ms": elapsed,
+                "pages": data["page_count"],
+                "images": len(data["images"]),
+                # One set of stage timings per request in this pipeline
+                "stage_ms": [data.get("stage_ms", {})],
+            })
+    return runs
+
+
+def run_scenario(pipeline: str, pdf_bytes: bytes, repeat: int, profile: str) -> Dict[str, Any]:
+    """Runs in its own process; files the pipelines write land in a temporary directory."""
+    with tempfile.TemporaryDirectory(prefix="bench_extraction_") as workdir:
+        os.chdir(workdir)
+        start_rss = _peak_rss_mb()
+        if pipeline == "fastapi":
+            runs = _run_fastapi(pdf_bytes, repeat, profile)
+        else:
+            runs = _run_flask(pdf_bytes, repeat, workdir)
+
+    seconds = sum(run["ms"] for run in runs) / 1000
+    stages: Dict[str, List[float]] = {}
+    for run in runs:
+        for stage_ms in run["stage_ms"]:
+            for stage, ms in stage_ms.items():
+                stages.setdefault(stage, []).append(ms)
+
+    return {
+        "documents": len(runs),
+        "pages": runs[0]["pages"],
+        "images": runs[0]["images"],
+        "docs_per_s": round(len(runs) / seconds, 3),
+        "pages_per_s": round(sum(run["pages"] for run in runs) / seconds, 2),
+        "images_per_s": round(sum(run["images"] for run in runs) / seconds, 2),
+        "latency_ms": {**_percentiles([run["ms"] for run in runs]),
+                       "mean": round(float(np.mean([run["ms"] for run in runs])), 2)},
+        "stages_ms": {stage: {**_percentiles(values), "total": round(sum(values) / len(runs), 2)}
+                      for stage, values in sorted(stages.items())},
+        "rss_mb": {"start": start_rss, "peak": _peak_rss_mb()},
+    }
+
+
+def _extraction_version() -> int:
+    # Imported in a child: pdf_extractor creates its output directories in the working directory
+    with tempfile.TemporaryDirectory(prefix="bench_extraction_") as workdir:
+        os.chdir(workdir)
+        import pdf_extractor
+        return pdf_extractor.EXTRACTION_VERSION
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _relative(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One line per scenario and metric present in both reports."""
+    lines = []
+    for pipeline, kinds in report["results"].items():
+        for kind, new in kinds.items():
+            old = baseline.get("results", {}).get(pipeline, {}).get(kind)
+            if not isinstance(new, dict) or "latency_ms" not in new or "latency_ms" not in (old or {}):
+                continue
+            metrics = [("latency p50", new["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+                       ("latency p95", new["latency_ms"]["p95"], old["latency_ms"]["p95"]),
+                       ("peak rss", new["rss_mb"]["peak"], old["rss_mb"]["peak"])]
+            metrics += [(f"stage {stage} p50", values["p50"], old["stages_ms"][stage]["p50"])
+                        for stage, values in new["stages_ms"].items() if stage in old["stages_ms"]]
+            for name, new_value, old_value in metrics:
+                lines.append(f"{pipeline:8} {kind:9} {name:28} {old_value:>10} -> {new_value:>10}  "
+                             f"{_relative(new_value, old_value)}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=4, help="pages per corpus document")
+    parser.add_argument("--repeat", type=int, default=3, help="extractions of each document")
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--pipelines", default=",".join(PIPELINES))
+    parser.add_argument("--profile", default="balanced", help="extraction profile for the fastapi pipeline")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    kinds = [kind for kind in args.kinds.split(",") if kind]
+    pipelines = [pipeline for pipeline in args.pipelines.split(",") if pipeline]
+    unknown = set(kinds) - set(KINDS) | set(pipelines) - set(PIPELINES)
+    if unknown:
+        parser.error(f"unknown kind or pipeline: {', '.join(sorted(unknown))}")
+
+    # Keep the per-image log lines of the pipelines out of the report on stdout
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    corpus = build_corpus(seed=args.seed, pages=args.pages, kinds=kinds)
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+        extraction_version = pool.submit(_extraction_version).result()
+
+    report = {
+        "revision": _git_revision(),
+        "extraction_version": extraction_version,
+        "config": {"pages": args.pages, "repeat": args.repeat, "seed": args.seed, "profile": args.profile,
+                   "cpus": os.cpu_count()},
+        "corpus_kb": {kind: round(len(data) / 1024, 1) for kind, data in corpus.items()},
+        "results": {},
+    }
+
+    for pipeline in pipelines:
+        if pipeline == "flask":
+            try:
+                import moto  # noqa: F401
+            except ImportError:
+                report["results"][pipeline] = {"skipped": "moto is not installed"}
+                continue
+        results = report["results"].setdefault(pipeline, {})
+        for kind, pdf_bytes in corpus.items():
+            # A fresh process per scenario keeps peak RSS and warm caches scenario-local
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                try:
+                    results[kind] = pool.submit(run_scenario, pipeline, pdf_bytes, args.repeat,
+                                                args.profile).result()
+                except Exception as e:
+                    results[kind] = {"error": str(e)}
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print("\n".join(compare(report, json.load(f))), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
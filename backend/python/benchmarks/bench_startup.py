@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark of both services.
+
+Starts a fresh interpreter per run and measures, for each service:
+
+    import_ms  importing the service module (app, clients, configuration)
+    live_ms    from interpreter start to the first liveness response
+    ready_ms   from interpreter start to the first readiness response, which
+               runs the deferred external checks (status 200 or 503 alike)
+
+Requests go through the frameworks' in-process test clients, so the numbers
+are the service's own start-up cost without server or network. The upload
+service's bucket is served by a local moto S3 server when moto is installed;
+otherwise set the S3_* and AWS_* variables to a real bucket.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--services pdf_extractor,image_extraction] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Probe paths per service; both use the same probes
+PROBES = {"live": "/livez", "ready": "/readyz"}
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {service_dir!r})
+import {module} as service
+imported = time.perf_counter()
+client = {client}
+live = client.get({live!r})
+lived = time.perf_counter()
+ready = client.get({ready!r})
+readied = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "live_ms": (lived - started) * 1000,
+       "ready_ms": (readied - started) * 1000, "live_status": live.status_code,
+       "ready_status": ready.status_code}}))
+"""
+
+_CLIENTS = {
+    "pdf_extractor": "__import__('fastapi.testclient').testclient.TestClient(service.app)",
+    "image_extraction": "service.app.test_client()",
+}
+_BUCKET = "bench-startup"
+
+
+@contextmanager
+def s3_server() -> Iterator[Optional[Dict[str, str]]]:
+    """Environment pointing the upload service at a bucket on a local moto server, or None without moto."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        yield None
+        return
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        env = {"AWS_ACCESS_KEY_ID": "bench", "AWS_SECRET_ACCESS_KEY": "bench", "AWS_REGION": "us-east-1",
+               "S3_BUCKET_NAME": _BUCKET, "S3_ENDPOINT_URL": f"http://{host}:{port}"}
+        import boto3
+        boto3.client("s3", region_name="us-east-1", endpoint_url=env["S3_ENDPOINT_URL"],
+                     aws_access_key_id="bench", aws_secret_access_key="bench").create_bucket(Bucket=_BUCKET)
+        yield env
+    finally:
+        server.stop()
+
+
+def run_once(module: str, workdir: str, s3_env: Optional[Dict[str, str]]) -> dict:
+    code = _CHILD.format(service_dir=SERVICE_DIR, module=module, client=_CLIENTS[module],
+                         live=PROBES["live"], ready=PROBES["ready"])
+    env = {"LOG_LEVEL": "ERROR", **os.environ, **(s3_env or {})}
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True,
+                         check=True).stdout
+    # The service may print to stdout too; the measurements are the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the extraction services.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--services", default=",".join(_CLIENTS))
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "python": sys.version.split()[0], "services": {}}
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir, s3_server() as s3_env:
+        report["s3"] = "moto server" if s3_env else "environment"
+        for module in args.services.split(","):
+            runs = [run_once(module, workdir, s3_env) for _ in range(args.runs)]
+            report["services"][module] = {
+                **{key: {"p50": round(float(np.median([r[key] for r in runs])), 1),
+                         "max": round(max(r[key] for r in runs), 1)}
+                   for key in ("import_ms", "live_ms", "ready_ms")},
+                "live_status": runs[-1]["live_status"],
+                "ready_status": runs[-1]["ready_status"],
+            }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Synthetic line-sheet PDFs for the benchmarks, generated with PyMuPDF.
+
+Every document is built from a seeded random generator, so the same seed
+and scale always give byte-for-byte comparable inputs across versions.
+
+Kinds:
+    vector    vector-only sheets: garment outlines drawn as filled paths, colour labels as text
+    jpeg      catalogue pages carrying several large embedded JPEG product shots
+    a3_scan   multi-page A3 scans: one full-page JPEG per page, garments only in the pixels
+    swatches  pages with a grid of many small swatch images and colour names
+"""
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image, ImageDraw
+
+KINDS = ("vector", "jpeg", "a3_scan", "swatches")
+
+A4 = fitz.paper_rect("a4")
+A3 = fitz.paper_rect("a3")
+
+COLOUR_NAMES = ["Navy", "Black", "White", "Red", "Olive", "Burgundy", "Sky", "Mustard", "Charcoal", "Coral"]
+
+# T-shirt silhouette on a 400x400 grid
+_TSHIRT = [(100, 20), (150, 60), (250, 60), (300, 20), (370, 80), (330, 140), (300, 120),
+           (300, 380), (100, 380), (100, 120), (70, 140), (30, 80)]
+
+
+def _colour(rng: np.random.Generator) -> Tuple[int, int, int]:
+    return tuple(int(v) for v in rng.integers(0, 256, 3))
+
+
+def _garment_image(rng: np.random.Generator, width: int, height: int, garments: int = 1) -> Image.Image:
+    """Light background with `garments` t-shirt silhouettes, a print on each and sensor noise."""
+    img = Image.new("RGB", (width, height), tuple(int(v) for v in rng.integers(235, 256, 3)))
+    draw = ImageDraw.Draw(img)
+    cols = int(np.ceil(np.sqrt(garments)))
+    rows = int(np.ceil(garments / cols))
+    cell_w, cell_h = width / cols, height / rows
+    for i in range(garments):
+        x0, y0 = (i % cols) * cell_w, (i // cols) * cell_h
+        s = min(cell_w, cell_h) / 440
+        draw.polygon([(x0 + 20 * s + x * s, y0 + 20 * s + y * s) for x, y in _TSHIRT], fill=_colour(rng))
+        draw.ellipse([x0 + 180 * s, y0 + 170 * s, x0 + 260 * s, y0 + 250 * s], fill=_colour(rng))
+    pixels = np.asarray(img, dtype=np.int16) + rng.integers(-5, 6, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _jpeg(img: Image.Image, quality: int = 85) -> bytes:
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _label(page: fitz.Page, point: fitz.Point, rng: np.random.Generator) -> None:
+    page.insert_text(point, str(rng.choice(COLOUR_NAMES)), fontsize=9)
+
+
+def vector_sheet(rng: np.random.Generator, pages: int) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=A4.width, height=A4.height)
+        for i in range(6):
+            x0, y0 = 40 + (i % 3) * 180, 60 + (i // 3) * 360
+            s = 150 / 400
+            outline = [fitz.Point(x0 + x * s, y0 + y * s) for x, y in _TSHIRT + _TSHIRT[:1]]
+            page.draw_polyline(outline, color=(0, 0, 0), fill=tuple(c / 255 for c in _colour(rng)), width=1.5)
+            _label(page, fitz.Point(x0, y0 + 170), rng)
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def jpeg_catalog(rng: np.random.Generator, pages: int, per_page: int = 6, size: int = 1200) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=A4.width, height=A4.height)
+        for i in range(per_page):
+            x0, y0 = 30 + (i % 2) * 280, 40 + (i // 2) * 260
+            page.insert_image(fitz.Rect(x0, y0, x0 + 240, y0 + 240), stream=_jpeg(_garment_image(rng, size, size)))
+            _label(page, fitz.Point(x0, y0 + 252), rng)
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def a3_scans(rng: np.random.Generator, pages: int, dpi: int = 150) -> bytes:
+    doc = fitz.open()
+    width, height = int(A3.width / 72 * dpi), int(A3.height / 72 * dpi)
+    for _ in range(pages):
+        page = doc.new_page(width=A3.width, height=A3.height)
+        page.insert_image(page.rect, stream=_jpeg(_garment_image(rng, width, height, garments=6), quality=80))
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def swatch_pages(rng: np.random.Generator, pages: int, per_page: int = 48) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=A4.width, height=A4.height)
+        for i in range(per_page):
+            x0, y0 = 30 + (i % 6) * 90, 40 + (i // 6) * 95
+            side = int(rng.integers(48, 160))
+            swatch = Image.new("RGB", (side, side), _colour(rng))
+            page.insert_image(fitz.Rect(x0, y0, x0 + 70, y0 + 70), stream=_jpeg(swatch))
+            _label(page, fitz.Point(x0, y0 + 82), rng)
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+_BUILDERS = {
+    "vector": vector_sheet,
+    "jpeg": jpeg_catalog,
+    "a3_scan": a3_scans,
+    "swatches": swatch_pages,
+}
+
+
+def build_corpus(seed: int = 7, pages: int = 4, kinds: List[str] = KINDS) -> Dict[str, bytes]:
+    """{kind: PDF bytes}, each document `pages` pages long."""
+    return {kind: _BUILDERS[kind](np.random.default_rng([seed, KINDS.index(kind)]), pages) for kind in kinds}
@@ -0,0 +1,203 @@
+"""
+Nearest-colour naming against Pantone and an extended named-colour set.
+
+Each palette (Pantone codes, colour names) is converted to CIELAB once and a
+32x32x32 lookup table over RGB is precomputed: every cell holds the index of
+the perceptually nearest palette entry to the cell centre. Naming a colour is
+then a single array index, so thousands of palette entries can be named per
+request in microseconds.
+
+The Pantone set is the one the frontend ships
+(`frontend/src/utils/pantoneColors.json`); set PANTONE_COLORS_PATH to use
+another file of the same shape ({"19-4052 TCX": {"hex": "#...", "name": "..."}}).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from lazy_import import lazy_module
+from observability import get_logger
+
+np = lazy_module("numpy")
+
+log = get_logger("color_naming")
+
+DEFAULT_PANTONE_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "..", "frontend", "src", "utils", "pantoneColors.json"
+))
+
+# RGB levels per LUT axis; cells are 256 / LUT_LEVELS wide
+LUT_LEVELS = 32
+
+# CSS named colours plus common fashion/textile colour names
+NAMED_COLORS = {
+    "Alice Blue": "#F0F8FF", "Antique White": "#FAEBD7", "Aqua": "#00FFFF", "Aquamarine": "#7FFFD4",
+    "Azure": "#F0FFFF", "Beige": "#F5F5DC", "Bisque": "#FFE4C4", "Black": "#000000",
+    "Blanched Almond": "#FFEBCD", "Blue": "#0000FF", "Blue Violet": "#8A2BE2", "Brown": "#A52A2A",
+    "Burlywood": "#DEB887", "Cadet Blue": "#5F9EA0", "Chartreuse": "#7FFF00", "Chocolate": "#D2691E",
+    "Coral": "#FF7F50", "Cornflower Blue": "#6495ED", "Cornsilk": "#FFF8DC", "Crimson": "#DC143C",
+    "Cyan": "#00FFFF", "Dark Blue": "#00008B", "Dark Cyan": "#008B8B", "Dark Goldenrod": "#B8860B",
+    "Dark Gray": "#A9A9A9", "Dark Green": "#006400", "Dark Khaki": "#BDB76B", "Dark Magenta": "#8B008B",
+    "Dark Olive Green": "#556B2F", "Dark Orange": "#FF8C00", "Dark Orchid": "#9932CC", "Dark Red": "#8B0000",
+    "Dark Salmon": "#E9967A", "Dark Sea Green": "#8FBC8F", "Dark Slate Blue": "#483D8B",
+    "Dark Slate Gray": "#2F4F4F", "Dark Turquoise": "#00CED1", "Dark Violet": "#9400D3",
+    "Deep Pink": "#FF1493", "Deep Sky Blue": "#00BFFF", "Dim Gray": "#696969", "Dodger Blue": "#1E90FF",
+    "Firebrick": "#B22222", "Floral White": "#FFFAF0", "Forest Green": "#228B22", "Fuchsia": "#FF00FF",
+    "Gainsboro": "#DCDCDC", "Ghost White": "#F8F8FF", "Gold": "#FFD700", "Goldenrod": "#DAA520",
+    "Gray": "#808080", "Green": "#008000", "Green Yellow": "#ADFF2F", "Honeydew": "#F0FFF0",
+    "Hot Pink": "#FF69B4", "Indian Red": "#CD5C5C", "Indigo": "#4B0082", "Ivory": "#FFFFF0",
+    "Khaki": "#F0E68C", "Lavender": "#E6E6FA", "Lavender Blush": "#FFF0F5", "Lawn Green": "#7CFC00",
+    "Lemon Chiffon": "#FFFACD", "Light Blue": "#ADD8E6", "Light Coral": "#F08080", "Light Cyan": "#E0FFFF",
+    "Light Goldenrod Yellow": "#FAFAD2", "Light Gray": "#D3D3D3", "Light Green": "#90EE90",
+    "Light Pink": "#FFB6C1", "Light Salmon": "#FFA07A", "Light Sea Green": "#20B2AA",
+    "Light Sky Blue": "#87CEFA", "Light Slate Gray": "#778899", "Light Steel Blue": "#B0C4DE",
+    "Light Yellow": "#FFFFE0", "Lime": "#00FF00", "Lime Green": "#32CD32", "Linen": "#FAF0E6",
+    "Magenta": "#FF00FF", "Maroon": "#800000", "Medium Aquamarine": "#66CDAA", "Medium Blue": "#0000CD",
+    "Medium Orchid": "#BA55D3", "Medium Purple": "#9370DB", "Medium Sea Green": "#3CB371",
+    "Medium Slate Blue": "#7B68EE", "Medium Spring Green": "#00FA9A", "Medium Turquoise": "#48D1CC",
+    "Medium Violet Red": "#C71585", "Midnight Blue": "#191970", "Mint Cream": "#F5FFFA",
+    "Misty Rose": "#FFE4E1", "Moccasin": "#FFE4B5", "Navajo White": "#FFDEAD", "Navy": "#000080",
+    "Old Lace": "#FDF5E6", "Olive": "#808000", "Olive Drab": "#6B8E23", "Orange": "#FFA500",
+    "Orange Red": "#FF4500", "Orchid": "#DA70D6", "Pale Goldenrod": "#EEE8AA", "Pale Green": "#98FB98",
+    "Pale Turquoise": "#AFEEEE", "Pale Violet Red": "#DB7093", "Papaya Whip": "#FFEFD5",
+    "Peach Puff": "#FFDAB9", "Peru": "#CD853F", "Pink": "#FFC0CB", "Plum": "#DDA0DD",
+    "Powder Blue": "#B0E0E6", "Purple": "#800080", "Rebecca Purple": "#663399", "Red": "#FF0000",
+    "Rosy Brown": "#BC8F8F", "Royal Blue": "#4169E1", "Saddle Brown": "#8B4513", "Salmon": "#FA8072",
+    "Sandy Brown": "#F4A460", "Sea Green": "#2E8B57", "Seashell": "#FFF5EE", "Sienna": "#A0522D",
+    "Silver": "#C0C0C0", "Sky Blue": "#87CEEB", "Slate Blue": "#6A5ACD", "Slate Gray": "#708090",
+    "Snow": "#FFFAFA", "Spring Green": "#00FF7F", "Steel Blue": "#4682B4", "Tan": "#D2B48C",
+    "Teal": "#008080", "Thistle": "#D8BFD8", "Tomato": "#FF6347", "Turquoise": "#40E0D0",
+    "Violet": "#EE82EE", "Wheat": "#F5DEB3", "White": "#FFFFFF", "White Smoke": "#F5F5F5",
+    "Yellow": "#FFFF00", "Yellow Green": "#9ACD32",
+    # Fashion and textile names
+    "Burgundy": "#800020", "Wine": "#722F37", "Mustard": "#FFDB58", "Camel": "#C19A6B",
+    "Charcoal": "#36454F", "Cream": "#FFFDD0", "Denim": "#1560BD", "Mauve": "#E0B0FF",
+    "Rust": "#B7410E", "Sand": "#C2B280", "Mint": "#98FF98", "Emerald": "#50C878", "Jade": "#00A86B",
+    "Ochre": "#CC7722", "Blush": "#DE5D83", "Mocha": "#967969", "Berry": "#990F4B", "Lilac": "#C8A2C8",
+    "Peach": "#FFE5B4", "Apricot": "#FBCEB1", "Copper": "#B87333", "Bronze": "#CD7F32",
+    "Sapphire": "#0F52BA", "Ruby": "#E0115F", "Scarlet": "#FF2400", "Amber": "#FFBF00",
+    "Lemon": "#FFF44F", "Tangerine": "#F28500", "Amethyst": "#9966CC", "Pearl": "#EAE0C8",
+    "Slate": "#708090", "Rose": "#FF007F", "Vanilla": "#F3E5AB", "Brick": "#CB4154", "Taupe": "#483C32",
+    "Stone": "#928E85", "Oatmeal": "#E0D6C3", "Ecru": "#C2B280", "Heather Grey": "#9AA297",
+}
+
+
+def hex_to_rgb(value: str) -> List[int]:
+    value = value.lstrip("#")
+    return [int(value[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Convert an (N, 3) array of sRGB values (0-255) to CIELAB (D65)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ]).T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def _build_lut(palette_lab: np.ndarray) -> np.ndarray:
+    """Index of the nearest palette entry (in Lab) for every RGB cell centre."""
+    step = 256 // LUT_LEVELS
+    axis = np.arange(LUT_LEVELS) * step + step / 2
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+    grid_lab = rgb_to_lab(grid)
+
+    nearest = np.empty(len(grid_lab), dtype=np.int32)
+    chunk = 4096
+    for start in range(0, len(grid_lab), chunk):
+        block = grid_lab[start:start + chunk]
+        distances = ((block[:, None, :] - palette_lab[None, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + chunk] = distances.argmin(axis=1)
+    return nearest.reshape(LUT_LEVELS, LUT_LEVELS, LUT_LEVELS)
+
+
+class _PaletteIndex:
+    """Entries of one palette plus the LUT pointing into them."""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        self.lut = _build_lut(rgb_to_lab(np.array([e["rgb"] for e in entries]))) if entries else None
+
+    def lookup(self, rgb: np.ndarray) -> np.ndarray:
+        shift = 8 - int(np.log2(LUT_LEVELS))
+        q = np.clip(rgb, 0, 255).astype(np.int32) >> shift
+        return self.lut[q[:, 0], q[:, 1], q[:, 2]]
+
+
+def load_pantone_colors(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Pantone entries as [{"code", "name", "hex", "rgb"}]; empty if the file is missing."""
+    path = path or os.getenv("PANTONE_COLORS_PATH", DEFAULT_PANTONE_PATH)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Could not load Pantone colours", path=path, error=str(e))
+        return []
+    return [
+        {"code": code, "name": info.get("name", code).title(), "hex": info["hex"].upper(), "rgb": hex_to_rgb(info["hex"])}
+        for code, info in data.items()
+        if isinstance(info, dict) and info.get("hex")
+    ]
+
+
+class ColorNamer:
+    """Names RGB colours with the nearest named colour and Pantone code."""
+
+    def __init__(self, pantone_path: Optional[str] = None):
+        self.named = _PaletteIndex([
+            {"name": name, "hex": value, "rgb": hex_to_rgb(value)} for name, value in NAMED_COLORS.items()
+        ])
+        self.pantone = _PaletteIndex(load_pantone_colors(pantone_path))
+
+    def name_many(self, colors: Sequence[Sequence[int]]) -> List[Dict[str, Any]]:
+        """
+        Name many colours at once.
+
+        Returns one dict per colour: {"name", "hex"} of the nearest named
+        colour plus "pantone" ({"code", "name", "hex"}) when Pantone data is
+        loaded.
+        """
+        if len(colors) == 0:
+            return []
+        rgb = np.asarray(colors, dtype=np.int32).reshape(-1, 3)
+        named = self.named.lookup(rgb)
+        pantone = self.pantone.lookup(rgb) if self.pantone.entries else None
+
+        results = []
+        for i, index in enumerate(named):
+            entry = self.named.entries[index]
+            result = {"name": entry["name"], "hex": entry["hex"]}
+            if pantone is not None:
+                match = self.pantone.entries[pantone[i]]
+                result["pantone"] = {"code": match["code"], "name": match["name"], "hex": match["hex"]}
+            results.append(result)
+        return results
+
+    def name(self, color: Sequence[int]) -> Dict[str, Any]:
+        """Name a single RGB colour (see `name_many`)."""
+        return self.name_many([color])[0]
+
+
+_namer: Optional[ColorNamer] = None
+_namer_lock = threading.Lock()
+
+
+def get_color_namer() -> ColorNamer:
+    """Process-wide ColorNamer, built on first use (once per worker process)."""
+    global _namer
+    if _namer is None:
+        with _namer_lock:
+            if _namer is None:
+                _namer = ColorNamer()
+    return _namer
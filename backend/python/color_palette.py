@@ -0,0 +1,166 @@
+"""
+Vectorized dominant-colour and palette extraction.
+
+Replaces per-image ColorThief calls (pure-Python MMCQ) with NumPy: the image
+is decoded once and downsampled, pixels are quantized to 5 bits per channel
+(ColorThief's own resolution) and collapsed into a weighted histogram of
+unique colours, and a weighted k-means over that histogram yields the
+palette. Like ColorThief, near-white and transparent pixels are ignored.
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+# Longest side images are reduced to before clustering
+SAMPLE_SIDE = 96
+# Bits kept per channel when building the colour histogram
+SIGNIFICANT_BITS = 5
+# Pixels brighter than this on every channel are treated as background
+WHITE_THRESHOLD = 250
+ALPHA_THRESHOLD = 125
+
+
+def decode_image(image: Union[bytes, Image.Image], max_side: int = SAMPLE_SIDE) -> Image.Image:
+    """
+    Decode image bytes into a small PIL image. JPEG bytes are decoded at
+    reduced size directly (draft mode), so multi-MB print images are never
+    fully expanded. Already decoded images are only downsampled.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(BytesIO(image))
+        if image.format == "JPEG":
+            image.draft("RGB", (max_side, max_side))
+    if image.width > max_side or image.height > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return image
+
+
+def sample_pixels(image: Union[bytes, Image.Image, np.ndarray], max_side: int = SAMPLE_SIDE) -> np.ndarray:
+    """Return an (N, 3) uint8 array of foreground pixels from bytes, a PIL image or an RGB array."""
+    if isinstance(image, np.ndarray):
+        step = max(1, int(np.ceil(max(image.shape[:2]) / max_side)))
+        array = image[::step, ::step]
+        alpha = None
+    else:
+        pil = decode_image(image, max_side)
+        if pil.mode in ("RGBA", "LA", "PA") or (pil.mode == "P" and "transparency" in pil.info):
+            rgba = np.asarray(pil.convert("RGBA"))
+            array, alpha = rgba[..., :3], rgba[..., 3]
+        else:
+            array, alpha = np.asarray(pil.convert("RGB")), None
+
+    pixels = array.reshape(-1, 3)
+    keep = ~np.all(pixels > WHITE_THRESHOLD, axis=1)
+    if alpha is not None:
+        keep &= alpha.reshape(-1) >= ALPHA_THRESHOLD
+    if not keep.any():
+        # All background: fall back to every pixel rather than returning nothing
+        return pixels
+    return pixels[keep]
+
+
+def _histogram(pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unique quantized colours (as float RGB bin centres) and their pixel counts."""
+    shift = 8 - SIGNIFICANT_BITS
+    quantized = (pixels >> shift).astype(np.int32)
+    packed = (quantized[:, 0] << (2 * SIGNIFICANT_BITS)) | (quantized[:, 1] << SIGNIFICANT_BITS) | quantized[:, 2]
+    codes, counts = np.unique(packed, return_counts=True)
+    mask = (1 << SIGNIFICANT_BITS) - 1
+    colors = np.stack([codes >> (2 * SIGNIFICANT_BITS), (codes >> SIGNIFICANT_BITS) & mask, codes & mask], axis=1)
+    return (colors << shift).astype(np.float32) + (1 << shift) / 2, counts.astype(np.float32)
+
+
+def _weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int,
+                     iterations: int = 12) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    k-means over weighted points with deterministic k-means++ seeding.
+
+    Returns (centers, mass, volume): cluster centres, total weight per cluster
+    and the volume of each cluster's colour box in quantized units.
+    """
+    k = min(k, len(points))
+    # Seed with the most frequent colour, then repeatedly the point farthest
+    # (weighted) from the centres chosen so far.
+    centers = [points[np.argmax(weights)]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        centers.append(points[np.argmax(closest * weights)])
+        closest = np.minimum(closest, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers, dtype=np.float32)
+
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        mass = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=weights * points[:, c], minlength=k) for c in range(3)], axis=1)
+        updated = np.where(mass[:, None] > 0, sums / np.maximum(mass, 1)[:, None], centers)
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    labels = distances.argmin(axis=1)
+    mass = np.bincount(labels, weights=weights, minlength=k)
+    bin_size = 1 << (8 - SIGNIFICANT_BITS)
+    volume = np.ones(k)
+    for c in range(k):
+        members = points[labels == c]
+        if len(members):
+            volume[c] = np.prod(np.ptp(members, axis=0) / bin_size + 1)
+    return centers, mass, volume
+
+
+def extract_palette(image: Union[bytes, Image.Image, np.ndarray], palette_size: int = 5) -> Dict[str, Any]:
+    """
+    Dominant colour and an N-colour palette of an image.
+
+    The palette is ranked like ColorThief's MMCQ, by pixel count times
+    colour-box volume, so a large flat background does not outrank the
+    garment; `weight` is still each colour's plain share of pixels.
+
+    Returns:
+        {"dominant_rgb": (r, g, b),
+         "palette": [{"rgb": [r, g, b], "weight": share_of_pixels}, ...]}
+    """
+    pixels = sample_pixels(image)
+    if len(pixels) == 0:
+        return {"dominant_rgb": None, "palette": []}
+
+    points, weights = _histogram(pixels)
+    centers, mass, volume = _weighted_kmeans(points, weights, max(1, palette_size))
+    order = np.argsort(-(mass * volume), kind="stable")
+    total = float(mass.sum()) or 1.0
+
+    palette: List[Dict[str, Any]] = [
+        {"rgb": [int(round(v)) for v in np.clip(centers[i], 0, 255)], "weight": round(float(mass[i]) / total, 4)}
+        for i in order if mass[i] > 0
+    ]
+    return {"dominant_rgb": tuple(palette[0]["rgb"]), "palette": palette}
+
+
+def colorthief_palette(image_bytes: bytes, palette_size: int = 5) -> Dict[str, Any]:
+    """Same result shape as `extract_palette`, computed with ColorThief (no weights available)."""
+    from colorthief import ColorThief
+
+    thief = ColorThief(BytesIO(image_bytes))
+    dominant = thief.get_color(quality=3)
+    palette: Optional[List[Tuple[int, int, int]]] = None
+    if palette_size > 1:
+        try:
+            palette = thief.get_palette(color_count=palette_size, quality=3)
+        except Exception:
+            palette = None
+    return {
+        "dominant_rgb": dominant,
+        "palette": [{"rgb": list(rgb), "weight": None} for rgb in (palette or [dominant])],
+    }
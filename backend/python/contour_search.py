@@ -0,0 +1,131 @@
+"""
+Vectorized candidate search over the contours of a rasterized page.
+
+Busy artwork yields tens of thousands of contours, most of them glyphs, hatching
+and the inner edges of strokes. Instead of calling `boundingRect`,
+`contourArea` and `matchShapes` on every one of them in Python, the search:
+
+1. uses the RETR_TREE hierarchy to keep only outer boundaries (even nesting
+   depth); odd-depth contours are holes, such as the inner edge of an
+   outlined garment that would otherwise be found a second time,
+2. computes bounding boxes and areas of all remaining contours at once from
+   their concatenated points (`reduceat` + shoelace formula) and drops those
+   failing the size, page-fraction, aspect and area checks,
+3. scores only the survivors against every garment template in one batch
+   (see garment_classifier),
+4. drops matches nested inside another match.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+
+def contour_depths(hierarchy: Optional[np.ndarray], count: int) -> np.ndarray:
+    """Nesting depth of every contour from a cv2.findContours(RETR_TREE) hierarchy."""
+    depths = np.zeros(count, dtype=np.int32)
+    if hierarchy is None or count == 0:
+        return depths
+    parents = hierarchy.reshape(-1, 4)[:, 3]
+    current = parents.copy()
+    while (current >= 0).any():
+        inside = current >= 0
+        depths[inside] += 1
+        current = np.where(inside, parents[np.maximum(current, 0)], -1)
+    return depths
+
+
+def contour_boxes(contours: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bounding boxes (x, y, w, h as cv2.boundingRect) and absolute areas (as
+    cv2.contourArea) of many contours in one pass over their points.
+    """
+    if not len(contours):
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0)
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=len(contours))
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    x_min = np.minimum.reduceat(points[:, 0], starts)
+    y_min = np.minimum.reduceat(points[:, 1], starts)
+    x_max = np.maximum.reduceat(points[:, 0], starts)
+    y_max = np.maximum.reduceat(points[:, 1], starts)
+    boxes = np.stack([x_min, y_min, x_max - x_min + 1, y_max - y_min + 1], axis=1)
+
+    # Shoelace formula; each contour's last point wraps to its first
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    cross = points[:, 0] * points[following, 1] - points[following, 0] * points[:, 1]
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2.0
+    return boxes, areas
+
+
+def find_candidates(contours: Sequence[np.ndarray], hierarchy: Optional[np.ndarray],
+                    classifier: Any, min_size: float, max_width: float, max_height: float,
+                    min_area: float, hu_threshold: float, fourier_threshold: float,
+                    aspect_range: Optional[Tuple[float, float]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Contours that look like one of the classifier's garment templates.
+
+    Args:
+        contours, hierarchy: output of cv2.findContours(..., RETR_TREE, ...)
+        classifier: a GarmentClassifier
+        min_size: minimum width and height of a candidate (pixels)
+        max_width, max_height: maximum width and height of a candidate
+        min_area: minimum contour area (pixels^2)
+        hu_threshold, fourier_threshold: classifier distance thresholds
+        aspect_range: allowed width/height ratio (default: the classifier's)
+
+    Returns:
+        (candidates, stats): candidates as [{"index", "bbox": (x, y, w, h),
+        "garment_type", "score"}] in contour order, and counters of each
+        stage plus the time spent ("contour_ms").
+    """
+    aspect_range = aspect_range or classifier.aspect_range
+    started = time.perf_counter()
+    count = len(contours)
+    outer = np.flatnonzero(contour_depths(hierarchy, count) % 2 == 0) if count else np.zeros(0, dtype=np.int64)
+
+    boxes, areas = contour_boxes([contours[i] for i in outer])
+    if len(boxes):
+        widths, heights = boxes[:, 2], boxes[:, 3]
+        aspect = widths / heights
+        keep = ((widths >= min_size) & (heights >= min_size)
+                & (widths <= max_width) & (heights <= max_height)
+                & (aspect >= aspect_range[0]) & (aspect <= aspect_range[1])
+                & (areas >= min_area))
+    else:
+        keep = np.zeros(0, dtype=bool)
+    survivors = outer[keep]
+    survivor_boxes = boxes[keep]
+
+    results = classifier.classify([contours[i] for i in survivors], hu_threshold, fourier_threshold)
+    matched = [(int(index), box, result) for index, box, result in zip(survivors, survivor_boxes, results)
+               if result is not None]
+
+    # Drop matches nested inside another match
+    matched_set = {index for index, _, _ in matched}
+    parents = hierarchy.reshape(-1, 4)[:, 3] if hierarchy is not None else None
+    candidates = []
+    for index, box, (garment_type, score) in matched:
+        parent = parents[index] if parents is not None else -1
+        while parent >= 0 and parent not in matched_set:
+            parent = parents[parent]
+        if parent >= 0:
+            continue
+        candidates.append({"index": index, "bbox": tuple(int(v) for v in box),
+                           "garment_type": garment_type, "score": score})
+
+    stats = {
+        "contours": count,
+        "outer_contours": int(len(outer)),
+        "prefiltered": int(len(survivors)),
+        "matched": len(candidates),
+        "contour_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return candidates, stats
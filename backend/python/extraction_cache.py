@@ -0,0 +1,202 @@
+"""
+Content-addressed, on-disk cache of PDF extraction results.
+
+Entries are keyed on the SHA-256 of the uploaded PDF plus the extraction
+parameters, so re-uploading the same line sheet returns the stored result
+instead of rasterizing and OCR-ing it again. Each entry is a directory holding
+`result.json` and the extracted image files:
+
+    <root>/<key>/result.json
+    <root>/<key>/images/<filename>
+
+The cache is bounded by total size on disk; the least recently used entries
+are evicted first (entry directory mtime is bumped on every hit).
+
+Configuration (environment variables):
+    EXTRACTION_CACHE_DIR     Cache directory (default: extraction_cache)
+    EXTRACTION_CACHE_MAX_MB  Size limit in MB, 0 disables the cache (default: 1024)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from observability import get_logger
+
+log = get_logger("extraction_cache")
+
+RESULT_FILE = "result.json"
+IMAGES_DIR = "images"
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hard-link `src` to `dst` (instant, no extra space), copying if linking is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class ExtractionCache:
+    """Size-bounded LRU cache of extraction results keyed on PDF content."""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.getenv("EXTRACTION_CACHE_DIR", "extraction_cache")
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size in bytes; last-use time is the entry directory's mtime
+        self._entries: Optional[Dict[str, int]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(pdf_sha256: str, params: Dict[str, Any]) -> str:
+        """Cache key for a PDF hash and the parameters it was extracted with."""
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(f"{pdf_sha256}:{encoded}".encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _load_index(self) -> Dict[str, int]:
+        """Build the in-memory size index from disk on first use."""
+        if self._entries is None:
+            self._entries = {}
+            if os.path.isdir(self.root):
+                for key in os.listdir(self.root):
+                    if key.startswith("."):  # staging directories of in-progress puts
+                        continue
+                    entry_dir = self._entry_dir(key)
+                    if os.path.isfile(os.path.join(entry_dir, RESULT_FILE)):
+                        self._entries[key] = _dir_size(entry_dir)
+        return self._entries
+
+    def get(self, key: str, restore_images_to: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result for `key`, or None on a miss.
+
+        If `restore_images_to` is given, the entry's image files are linked
+        back into that directory so the paths in the result can be served.
+        """
+        if not self.enabled:
+            return None
+
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, RESULT_FILE), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if restore_images_to:
+            images_dir = os.path.join(entry_dir, IMAGES_DIR)
+            if os.path.isdir(images_dir):
+                os.makedirs(restore_images_to, exist_ok=True)
+                for name in os.listdir(images_dir):
+                    target = os.path.join(restore_images_to, name)
+                    if not os.path.exists(target):
+                        _link_or_copy(os.path.join(images_dir, name), target)
+
+        now = time.time()
+        try:
+            os.utime(entry_dir, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict[str, Any], image_paths: Iterable[str] = ()) -> None:
+        """Store `result` and copies of its image files, then evict down to the size limit."""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            images_dir = os.path.join(staging_dir, IMAGES_DIR)
+            os.makedirs(images_dir)
+            for path in image_paths:
+                if os.path.isfile(path):
+                    _link_or_copy(path, os.path.join(images_dir, os.path.basename(path)))
+            with open(os.path.join(staging_dir, RESULT_FILE), "w", encoding="utf-8") as f:
+                json.dump(result, f)
+
+            size = _dir_size(staging_dir)
+            if size > self.max_bytes:
+                log.warning("Extraction result exceeds the cache size limit, not caching", bytes=size)
+                return
+
+            entry_dir = self._entry_dir(key)
+            with self._lock:
+                entries = self._load_index()
+                try:
+                    # Atomic publish; another worker may have stored the same key first
+                    os.rename(staging_dir, entry_dir)
+                except OSError:
+                    return
+                entries[key] = size
+                self._evict(entries)
+        finally:
+            if os.path.isdir(staging_dir):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _evict(self, entries: Dict[str, int]) -> None:
+        """Remove least recently used entries until the cache fits. Caller holds the lock."""
+        total = sum(entries.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(key: str) -> float:
+            try:
+                return os.path.getmtime(self._entry_dir(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(entries, key=last_used):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= entries.pop(key)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size, for monitoring and tuning."""
+        with self._lock:
+            entries = self._load_index() if self.enabled else {}
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "size_bytes": sum(entries.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,152 @@
+"""
+Process-pool extraction engine for the FastAPI PDF extractor.
+
+PDF extraction (rasterization, OpenCV, ColorThief, Tesseract) is CPU bound and
+fully synchronous, so running it on the event loop stalls every other request
+served by the uvicorn worker. The engine runs that work in a pool of worker
+processes instead and bounds the number of jobs that may be in flight at once.
+When the bound is reached new jobs are rejected with `EngineBusyError`, which
+the HTTP layer turns into a 503 with a Retry-After hint.
+
+Configuration (environment variables):
+    EXTRACTION_WORKERS      Number of worker processes (default: CPU count)
+    EXTRACTION_QUEUE_SIZE   Jobs allowed to wait for a free worker (default: 2 x workers)
+    EXTRACTION_RETRY_AFTER  Minimum Retry-After hint in seconds (default: 5)
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class EngineBusyError(Exception):
+    """Raised when the extraction queue is full and a job cannot be accepted."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Extraction queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ExtractionEngine:
+    """
+    Runs extraction jobs in a process pool with a bounded queue.
+
+    A job holds one slot for its whole lifetime (see `slot`). At most
+    `max_workers` jobs run concurrently and up to `queue_size` more may wait;
+    anything beyond that is rejected immediately.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 retry_after: Optional[int] = None):
+        self.max_workers = max(1, max_workers or int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1)))
+        if queue_size is None:
+            queue_size = int(os.getenv("EXTRACTION_QUEUE_SIZE", self.max_workers * 2))
+        self.queue_size = max(0, queue_size)
+        self.retry_after = max(1, retry_after or int(os.getenv("EXTRACTION_RETRY_AFTER", 5)))
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        # Exponentially weighted average job duration, used for Retry-After
+        self._avg_job_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of jobs that may be running or queued."""
+        return self.max_workers + self.queue_size
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps OpenCV/Tesseract state and the event loop's threads
+                # out of the workers; they import the extractor module fresh.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        """Drop a broken pool (e.g. a worker was OOM-killed) so the next job gets a fresh one."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _retry_after_hint(self) -> int:
+        # Rough time until a slot frees up: queued jobs drain at max_workers per average job.
+        backlog = max(1, self._in_flight - self.max_workers + 1)
+        estimate = math.ceil(self._avg_job_seconds * backlog / self.max_workers)
+        return max(self.retry_after, estimate)
+
+    @contextmanager
+    def slot(self):
+        """
+        Reserve a queue slot for one extraction job.
+
+        Raises:
+            EngineBusyError: if the queue is already full
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise EngineBusyError(self._retry_after_hint())
+            self._in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                if self._avg_job_seconds:
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+                else:
+                    self._avg_job_seconds = elapsed
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` in a worker process without taking a queue slot."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run `fn(*args)` in a worker process as a single queued job.
+
+        Raises:
+            EngineBusyError: if the queue is already full
+        """
+        with self.slot():
+            return await self.run(fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue and throughput counters."""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_job_seconds": round(self._avg_job_seconds, 3),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
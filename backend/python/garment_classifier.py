@@ -0,0 +1,240 @@
+"""
+Garment-shape classifier used to pick product images out of a line sheet.
+
+A registry of template outlines (t-shirt, hoodie, polo, bottoms) is turned
+into two descriptor matrices once, when the classifier is built:
+
+- Hu moments, pre-transformed the way cv2.matchShapes(CONTOURS_MATCH_I1)
+  compares them (1 / (sign * log10 |h|)), so the I1 distance to every
+  template is a single broadcast subtraction;
+- Fourier descriptors: the outline resampled to equally spaced points, FFT'd
+  as a complex signal, with the magnitudes of the low frequencies normalised
+  by the first harmonic (translation, scale, rotation, start point and
+  traversal direction invariant).
+
+Candidate contours are scored against all templates in one vectorized
+distance computation. Each distance is normalised by its threshold and the
+two are blended (Fourier descriptors weigh more: Hu moments near zero make
+the I1 distance unstable). A candidate is accepted when the result is below
+1, and its score is 1 - distance (1.0 is a perfect match).
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+# cv2.matchShapes ignores Hu moments smaller than this
+_HU_EPS = 1e-5
+
+# Template outlines (image coordinates, y down). Several outlines may map to
+# the same garment type. The first t-shirt is the original hand-drawn template.
+GARMENT_TEMPLATES: Dict[str, List[List[Tuple[int, int]]]] = {
+    "tshirt": [
+        [(100, 0), (150, 50), (250, 50), (300, 0), (350, 50), (350, 200), (250, 250), (150, 250),
+         (50, 200), (50, 50), (100, 50)],
+        [(150, 0), (200, 30), (250, 0), (330, 20), (400, 110), (350, 150), (310, 120), (310, 440),
+         (90, 440), (90, 120), (50, 150), (0, 110), (70, 20)],
+    ],
+    "hoodie": [
+        [(140, 60), (150, 0), (200, -30), (250, 0), (260, 60), (340, 70), (420, 420), (370, 440),
+         (310, 180), (310, 480), (90, 480), (90, 180), (30, 440), (-20, 420), (60, 70)],
+    ],
+    "polo": [
+        [(150, 0), (165, 45), (200, 25), (235, 45), (250, 0), (330, 20), (395, 100), (350, 135),
+         (310, 110), (310, 440), (90, 440), (90, 110), (50, 135), (5, 100), (70, 20)],
+    ],
+    "bottoms": [
+        # Trousers
+        [(0, 0), (200, 0), (215, 500), (125, 500), (100, 170), (75, 500), (-15, 500)],
+        # Shorts
+        [(0, 0), (200, 0), (225, 180), (120, 195), (100, 110), (80, 195), (-25, 180)],
+    ],
+}
+
+FOURIER_SAMPLES = 128
+FOURIER_TERMS = 12
+# Side of the box outlines are redrawn in before computing Fourier descriptors
+OUTLINE_SIZE = 96
+
+# Blend of the threshold-normalised Hu and Fourier distances
+HU_WEIGHT = 0.3
+FOURIER_WEIGHT = 0.7
+
+
+def _contour_points(contour: np.ndarray) -> np.ndarray:
+    return np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+
+
+def hu_signature(contours: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hu moments of many contours in matchShapes (I1) form.
+
+    Returns:
+        (values, usable): (N, 7) transformed moments and a mask of the
+        moments large enough for matchShapes to compare
+    """
+    if not len(contours):
+        return np.zeros((0, 7)), np.zeros((0, 7), dtype=bool)
+    hu = np.array([cv2.HuMoments(cv2.moments(np.asarray(c, dtype=np.float32).reshape(-1, 1, 2))).ravel()
+                   for c in contours])
+    usable = np.abs(hu) > _HU_EPS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 1.0 / (np.sign(hu) * np.log10(np.abs(hu)))
+    return np.where(usable, values, 0.0), usable
+
+
+def _normalise_outline(contour: np.ndarray, size: int = OUTLINE_SIZE) -> np.ndarray:
+    """
+    Redraw an outline filled, scaled to fit a `size` box, and trace it again.
+    Templates and candidates then share one resolution, so thin details
+    (a trouser crotch, the gap under a sleeve) are smoothed the same way.
+    """
+    points = _contour_points(contour)
+    span = np.ptp(points, axis=0).max()
+    if span <= 0:
+        return points
+    scaled = (points - points.min(axis=0)) * ((size - 8) / span) + 4
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    cv2.fillPoly(canvas, [np.round(scaled).astype(np.int32).reshape(-1, 1, 2)], 255)
+    # Close slits narrower than a couple of pixels, which trace differently at every scale
+    canvas = cv2.morphologyEx(canvas, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+    traced, _ = cv2.findContours(canvas, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return _contour_points(max(traced, key=cv2.contourArea)) if traced else points
+
+
+def fourier_descriptor(contour: np.ndarray, samples: int = FOURIER_SAMPLES, terms: int = FOURIER_TERMS) -> np.ndarray:
+    """Fourier descriptor (length `terms`) of a closed outline, traced at a common resolution."""
+    points = _normalise_outline(contour)
+    closed = np.vstack([points, points[:1]])
+    segment = np.hypot(*np.diff(closed, axis=0).T)
+    perimeter = segment.sum()
+    if len(points) < 3 or perimeter == 0:
+        return np.zeros(terms)
+
+    # Resample at equal arc-length steps
+    arc = np.concatenate(([0.0], np.cumsum(segment)))
+    steps = np.linspace(0, perimeter, samples, endpoint=False)
+    signal = np.interp(steps, arc, closed[:, 0]) + 1j * np.interp(steps, arc, closed[:, 1])
+
+    spectrum = np.abs(np.fft.fft(signal))
+    # |F_k| + |F_-k| does not depend on the direction the outline is traversed
+    magnitudes = spectrum[1:terms + 1] + spectrum[-1:-terms - 1:-1]
+    return magnitudes / magnitudes[0] if magnitudes[0] > 0 else np.zeros(terms)
+
+
+class GarmentClassifier:
+    """
+    Registry of garment templates with precomputed descriptor matrices.
+
+    Usage:
+        classifier = GarmentClassifier()            # built-in templates
+        classifier.register("dress", outline)       # optional extra templates
+        results = classifier.classify(contours)     # [("tshirt", 0.93), None, ...]
+    """
+
+    def __init__(self, templates: Optional[Dict[str, Sequence[Sequence[Tuple[int, int]]]]] = None):
+        self.types: List[str] = []
+        self._outlines: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        for garment_type, outlines in (templates if templates is not None else GARMENT_TEMPLATES).items():
+            for outline in outlines:
+                self._add(garment_type, outline)
+        self._build()
+
+    def _add(self, garment_type: str, outline: Sequence[Tuple[int, int]]) -> None:
+        self.types.append(garment_type)
+        self._outlines.append(np.asarray(outline, dtype=np.float64).reshape(-1, 2))
+
+    def _build(self) -> None:
+        """Precompute the (templates x descriptor) matrices."""
+        self._hu, self._hu_usable = hu_signature(self._outlines)
+        self._fourier = np.array([fourier_descriptor(o) for o in self._outlines]).reshape(-1, FOURIER_TERMS)
+        widths = np.array([np.ptp(o[:, 0]) for o in self._outlines])
+        heights = np.array([np.ptp(o[:, 1]) for o in self._outlines])
+        aspects = widths / np.maximum(heights, 1)
+        self.aspect_range = (float(aspects.min()) * 0.6, float(aspects.max()) / 0.6) if len(aspects) else (0.5, 2.0)
+
+    def register(self, garment_type: str, outline: Sequence[Tuple[int, int]]) -> None:
+        """Add a template outline for `garment_type` and rebuild the descriptor matrices."""
+        with self._lock:
+            self._add(garment_type, outline)
+            self._build()
+
+    def distances(self, contours: Sequence[np.ndarray], hu_threshold: float = 0.15,
+                  fourier_threshold: float = 0.12) -> np.ndarray:
+        """(N contours x T templates) combined, threshold-normalised distances."""
+        if not len(contours) or not self.types:
+            return np.zeros((len(contours), len(self.types)))
+        hu, usable = hu_signature(contours)
+        both = usable[:, None, :] & self._hu_usable[None, :, :]
+        hu_distance = np.where(both, np.abs(hu[:, None, :] - self._hu[None, :, :]), 0.0).sum(axis=2)
+
+        fourier = np.array([fourier_descriptor(c) for c in contours])
+        fourier_distance = np.linalg.norm(fourier[:, None, :] - self._fourier[None, :, :], axis=2)
+        return HU_WEIGHT * hu_distance / hu_threshold + FOURIER_WEIGHT * fourier_distance / fourier_threshold
+
+    def classify(self, contours: Sequence[np.ndarray], hu_threshold: float = 0.15,
+                 fourier_threshold: float = 0.12) -> List[Optional[Tuple[str, float]]]:
+        """
+        Best garment type and score for each contour, or None where no
+        template is close enough.
+        """
+        distances = self.distances(contours, hu_threshold, fourier_threshold)
+        if not distances.size:
+            return [None] * len(contours)
+        best = distances.argmin(axis=1)
+        best_distance = distances[np.arange(len(best)), best]
+        return [
+            (self.types[t], round(float(1.0 - d), 3)) if d < 1.0 else None
+            for t, d in zip(best, best_distance)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"templates": len(self.types), "types": sorted(set(self.types))}
+
+
+def garment_outline(image: Any, max_side: int = 256) -> Optional[np.ndarray]:
+    """
+    Silhouette of the main object of an image against its background, as a
+    contour, or None if there is no clear foreground (e.g. full-bleed photos
+    and fabric swatches). The background colour is taken from the border.
+    """
+    rgb = np.asarray(image.convert("RGB")) if not isinstance(image, np.ndarray) else image
+    height, width = rgb.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        rgb = cv2.resize(rgb, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+    border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]]).astype(np.int16)
+    background = np.median(border, axis=0)
+    # A busy border means the object runs off the image
+    if np.mean(np.abs(border - background).sum(axis=1) > 60) > 0.2:
+        return None
+    mask = (np.abs(rgb.astype(np.int16) - background).sum(axis=2) > 60).astype(np.uint8) * 255
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    outline = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(outline) < 0.1 * mask.shape[0] * mask.shape[1]:
+        return None
+    return outline
+
+
+_classifier: Optional[GarmentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_garment_classifier() -> GarmentClassifier:
+    """Process-wide classifier with the built-in templates."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = GarmentClassifier()
+    return _classifier
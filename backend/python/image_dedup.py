@@ -0,0 +1,220 @@
+"""
+Image de-duplication for the PDF extractor.
+
+Two levels of matching are used:
+
+- Exact: BLAKE2b over the raw image buffer. Buffers are hashed through a
+  memoryview (or row by row for strided NumPy crops), so no copy or repr
+  string of the image is ever built.
+- Perceptual: a 64-bit difference hash (dHash) plus the image's mean colour.
+  Near-identical images, such as a raster crop of a garment that is also
+  embedded as a JPEG, fall within a small Hamming distance and collapse into
+  one result. The mean colour keeps colourways of the same garment, which
+  share a dHash, apart.
+
+`DedupIndex` holds these signatures for one document (across all its pages).
+`PersistentDedupIndex` stores them in SQLite so duplicates can also be found
+across uploads.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from lazy_import import lazy_module
+
+np = lazy_module("numpy")
+
+# dHash is split into four 16-bit bands. Two hashes within Hamming distance 3
+# share at least one band, so bands work as buckets for candidate lookup;
+# larger distances fall back to a scan of the (small) per-document index.
+_BAND_BITS = 16
+_BAND_COUNT = 4
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+# Maximum mean-colour distance (Euclidean, RGB) for a perceptual match
+MAX_MEAN_COLOR_DISTANCE = 10.0
+
+
+def content_hash(data: Any) -> str:
+    """
+    BLAKE2b digest of a bytes-like object or NumPy array without copying it.
+
+    Strided arrays (e.g. a crop view of a page raster) are fed one row at a
+    time, each row being contiguous.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray) and not data.flags.c_contiguous:
+        hasher.update(str(data.shape).encode("ascii"))
+        for row in data:
+            hasher.update(memoryview(np.ascontiguousarray(row)))
+    else:
+        if isinstance(data, np.ndarray):
+            hasher.update(str(data.shape).encode("ascii"))
+        hasher.update(memoryview(data))
+    return hasher.hexdigest()
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash of a PIL image (horizontal gradient signs of a 9x8 thumbnail)."""
+    gray = image.convert("L")
+    if gray.width > 256 or gray.height > 256:
+        # Cheap pre-shrink before the high-quality resize
+        gray.thumbnail((256, 256), Image.NEAREST)
+    small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def mean_color(image: Image.Image) -> Tuple[int, int, int]:
+    """Average RGB colour of a PIL image, computed on a small thumbnail."""
+    small = image.convert("RGB")
+    small.thumbnail((32, 32), Image.NEAREST)
+    mean = np.asarray(small, dtype=np.float32).reshape(-1, 3).mean(axis=0)
+    return tuple(int(round(v)) for v in mean)
+
+
+def image_signature(image: Image.Image) -> Dict[str, Any]:
+    """Perceptual signature stored on each extracted image dict."""
+    return {"phash": f"{dhash(image):016x}", "mean_rgb": list(mean_color(image))}
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(phash: int) -> List[int]:
+    return [(phash >> (i * _BAND_BITS)) & _BAND_MASK for i in range(_BAND_COUNT)]
+
+
+def _colors_close(a, b) -> bool:
+    if a is None or b is None:
+        return True
+    return sum((int(x) - int(y)) ** 2 for x, y in zip(a, b)) <= MAX_MEAN_COLOR_DISTANCE ** 2
+
+
+class DedupIndex:
+    """
+    In-memory index of exact and perceptual image signatures.
+
+    Values are arbitrary (typically the first image dict seen with that
+    signature) and are returned by `find` for duplicates.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        self._exact: Dict[str, Any] = {}
+        self._perceptual: List[Tuple[int, Any, Any]] = []
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(_BAND_COUNT)]
+
+    def find(self, digest: Optional[str], phash: Optional[str] = None, rgb=None) -> Optional[Any]:
+        """Return the value stored for an exact or near-identical image, or None."""
+        if digest and digest in self._exact:
+            return self._exact[digest]
+        if phash is None or self.max_distance < 0:
+            return None
+
+        value = int(phash, 16)
+        if self.max_distance <= 3:
+            candidates = {i for band, bucket in zip(_bands(value), self._bands) for i in bucket.get(band, [])}
+        else:
+            candidates = range(len(self._perceptual))
+        for i in candidates:
+            other, other_rgb, stored = self._perceptual[i]
+            if _hamming(value, other) <= self.max_distance and _colors_close(rgb, other_rgb):
+                return stored
+        return None
+
+    def add(self, digest: Optional[str], phash: Optional[str], stored: Any, rgb=None) -> None:
+        if digest:
+            self._exact.setdefault(digest, stored)
+        if phash is not None:
+            value = int(phash, 16)
+            position = len(self._perceptual)
+            self._perceptual.append((value, rgb, stored))
+            for band, bucket in zip(_bands(value), self._bands):
+                bucket.setdefault(band, []).append(position)
+
+
+class PersistentDedupIndex:
+    """
+    SQLite-backed index of images already written by earlier uploads.
+
+    Each entry holds the filename of the image on disk and the metadata that
+    describes that file (dimensions, format, size, hashes), so a later upload
+    that reuses the file can describe it too. Lookups ignore entries whose
+    file has since been removed.
+    """
+
+    def __init__(self, path: str, max_distance: int = 6):
+        self.path = path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " digest TEXT PRIMARY KEY, phash TEXT, r INTEGER, g INTEGER, b INTEGER,"
+                " band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER, filename TEXT NOT NULL, meta TEXT)"
+            )
+            # Indexes written before the metadata was stored
+            if "meta" not in {row[1] for row in self._conn.execute("PRAGMA table_info(images)")}:
+                self._conn.execute("ALTER TABLE images ADD COLUMN meta TEXT")
+            for i in range(_BAND_COUNT):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS images_band{i} ON images (band{i})")
+
+    def find(self, digest: Optional[str], phash: Optional[str] = None, rgb=None,
+             images_dir: str = "", max_distance: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return {"filename": ..., **metadata} of a stored exact or near-identical image, or None.
+        `max_distance` overrides the index's threshold for this lookup (-1: exact only).
+
+        Entries stored without metadata only match exactly: the caller's own
+        metadata then still describes the (byte-identical) file.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        with self._lock:
+            if digest:
+                row = self._conn.execute("SELECT filename, meta FROM images WHERE digest = ?", (digest,)).fetchone()
+                if row and os.path.exists(os.path.join(images_dir, row[0])):
+                    return {**json.loads(row[1] or "{}"), "filename": row[0]}
+            if phash is None or max_distance < 0:
+                return None
+
+            value = int(phash, 16)
+            # Only band-sharing candidates are checked, so matches beyond
+            # distance 3 are best effort across uploads.
+            bands = _bands(value)
+            rows = self._conn.execute(
+                "SELECT phash, r, g, b, filename, meta FROM images"
+                " WHERE meta IS NOT NULL AND (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)",
+                bands,
+            ).fetchall()
+        for other, r, g, b, filename, meta in rows:
+            if (other and _hamming(value, int(other, 16)) <= max_distance
+                    and _colors_close(rgb, (r, g, b) if r is not None else None)
+                    and os.path.exists(os.path.join(images_dir, filename))):
+                return {**json.loads(meta), "filename": filename}
+        return None
+
+    def add(self, digest: str, phash: Optional[str], filename: str, rgb=None,
+            meta: Optional[Dict[str, Any]] = None) -> None:
+        """Store an image file; `meta` is the metadata a later match copies onto its own image."""
+        bands = _bands(int(phash, 16)) if phash else [None] * _BAND_COUNT
+        r, g, b = rgb if rgb else (None, None, None)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (digest, phash, r, g, b, band0, band1, band2, band3, filename, meta)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, phash, r, g, b, *bands, filename, json.dumps(meta) if meta is not None else None),
+            )
@@ -0,0 +1,141 @@
+"""
+Thumbnail and preview derivatives of extracted images.
+
+Line-sheet grids only need small images, but clients were given the original
+embedded image (often a print-resolution JPEG of several MB) or a full-zoom
+raster crop. Derivatives are produced once, at extraction time, at a few
+fixed sizes, and stored next to the original:
+
+- the longest side is scaled to each size in DERIVATIVE_SIZES; sizes the
+  original does not exceed are skipped (clients fall back to the original);
+- JPEG sources are decoded at a reduced scale (Pillow draft mode, i.e. the
+  decoder's DCT scaling) just large enough for the biggest derivative, so
+  the full-resolution image is never decoded;
+- each size is resized from the next larger one, not from the original;
+- WebP is written when Pillow supports it, JPEG otherwise.
+
+Configuration (environment variables):
+    IMAGE_DERIVATIVE_SIZES    name:longest side pairs (default: thumb:256,preview:1024)
+    IMAGE_DERIVATIVE_FORMAT   webp or jpeg (default: webp)
+    IMAGE_DERIVATIVE_QUALITY  Encoder quality (default: 80)
+"""
+
+import os
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple, Union
+
+from PIL import Image, features
+
+from observability import get_logger
+
+log = get_logger("image_derivatives")
+
+
+def _parse_sizes(spec: str) -> Dict[str, int]:
+    sizes = {}
+    for part in spec.split(","):
+        name, _, size = part.strip().partition(":")
+        if name and size.isdigit():
+            sizes[name] = int(size)
+    return dict(sorted(sizes.items(), key=lambda item: item[1]))
+
+
+DERIVATIVE_SIZES = _parse_sizes(os.getenv("IMAGE_DERIVATIVE_SIZES", "thumb:256,preview:1024"))
+DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", 80))
+_requested_format = os.getenv("IMAGE_DERIVATIVE_FORMAT", "webp").lower()
+DERIVATIVE_FORMAT = "webp" if _requested_format == "webp" and features.check("webp") else "jpeg"
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def derivative_size(width: int, height: int, longest_side: int) -> Optional[Tuple[int, int]]:
+    """Size of a derivative with the given longest side, or None if the original is not larger."""
+    longest = max(width, height)
+    if longest <= longest_side:
+        return None
+    scale = longest_side / float(longest)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def planned_derivatives(width: int, height: int,
+                        sizes: Optional[Dict[str, int]] = None) -> Dict[str, Tuple[int, int]]:
+    """Derivatives an image of this size gets, without decoding it: {name: (width, height)}."""
+    sizes = DERIVATIVE_SIZES if sizes is None else sizes
+    planned = {name: derivative_size(width, height, side) for name, side in sizes.items()}
+    return {name: size for name, size in planned.items() if size}
+
+
+def derivative_name(stem: str, name: str, fmt: str = DERIVATIVE_FORMAT) -> str:
+    """File name (or key suffix) of a derivative: <stem>_<name>.<ext>"""
+    return f"{stem}_{name}.{_EXTENSIONS[fmt]}"
+
+
+def _open(source: Union[bytes, Image.Image], longest_side: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Decoded image (possibly at a reduced scale) and the size of the original."""
+    if isinstance(source, Image.Image):
+        return source, source.size
+    image = Image.open(BytesIO(source))
+    original_size = image.size
+    if image.format == "JPEG":
+        # Let the decoder downscale by up to 8x while staying above the largest derivative
+        scale = longest_side / float(max(image.size))
+        image.draft("RGB", (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    image.load()
+    return image, original_size
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    out = BytesIO()
+    if fmt == "webp":
+        image.save(out, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def _encodable(image: Image.Image, fmt: str) -> Image.Image:
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha and fmt == "webp":
+        return image if image.mode == "RGBA" else image.convert("RGBA")
+    if has_alpha:
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def make_derivatives(source: Union[bytes, Image.Image], sizes: Optional[Dict[str, int]] = None,
+                     fmt: str = DERIVATIVE_FORMAT, quality: int = DERIVATIVE_QUALITY) -> Dict[str, Dict[str, Any]]:
+    """
+    Encode the derivatives of an image given as encoded bytes or a decoded PIL image.
+
+    Returns:
+        {name: {"data": bytes, "width", "height", "format", "mime"}} for each
+        size smaller than the original; empty if the image cannot be decoded
+    """
+    sizes = DERIVATIVE_SIZES if sizes is None else sizes
+    if not sizes:
+        return {}
+    try:
+        image, (width, height) = _open(source, max(sizes.values()))
+    except Exception as e:
+        log.warning("Could not decode image for derivatives", error=str(e))
+        return {}
+
+    derivatives = {}
+    current = _encodable(image, fmt)
+    # Largest first, each resized from the previous one
+    for name, side in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        target = derivative_size(width, height, side)
+        if target is None:
+            continue
+        current = current.resize(target, Image.LANCZOS, reducing_gap=2.0)
+        derivatives[name] = {
+            "data": _encode(current, fmt, quality),
+            "width": current.width,
+            "height": current.height,
+            "format": fmt,
+            "mime": f"image/{fmt}",
+        }
+    return derivatives
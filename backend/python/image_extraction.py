@@ -1,37 +1,49 @@
 import os
-from flask import Flask, request, jsonify, send_file, redirect
+import time
+import logging
+from flask import Flask, request, jsonify, send_file, redirect, g, Response
 from flask_cors import CORS
-import fitz  # PyMuPDF
 from werkzeug.utils import secure_filename
-import boto3
 from botocore.exceptions import ClientError
 from io import BytesIO
 from dotenv import load_dotenv
-import uuid
+
+from s3_uploader import S3Uploader, UploadIndex, UPLOAD_INDEX_PATH, content_key, make_s3_client
+from presign_cache import PresignCache
+from image_derivatives import DERIVATIVE_FORMAT, derivative_name, make_derivatives, planned_derivatives
+from observability import get_logger, metrics_payload, observe_stages, StageTimer, REQUEST_SECONDS, IMAGES_TOTAL
+from lazy_import import lazy_module, load_modules
+from readiness import Readiness, warm_up
+
+log = get_logger("image_extraction")
+
+# Imported on first use rather than at start-up (see lazy_import.py)
+fitz = lazy_module("fitz")  # PyMuPDF
 
 ALLOWED_EXTENSIONS = {'pdf'}
+# Largest batch accepted by /api/images/presign
+MAX_PRESIGN_KEYS = 500
 
-# For debugging: Print current working directory and list files
-print(f"[DEBUG] Current working directory: {os.getcwd()}")
-print("[DEBUG] Directory contents:", os.listdir('..'))
+# For debugging: current working directory and its parent's files
+if log.isEnabledFor(logging.DEBUG):
+    log.debug("Startup", cwd=os.getcwd(), parent_contents=os.listdir('..'))
 
 # Try to load .env from parent directory
 env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.env'))
-print(f"[DEBUG] Trying to load .env from: {env_path}")
 
 # Check if file exists
 if os.path.exists(env_path):
-    print("[DEBUG] .env file exists, loading...")
     load_dotenv(dotenv_path=env_path, override=True)
-    print("[DEBUG] Environment variables loaded")
+    log.debug("Loaded .env", path=env_path)
 else:
-    print("[WARNING] .env file not found at:", env_path)
+    log.warning(".env file not found", path=env_path)
 
-# Debug: Print all environment variables for AWS
-print("\n[DEBUG] AWS Environment Variables:")
-for key, value in os.environ.items():
-    if 'AWS_' in key or 'S3_' in key:
-        print(f"{key}: {'*' * 8 if 'SECRET' in key or 'KEY' in key else value}")
+# Debug: AWS environment variables, secrets masked
+if log.isEnabledFor(logging.DEBUG):
+    log.debug("AWS environment", **{
+        key: '*' * 8 if 'SECRET' in key or 'KEY' in key else value
+        for key, value in os.environ.items() if 'AWS_' in key or 'S3_' in key
+    })
 
 # Directly set credentials (for testing only - remove in production)
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
@@ -39,54 +51,119 @@ AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.getenv('AWS_REGION', 'ap-south-1')
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 S3_BASE_URL = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com"
+# Optional S3-compatible endpoint (MinIO, a local moto server)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
 
 # Verify credentials are set
 if not all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME]):
-    print("\n[ERROR] Missing required AWS credentials. Please check your .env file.")
-    print(f"S3_BUCKET_NAME: {S3_BUCKET_NAME or 'Not set'}")
+    log.error("Missing required AWS credentials, check the .env file", bucket=S3_BUCKET_NAME or 'Not set')
 
 app = Flask(__name__)
 CORS(app)
 # Limit uploads to avoid memory exhaustion (16MB default)
 app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
 
-# Initialize S3 client
-try:
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION
-    )
-    # Test S3 connection by making a simple request that requires minimal permissions
-    s3_client.head_bucket(Bucket=S3_BUCKET_NAME)
-    print("[DEBUG] Successfully connected to AWS S3 and verified bucket access")
-    s3_connected = True
-except ClientError as err:
-    error_code = err.response.get('Error', {}).get('Code')
-    if error_code == '404':
-        print(f"[ERROR] Bucket '{S3_BUCKET_NAME}' not found. Please create the bucket first.")
-    elif error_code == '403':
-        print(f"[ERROR] Access denied to bucket '{S3_BUCKET_NAME}'. Please check permissions.")
-    else:
-        print(f"[ERROR] Could not connect to AWS S3: {err}")
-    print("[NOTE] The application will still start, but S3 operations will fail.")
-    s3_connected = False
+# Initialize S3 client (no request is made until the bucket check below first runs)
+s3_client = make_s3_client(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, endpoint_url=S3_ENDPOINT_URL)
+
+def check_s3():
+    """Bucket access, verified with a request that requires minimal permissions."""
+    try:
+        s3_client.head_bucket(Bucket=S3_BUCKET_NAME)
+    except ClientError as err:
+        error_code = err.response.get('Error', {}).get('Code')
+        if error_code == '404':
+            raise RuntimeError(f"Bucket {S3_BUCKET_NAME} not found, create it first") from err
+        if error_code == '403':
+            raise RuntimeError(f"Access denied to bucket {S3_BUCKET_NAME}, check permissions") from err
+        raise
+    return S3_BUCKET_NAME
+
+# The bucket is checked on the first readiness probe or request, not at import, and
+# re-checked after READINESS_TTL (READINESS_RETRY while it fails)
+readiness = Readiness()
+readiness.add('s3', check_s3)
+# PyMuPDF loads in the background while the first probes are answered
+warm_up(lambda: load_modules([fitz]))
+
+# Uploads run in a thread pool while the following pages are extracted
+# Keys are content hashes; the index lets images stored by earlier uploads skip put_object
+s3_uploader = S3Uploader(s3_client, S3_BUCKET_NAME, index=UploadIndex(UPLOAD_INDEX_PATH) if UPLOAD_INDEX_PATH else None)
+# Presigned GET URLs are reused within a time window instead of signed per request
+presign_cache = PresignCache(s3_client.generate_presigned_url, S3_BUCKET_NAME)
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    """Request latency by route template (not raw path, which would include S3 keys)."""
+    elapsed = time.perf_counter() - g.get('started', time.perf_counter())
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(elapsed)
+    log.debug("Request", method=request.method, path=request.path, status=response.status_code,
+              ms=round(elapsed * 1000, 1))
+    return response
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def add_derivatives(batch, image_bytes, digest, width, height):
+    """
+    Thumbnail/preview derivatives of an image, keyed next to the original
+    (extracted_images/ab/<digest>_thumb.webp). Derivatives already stored by an
+    earlier upload are not decoded or encoded again; the others are added to `batch`.
+    
+    Returns {name: {'key', 'width', 'height', 'format', 'type'}}
+    """
+    stem = f"extracted_images/{digest[:2]}/{digest}"
+    planned = planned_derivatives(width, height)
+    keys = {name: derivative_name(stem, name) for name in planned}
+    if keys and all(s3_uploader.is_stored(key) for key in keys.values()):
+        return {
+            name: {'key': keys[name], 'width': w, 'height': h,
+                   'format': DERIVATIVE_FORMAT, 'type': f"image/{DERIVATIVE_FORMAT}"}
+            for name, (w, h) in planned.items()
+        }
+    
+    derivatives = {}
+    for name, derivative in make_derivatives(image_bytes).items():
+        key = derivative_name(stem, name, derivative['format'])
+        derivatives[name] = {
+            'key': key,
+            'width': derivative['width'],
+            'height': derivative['height'],
+            'format': derivative['format'],
+            'type': derivative['mime']
+        }
+        batch.add(key, derivative['data'], derivative['mime'], meta=derivatives[name],
+                  CacheControl='public, max-age=31536000')
+    return derivatives
+
 @app.route('/', methods=['GET'])
 def health():
+    s3_connected = readiness.ok('s3')
     return jsonify({
         'status': 'ok' if s3_connected else 'degraded',
         's3_connected': s3_connected,
         'bucket': S3_BUCKET_NAME if s3_connected else None
     }), 200 if s3_connected else 503
 
+@app.route('/livez', methods=['GET'])
+def livez():
+    """Liveness: the process serves requests. Runs no dependency checks."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the S3 bucket is reachable (cached, see readiness.py)."""
+    status = readiness.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/api/extract-pdf', methods=['POST'])
 def extract_pdf():
-    if not s3_connected:
+    if not readiness.ok('s3'):
         return jsonify({'error': 'S3 connection failed'}), 500
     if 'pdf' not in request.files:
         return jsonify({'error': 'No file part'}), 400
@@ -101,64 +178,104 @@ def extract_pdf():
     try:
         filename = secure_filename(file.filename)
         pdf_bytes = file.read()
-        base_filename = os.path.splitext(filename)[0]
         doc = None
         
+        # Wall time per stage for this request
+        timer = StageTimer()
         try:
             # Open the PDF
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            extracted_images = []
+            with timer.stage('open'):
+                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            uploads = s3_uploader.batch()
+            derivative_uploads = s3_uploader.batch()
+            # Images referenced from several pages are read, hashed and uploaded once;
+            # only their key and size are kept, not the image bytes
+            xref_keys = {}
+            # Derivatives are made once per distinct image
+            derivatives_by_digest = {}
             
-            # Extract images from each page
+            # Extract images from each page; uploads start as soon as an image is read
             for page_num in range(len(doc)):
                 page = doc.load_page(page_num)
                 image_list = page.get_images(full=True)
                 
                 for img_index, img in enumerate(image_list):
                     xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image['ext']
-                    
-                    # Generate unique S3 key
-                    image_key = f"extracted_images/{base_filename}/page{page_num+1}_img{img_index+1}_{uuid.uuid4().hex}.{image_ext}"
+                    image_bytes = None
+                    if xref in xref_keys:
+                        image_key, digest, image_ext, image_size = xref_keys[xref]
+                    else:
+                        with timer.stage('embedded_extract'):
+                            base_image = doc.extract_image(xref)
+                            image_bytes = base_image["image"]
+                            image_ext = base_image['ext']
+                            # Content-addressed S3 key: identical images share one object
+                            image_key, digest = content_key("extracted_images", image_bytes, image_ext)
+                        xref_keys[xref] = (image_key, digest, image_ext, len(image_bytes))
+                        if digest not in derivatives_by_digest:
+                            with timer.stage('derivatives'):
+                                derivatives_by_digest[digest] = add_derivatives(
+                                    derivative_uploads, image_bytes, digest, img[2], img[3])
                     
-                    # Upload to S3
-                    try:
-                        s3_client.put_object(
-                            Bucket=S3_BUCKET_NAME,
-                            Key=image_key,
-                            Body=image_bytes,
-                            ContentType=f"image/{image_ext}",
+                    # Extract folder name from the key (first part before the first '/')
+                    folder = image_key.split('/')[0]
+                    file_name = os.path.basename(image_key)
+                    meta = {
+                        'name': file_name,
+                        'key': image_key,
+                        'folder': folder,
+                        'bucket': S3_BUCKET_NAME,
+                        'type': f"image/{image_ext}",
+                        'format': image_ext,
+                        'page': page_num + 1,
+                        'index': img_index + 1,
+                        'content_hash': digest,
+                        'derivatives': derivatives_by_digest[digest]
+                    }
+                    if image_bytes is None:
+                        uploads.repeat(image_key, image_size, meta)
+                        meta['deduplicated'] = True
+                    else:
+                        meta['deduplicated'] = not uploads.add(
+                            image_key,
+                            image_bytes,
+                            f"image/{image_ext}",
+                            meta=meta,
                             CacheControl='public, max-age=31536000'  # 1 year cache
                         )
-                        
-                        # Extract folder name from the key (first part before the first '/')
-                        folder = image_key.split('/')[0]
-                        file_name = os.path.basename(image_key)
-                        extracted_images.append({
-                            'name': file_name,
-                            'key': image_key,
-                            'folder': folder,  
-                            'bucket': S3_BUCKET_NAME,
-                            'type': f"image/{image_ext}",
-                            'format': image_ext,
-                            'page': page_num + 1,
-                            'index': img_index + 1
-                        })
-                        
-                    except ClientError as e:
-                        print(f"[ERROR] Failed to upload image to S3: {e}")
-                        continue
+            
+            with timer.stage('upload_wait'):
+                extracted_images, failed = uploads.wait()
+                _, failed_derivatives = derivative_uploads.wait()
+            for meta, e in failed:
+                log.error("Failed to upload image to S3", key=meta['key'], error=str(e))
+            failed_keys = {meta['key'] for meta, _ in failed_derivatives}
+            for meta, e in failed_derivatives:
+                log.error("Failed to upload derivative to S3", key=meta['key'], error=str(e))
+            if failed_keys:
+                for image in extracted_images:
+                    image['derivatives'] = {name: d for name, d in image['derivatives'].items()
+                                            if d['key'] not in failed_keys}
+            
+            stage_ms = timer.rounded()
+            observe_stages(stage_ms)
+            IMAGES_TOTAL.labels('embedded', 'miss').inc(len(extracted_images))
+            log.info("Extracted PDF", filename=filename, pages=len(doc), images=len(extracted_images),
+                     upload_failures=len(failed) + len(failed_derivatives), stage_ms=stage_ms)
             
             return jsonify({
                 'status': 'success',
                 'filename': filename,
                 'page_count': len(doc),
-                'images': extracted_images
+                'images': extracted_images,
+                'upload_ms': max(uploads.upload_ms, derivative_uploads.upload_ms),
+                'upload_failures': len(failed) + len(failed_derivatives),
+                'deduplicated': sum(1 for img in extracted_images if img['deduplicated']),
+                'stage_ms': stage_ms
             })
             
         except Exception as e:
+            log.error("Error processing PDF", filename=filename, error=str(e), exc_info=True)
             return jsonify({'error': f'Error processing PDF: {str(e)}'}), 500
             
         finally:
@@ -171,36 +288,29 @@ def extract_pdf():
 @app.route('/api/image/<path:image_key>', methods=['GET'])
 def get_image(image_key):
     """
-    Generate a presigned URL for the requested S3 object.
+    Redirect to a presigned URL for the requested S3 object.
+    
+    URLs come from the presign cache, so repeated requests within a cache
+    window get the same URL, and the redirect itself may be cached by the
+    browser for the rest of the window.
     
     Query Parameters:
     - expires_in: Optional. Time in seconds until the URL expires (default: 1 hour, max: 1 week)
     - content_type: Optional. Override the Content-Type header for the response
     """
-    if not s3_connected:
+    if not readiness.ok('s3'):
         return jsonify({'error': 'S3 connection failed'}), 500
         
     try:
         expires_in = min(int(request.args.get('expires_in', 3600)), 604800)  # Max 1 week
         content_type = request.args.get('content_type')
         
-        params = {
-            'Bucket': S3_BUCKET_NAME,
-            'Key': image_key
-        }
-        
-        if content_type:
-            params['ResponseContentType'] = content_type
-            
-        # Generate a pre-signed URL for the image
-        url = s3_client.generate_presigned_url(
-            'get_object',
-            Params=params,
-            ExpiresIn=expires_in
-        )
+        url, max_age = presign_cache.get(image_key, expires_in, content_type)
         
         # Redirect to the presigned URL
-        return redirect(url)
+        response = redirect(url)
+        response.headers['Cache-Control'] = f'private, max-age={max_age}'
+        return response
         
     except ValueError:
         return jsonify({'error': 'Invalid expires_in parameter'}), 400
@@ -209,5 +319,59 @@ def get_image(image_key):
             return jsonify({'error': 'Image not found'}), 404
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/images/presign', methods=['POST'])
+def presign_images():
+    """
+    Presign many keys in one request, e.g. all thumbnails of a line-sheet grid.
+    
+    JSON body:
+    - keys: List of S3 keys (at most MAX_PRESIGN_KEYS)
+    - expires_in: Optional. Time in seconds until the URLs expire (default: 1 hour, max: 1 week)
+    - content_type: Optional. Override the Content-Type header for the responses
+    
+    Returns {"urls": {key: url}, "expires_in", "max_age"}; max_age is how long
+    the URLs may be reused before asking again.
+    """
+    if not readiness.ok('s3'):
+        return jsonify({'error': 'S3 connection failed'}), 500
+    
+    body = request.get_json(silent=True) or {}
+    keys = body.get('keys')
+    if not isinstance(keys, list) or not all(isinstance(k, str) and k for k in keys):
+        return jsonify({'error': 'keys must be a list of S3 keys'}), 400
+    if len(keys) > MAX_PRESIGN_KEYS:
+        return jsonify({'error': f'At most {MAX_PRESIGN_KEYS} keys per request'}), 400
+    
+    try:
+        expires_in = min(int(body.get('expires_in', 3600)), 604800)  # Max 1 week
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid expires_in parameter'}), 400
+    content_type = body.get('content_type')
+    
+    urls = {}
+    max_age = presign_cache.window
+    try:
+        for key in dict.fromkeys(keys):
+            urls[key], key_max_age = presign_cache.get(key, expires_in, content_type)
+            max_age = min(max_age, key_max_age)
+    except ClientError as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'urls': urls, 'expires_in': expires_in, 'max_age': max_age})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage timings, S3 upload outcomes, request latency."""
+    body, content_type = metrics_payload()
+    return Response(body, content_type=content_type)
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Presign cache and S3 upload counters."""
+    return jsonify({
+        'presign': presign_cache.stats(),
+        'uploads': s3_uploader.stats()
+    })
+
 if __name__ == '__main__':
     app.run(port=5001, debug=True)
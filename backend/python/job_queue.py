@@ -0,0 +1,261 @@
+"""
+Persistent queue of asynchronous PDF extraction jobs.
+
+Large catalogs take minutes to extract, which is longer than callers should
+hold an HTTP request open. Instead a job is created from the upload (the PDF is
+spooled to disk next to the database), its id is returned immediately, and a
+runner inside the service works through the queue, recording per-page progress
+and finally the result.
+
+Jobs live in a SQLite database, so queued and interrupted jobs survive a
+restart. A running job is leased: its runner refreshes `heartbeat` every few
+seconds, and a job whose heartbeat is older than `lease_seconds` (its runner
+died) is handed to the next runner that asks for work, in this or any other
+process sharing the database.
+
+Job states: queued -> running -> done | failed | cancelled
+
+Configuration (environment variables):
+    EXTRACTION_JOBS_DIR        Database and spooled uploads (default: extraction_jobs)
+    EXTRACTION_JOBS_MAX        Jobs allowed to wait in the queue (default: 1000)
+    EXTRACTION_JOBS_RETENTION  Hours finished jobs are kept (default: 72)
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+DATABASE_FILE = "jobs.db"
+UPLOADS_DIR = "uploads"
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are waiting to accept another one."""
+
+
+class JobStore:
+    """SQLite-backed job queue with leases, progress and stored results."""
+
+    def __init__(self, root: Optional[str] = None, max_queued: Optional[int] = None,
+                 retention_hours: Optional[float] = None, lease_seconds: float = 60.0):
+        self.root = root or os.getenv("EXTRACTION_JOBS_DIR", "extraction_jobs")
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("EXTRACTION_JOBS_MAX", 1000))
+        if retention_hours is None:
+            retention_hours = float(os.getenv("EXTRACTION_JOBS_RETENTION", 72))
+        self.retention_seconds = retention_hours * 3600
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        """Open the database on first use. Caller holds the lock."""
+        if self._conn is None:
+            os.makedirs(os.path.join(self.root, UPLOADS_DIR), exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, DATABASE_FILE), check_same_thread=False,
+                                         timeout=30)
+            self._conn.row_factory = sqlite3.Row
+            with self._conn:
+                # WAL lets status polls read while a runner writes progress
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, file_size INTEGER,"
+                    " pages TEXT, options TEXT NOT NULL, pages_total INTEGER, pages_done INTEGER NOT NULL DEFAULT 0,"
+                    " cache TEXT, error TEXT, result TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                    " created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat REAL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        return self._conn
+
+    def pdf_path(self, job_id: str) -> str:
+        """Where the uploaded PDF of a job is spooled."""
+        return os.path.join(self.root, UPLOADS_DIR, f"{job_id}.pdf")
+
+    def _remove_pdf(self, job_id: str) -> None:
+        try:
+            os.unlink(self.pdf_path(job_id))
+        except OSError:
+            pass
+
+    def create(self, filename: str, pdf: Any, pages: Optional[str],
+               options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a job for a spooled PDF (see upload_spool.SpooledPdf). The file
+        is moved into the job store, which removes it when the job finishes.
+
+        Raises:
+            JobQueueFullError: if `max_queued` jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._db()
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFullError(f"{queued} extraction jobs are already queued")
+
+            path = self.pdf_path(job_id)
+            # A rename when the spool directory is on the same filesystem
+            shutil.move(pdf.path, path + ".part")
+            os.replace(path + ".part", path)
+            pdf.path = path
+            with db:
+                db.execute(
+                    "INSERT INTO jobs (id, status, filename, file_size, pages, options, created_at)"
+                    " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                    (job_id, filename, pdf.size, pages, json.dumps(options), time.time()),
+                )
+        return self.get(job_id)
+
+    def get(self, job_id: str, with_result: bool = False) -> Optional[Dict[str, Any]]:
+        """Job status (and its stored result if `with_result`), or None if unknown."""
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row, with_result) if row else None
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Lease the oldest queued job, or a running job whose runner stopped
+        heartbeating, and mark it running. Returns None when there is no work.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            with db:
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now - self.lease_seconds,),
+                ).fetchone()
+                if row is None:
+                    return None
+                # The status check makes the claim atomic between processes
+                claimed = db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?), heartbeat = ?,"
+                    " pages_done = 0, attempts = attempts + 1"
+                    " WHERE id = ? AND (status = 'queued' OR (status = 'running' AND heartbeat < ?))",
+                    (now, now, row["id"], now - self.lease_seconds),
+                ).rowcount
+                if not claimed:
+                    return None
+                job = db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return _job_dict(job, with_options=True)
+
+    def heartbeat(self, job_id: str) -> str:
+        """Renew the lease of a running job and return its current status."""
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                           (time.time(), job_id))
+                row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else "cancelled"
+
+    def progress(self, job_id: str, pages_done: int, pages_total: Optional[int] = None,
+                 cache: Optional[str] = None) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute(
+                    "UPDATE jobs SET pages_done = ?, pages_total = COALESCE(?, pages_total),"
+                    " cache = COALESCE(?, cache), heartbeat = ? WHERE id = ? AND status = 'running'",
+                    (pages_done, pages_total, cache, time.time(), job_id),
+                )
+
+    def requeue(self, job_id: str) -> None:
+        """
+        Put a running job back in the queue (the extraction engine was busy,
+        or the service is stopping). Its claim is given back, so only runs
+        that were cut off by a dying runner count towards the attempt limit.
+        """
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("UPDATE jobs SET status = 'queued', pages_done = 0, heartbeat = NULL,"
+                           " attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = 'running'", (job_id,))
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None, only_if: tuple = ("running",)) -> bool:
+        with self._lock:
+            db = self._db()
+            with db:
+                changed = db.execute(
+                    f"UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, heartbeat = NULL"
+                    f" WHERE id = ? AND status IN ({', '.join('?' * len(only_if))})",
+                    (status, json.dumps(result) if result is not None else None, error, time.time(),
+                     job_id, *only_if),
+                ).rowcount
+        if changed:
+            self._remove_pdf(job_id)
+        return bool(changed)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> bool:
+        return self._finish(job_id, "done", result=result)
+
+    def fail(self, job_id: str, error: str) -> bool:
+        return self._finish(job_id, "failed", error=error)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it had already finished."""
+        return self._finish(job_id, "cancelled", only_if=("queued", "running"))
+
+    def purge(self) -> int:
+        """Delete finished jobs older than the retention period; returns how many."""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            db = self._db()
+            with db:
+                removed = db.execute(
+                    f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATES))})"
+                    " AND finished_at < ?",
+                    (*FINISHED_STATES, cutoff),
+                ).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {state: counts.get(state, 0) for state in JOB_STATES}
+
+
+def _job_dict(row: sqlite3.Row, with_result: bool = False, with_options: bool = False) -> Dict[str, Any]:
+    total = row["pages_total"]
+    job = {
+        "job_id": row["id"],
+        "status": row["status"],
+        "filename": row["filename"],
+        "file_size_kb": (row["file_size"] or 0) / 1024,
+        "pages": row["pages"],
+        "pages_total": total,
+        "pages_done": row["pages_done"],
+        "progress": round(row["pages_done"] / total, 3) if total else (1.0 if row["status"] == "done" else 0.0),
+        "cache": row["cache"],
+        "error": row["error"],
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    if with_options:
+        job["options"] = json.loads(row["options"])
+    if with_result:
+        job["result"] = json.loads(row["result"]) if row["result"] else None
+    return job
+
+
+def job_links(job_id: str) -> Dict[str, str]:
+    """URLs of the job endpoints, returned to clients so they need not build them."""
+    return {
+        "status": f"/jobs/{job_id}",
+        "result": f"/jobs/{job_id}/result",
+        "events": f"/jobs/{job_id}/events",
+        "cancel": f"/jobs/{job_id}/cancel",
+    }
+
@@ -0,0 +1,76 @@
+"""
+Deferred imports of heavy modules.
+
+OpenCV, NumPy, PyMuPDF and pytesseract (which pulls in NumPy) take several
+hundred milliseconds to import, most of a service's cold start, and nothing
+at start-up needs them. `lazy_module` returns a stand-in that imports the
+real module on first attribute access:
+
+    np = lazy_module("numpy")       # nothing imported yet
+    np.zeros(3)                     # numpy is imported here, once
+
+The stand-in checks that the module is installed right away, so a missing
+dependency still fails at start-up with ModuleNotFoundError. Loading goes
+through the regular import system, which serializes concurrent first uses
+from several threads; the stand-in then keeps a reference to the module.
+
+Modules that use such names in annotations evaluated at definition time
+(`def f(x: np.ndarray)`) need `from __future__ import annotations`, or the
+definition itself triggers the import.
+"""
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any, Iterable
+
+
+class LazyModule(ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_module(name: str) -> ModuleType:
+    """
+    The module if it is already imported, a `LazyModule` for it otherwise.
+
+    Raises:
+        ModuleNotFoundError: if the module is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return LazyModule(name)
+
+
+def load_modules(modules: Iterable[ModuleType]) -> None:
+    """Import every deferred module now, e.g. from a warm-up thread after start-up."""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
@@ -0,0 +1,189 @@
+"""
+Structured logging, stage timers and Prometheus metrics for both services.
+
+The services used to report through synchronous print() calls on the hot
+path (per image, per contour, the full request headers). Log records now go
+through the standard logging module at a configurable level:
+
+- calls below the level cost one comparison: fields are passed as keyword
+  arguments, not formatted into the message;
+- emitted records are put on a queue and written by a background thread,
+  one JSON object per line, so a slow stdout never blocks a request or a
+  page worker.
+
+Stage timings are taken with `StageTimer`. Page workers run in other
+processes, so they return their timings with the page result and the
+serving process records them (`observe_stages`). Metrics are only kept in
+the serving process and exposed on its /metrics endpoint.
+
+Configuration (environment variables):
+    LOG_LEVEL   DEBUG, INFO, WARNING or ERROR (default: INFO)
+    LOG_FORMAT  json or text (default: json)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from multiprocessing import util as mp_util
+from typing import Any, Dict, Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Keyword arguments that belong to logging itself rather than to the record's fields
+_LOGGING_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+# --- Metrics ---
+
+# Stage times range from sub-millisecond (a file write) to tens of seconds (OCR of a dense page)
+_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Presigning is local HMAC work: tens of microseconds unless credentials are being refreshed
+_SIGN_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.025, 0.1, 0.5)
+_REQUEST_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_SECONDS = Histogram(
+    "extraction_stage_seconds", "Time spent in one extraction stage, per page (per request in the upload service)",
+    ["stage"], buckets=_STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=_REQUEST_BUCKETS,
+)
+# cache="hit" counts pages replayed from the extractor's result cache; their stages are not observed again
+PAGES_TOTAL = Counter("extraction_pages_total", "Pages returned, by result cache outcome", ["cache"])
+IMAGES_TOTAL = Counter("extraction_images_total", "Images returned, by source and result cache outcome",
+                       ["source", "cache"])
+EMBEDDED_SKIPPED_TOTAL = Counter(
+    "extraction_embedded_skipped_total", "Embedded images skipped on metadata, by reason", ["reason"],
+)
+CACHE_LOOKUPS_TOTAL = Counter("extraction_cache_lookups_total", "Result cache lookups, by outcome", ["result"])
+S3_OBJECTS_TOTAL = Counter(
+    "s3_objects_total", "S3 objects handled by the upload stage, by outcome", ["outcome"],
+)
+PRESIGN_LOOKUPS_TOTAL = Counter("presign_cache_lookups_total", "Presigned URL cache lookups, by outcome", ["result"])
+PRESIGN_SECONDS = Histogram(
+    "presign_sign_seconds", "Time to sign one presigned URL (cache misses only)", buckets=_SIGN_BUCKETS,
+)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """(body, content type) of the Prometheus text exposition of every metric."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class StageTimer:
+    """
+    Wall time per stage, in milliseconds. A stage entered several times
+    (e.g. "file_write" once per image) accumulates.
+
+    Usage:
+        timer = StageTimer()
+        with timer.stage("render"):
+            ...
+        page_data["stage_ms"] = timer.rounded()
+    """
+
+    def __init__(self):
+        self.ms: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, ms: float) -> None:
+        self.ms[name] = self.ms.get(name, 0.0) + ms
+
+    def rounded(self) -> Dict[str, float]:
+        return {name: round(ms, 2) for name, ms in self.ms.items()}
+
+
+def observe_stages(stage_ms: Dict[str, float]) -> None:
+    """Record stage timings (as returned by `StageTimer.rounded`) in the stage histogram."""
+    for stage, ms in stage_ms.items():
+        STAGE_SECONDS.labels(stage).observe(ms / 1000)
+
+
+# --- Logging ---
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger whose keyword arguments become fields of the record:
+        log.info("Page extracted", page=3, images=5)
+    """
+
+    def process(self, msg: Any, kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        kwargs.setdefault("extra", {})["fields"] = fields
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"[{record.levelname}] {record.name}: {record.getMessage()}" + (f" {fields}" if fields else "")
+        return f"{line}\n{record.exc_text}" if record.exc_text else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format the message and traceback here, where the arguments are still live,
+        # and leave the fields for the writer thread's formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_listener = None
+
+
+def _configure() -> None:
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    # Flush on exit, including in multiprocessing workers, which skip atexit
+    mp_util.Finalize(None, _listener.stop, exitpriority=1)
+
+    root = logging.getLogger("extraction")
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    root.propagate = False
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger for one module, e.g. get_logger("pdf_extractor")."""
+    _configure()
+    return StructuredLogger(logging.getLogger(f"extraction.{name}"), {})
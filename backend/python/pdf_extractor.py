@@ -1,35 +1,64 @@
 # To run this application, you need to install the following dependencies:
-# pip install fastapi[all] python-multipart uvicorn uvicorn[standard] PyMuPDF colorthief Pillow opencv-python-headless pytesseract
+# pip install fastapi[all] python-multipart uvicorn uvicorn[standard] PyMuPDF colorthief Pillow opencv-python-headless pytesseract prometheus_client
 
+from __future__ import annotations
+
+import functools
 import os
 import re
+import json
+import asyncio
+import mimetypes
+import time
 import uuid
 import shutil
 import tempfile
 import base64
-import cv2
-import numpy as np
-import uvicorn
 from io import BytesIO
-from typing import List, Tuple, Any, Dict
+from typing import List, Tuple, Any, Dict, Optional, AsyncIterator, Union, Collection
 
 # FastAPI and dependencies
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-import fitz  # PyMuPDF
-from colorthief import ColorThief
 from PIL import Image
 
-# Check for pytesseract and handle its absence gracefully
-TESSERACT_AVAILABLE = False
-try:
-    import pytesseract
-    pytesseract.get_tesseract_version()
-    TESSERACT_AVAILABLE = True
-except (pytesseract.TesseractNotFoundError, EnvironmentError):
-    print("[WARNING] Tesseract OCR is not installed or not in PATH. Text recognition from images will be disabled.")
+from extraction_engine import ExtractionEngine, EngineBusyError
+from extraction_cache import ExtractionCache
+from job_queue import JobStore, JobQueueFullError, FINISHED_STATES, job_links
+from upload_spool import SpooledPdf, UploadRejectedError, spool_upload, spool_path, MAX_UPLOAD_BYTES
+from image_dedup import DedupIndex, PersistentDedupIndex, content_hash, image_signature
+from color_palette import extract_palette, colorthief_palette
+from color_naming import get_color_namer
+from ocr_batch import OcrBatch
+from contour_search import find_candidates
+from raster_tiles import RASTER_MEMORY_MB, render_page_pixels, page_contours, crop_zoom
+from garment_classifier import get_garment_classifier, garment_outline
+from image_derivatives import make_derivatives, derivative_name
+from observability import (get_logger, metrics_payload, observe_stages, StageTimer, REQUEST_SECONDS,
+                           PAGES_TOTAL, IMAGES_TOTAL, EMBEDDED_SKIPPED_TOTAL, CACHE_LOOKUPS_TOTAL)
+from lazy_import import lazy_module, load_modules
+from readiness import Readiness, warm_up
+
+log = get_logger("pdf_extractor")
+
+# Imported on first use rather than at start-up (see lazy_import.py)
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+fitz = lazy_module("fitz")  # PyMuPDF
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_available() -> bool:
+    """Whether Tesseract OCR can run. Checked once per process, on first use (it starts a subprocess)."""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except (ImportError, EnvironmentError):
+        log.warning("Tesseract OCR is not installed or not in PATH; text recognition from images is disabled")
+        return False
 
 
 # --- FastAPI Application Setup ---
@@ -67,493 +96,1624 @@ COLOR_REGEX = re.compile(r'\b(' + '|'.join(re.escape(c) for c in KNOWN_COLORS) +
 # Mount the directory to serve extracted images
 app.mount("/extracted_images", StaticFiles(directory=EXTRACTED_IMAGES_DIR), name="extracted_images")
 
+# Worker pool that runs the CPU-heavy extraction off the event loop
+extraction_engine = ExtractionEngine()
+
+# On-disk cache of extraction results keyed on PDF content and parameters
+extraction_cache = ExtractionCache()
+
+# Bump when the extraction logic changes so cached results are not reused
+EXTRACTION_VERSION = 15
+
+# Parameters passed to every page worker. They are part of the result cache
+# key, so changing one invalidates previously cached results.
+DEFAULT_EXTRACTION_OPTIONS = {
+    "zoom": 3.0,                 # Rasterization zoom of the cropped candidate regions
+    "detect_zoom": 1.5,          # Rasterization zoom of the whole page for contour detection
+    "min_embedded_size": 200,    # Minimum width/height of a t-shirt-like embedded image
+    "min_image_size": 32,        # Embedded images narrower or shorter than this are skipped unread
+    "min_raster_size": 100,      # Minimum width/height of a contour candidate (pixels)
+    "min_contour_area": 500,     # Minimum area of a contour candidate (pixels at crop zoom)
+    "max_page_fraction": 0.9,    # Contours larger than this fraction of the page are ignored
+    "rasterize": True,           # Rasterize pages and search contours for non-embedded garments
+    "blur_kernel": 5,            # Gaussian blur kernel (odd) before adaptive thresholding
+    "threshold_block": 11,       # Adaptive threshold neighbourhood (odd)
+    "threshold_c": 2,            # Constant subtracted from the adaptive threshold mean
+    "match_threshold": 0.15,     # Hu-moment (matchShapes I1) distance threshold for garment templates
+    "fourier_threshold": 0.12,   # Fourier-descriptor distance threshold for garment templates
+    "ocr": True,                 # Run Tesseract on images to find colour names (if installed)
+    "ocr_min_confidence": 60,    # Minimum Tesseract word confidence
+    "text_layer": True,          # Link text-layer colour words to nearby images; OCR only unlabelled ones
+    "text_link_distance": 36.0,  # Max gap (PDF points) between a colour word and the image it describes
+    "dedup_distance": 6,         # Max dHash Hamming distance for near-duplicate images (-1: exact only)
+    "color_engine": "numpy",     # Dominant colour engine: "numpy" (vectorized k-means) or "colorthief"
+    "palette_size": 5,           # Number of palette colours reported per image
+    "derivatives": True,         # Write thumbnail/preview derivatives next to each extracted image
+    "raster_memory_mb": RASTER_MEMORY_MB,  # Budget of one page or crop render; larger pages are tiled
+}
+
+COLOR_ENGINES = ("numpy", "colorthief")
+
+# Named bundles of extraction options, selected per request with ?profile=.
+# "fast-preview" is a cheap first pass (no page rasterization or OCR, small
+# palettes); "full-fidelity" renders and matches more finely for a background pass.
+EXTRACTION_PROFILES = {
+    "fast-preview": {
+        "rasterize": False,
+        "ocr": False,
+        "palette_size": 3,
+        "dedup_distance": -1,
+    },
+    "balanced": {},
+    "full-fidelity": {
+        "zoom": 4.0,
+        "detect_zoom": 2.0,
+        "min_image_size": 16,
+        "min_raster_size": 80,
+        "match_threshold": 0.18,
+        "fourier_threshold": 0.15,
+        "ocr_min_confidence": 50,
+        "palette_size": 8,
+    },
+}
+DEFAULT_PROFILE = os.getenv("EXTRACTION_PROFILE", "balanced")
+
+
+def _load_profiles(path: Optional[str]) -> None:
+    """
+    Merge profiles from a JSON file ({"name": {"option": value}}) into
+    EXTRACTION_PROFILES, so they can be tuned without a code change.
+    """
+    if not path:
+        return
+    try:
+        with open(path) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Could not load extraction profiles", path=path, error=str(e))
+        return
+    for name, overrides in profiles.items():
+        unknown = set(overrides) - set(DEFAULT_EXTRACTION_OPTIONS)
+        if unknown:
+            log.warning("Ignoring unknown options in profile", profile=name, options=sorted(unknown))
+        EXTRACTION_PROFILES[name] = {
+            **EXTRACTION_PROFILES.get(name, {}),
+            **{k: v for k, v in overrides.items() if k not in unknown},
+        }
+
+
+_load_profiles(os.getenv("EXTRACTION_PROFILES_PATH"))
+if DEFAULT_PROFILE not in EXTRACTION_PROFILES:
+    log.warning("Unknown EXTRACTION_PROFILE, using balanced", profile=DEFAULT_PROFILE)
+    DEFAULT_PROFILE = "balanced"
+
+# /extract-assets response modes: inline base64, URL references, or NDJSON streaming
+RESPONSE_MODES = ("inline", "reference", "ndjson")
+
+# Optional SQLite index of images from earlier uploads (cross-upload dedup)
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH")
+
+# A raster crop lying mostly inside an embedded image (this fraction of its
+# area) and covering at least EMBEDDED_SUBJECT_FRACTION of that image is the
+# image's own subject, e.g. the garment of a product shot, and is dropped.
+# Its dHash differs too much from the whole image's to be caught by dedup.
+# Garments on a full-page scan cover much less of the scan and are kept.
+EMBEDDED_CONTAINMENT = 0.9
+EMBEDDED_SUBJECT_FRACTION = 0.25
+_upload_dedup_index = None
+
 # --- Helper Functions ---
 
-def render_page_as_image(page: fitz.Page, zoom: float = 3.0) -> Tuple[bytes, int, int]:
-    """Render a PDF page as a high-resolution PNG image."""
-    mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
-    return pix.tobytes("png"), pix.width, pix.height
+def _colour_names_from_words(words: List[str]) -> List[str]:
+    """Known colour names (title case, in reading order) found in OCR'd words."""
+    return list(dict.fromkeys(c.title() for c in COLOR_REGEX.findall(" ".join(words))))
 
-def _detect_color_names(img_bytes: bytes) -> list[str]:
+def _detect_color_names(image: Union[bytes, Image.Image], ocr: bool = True,
+                        min_confidence: float = 60, dominant_rgb: Optional[Tuple[int, int, int]] = None) -> list[str]:
     """
-    Detect color names using OCR on the provided image bytes.
+    Detect color names using OCR on the provided image (bytes or an already
+    decoded PIL image). Only text-bearing regions are OCR'd (see ocr_batch).
+    If OCR finds nothing, the dominant colour (computed here unless
+    `dominant_rgb` is given) is mapped to the closest named color.
     Returns a list of detected color names in title case.
+
+    PDF pages batch the OCR of all their images instead (`_extract_page`).
     """
     # Try OCR if available
-    if TESSERACT_AVAILABLE:
+    if ocr and tesseract_available():
         try:
-            pil = Image.open(BytesIO(img_bytes)).convert("RGB")
-            # Increase contrast to improve OCR accuracy
-            pil = pil.point(lambda p: p * 1.3)
-            data = pytesseract.image_to_data(pil, output_type=pytesseract.Output.DICT)
-            
-            words = []
-            for w, conf in zip(data.get("text", []), data.get("conf", [])):
-                if not w or w.isspace():
-                    continue
-                try:
-                    conf_val = float(conf)
-                except ValueError:
-                    conf_val = 0.0
-                # Filter out words with low confidence
-                if conf_val < 60:
-                    continue
-                w_clean = w.strip().upper()
-                if len(w_clean) < 3:
-                    continue
-                words.append(w_clean)
+            pil = image if isinstance(image, Image.Image) else Image.open(BytesIO(image))
+            batch = OcrBatch()
+            if batch.add(0, pil):
+                candidates = _colour_names_from_words(batch.run(min_confidence).get(0, []))
+                if candidates:
+                    log.debug("Colour names found by OCR", colours=candidates)
+                    return candidates
+            log.debug("No colour names found by OCR, falling back to the dominant colour")
 
-            joined = " ".join(words)
-            candidates = set()
-            for c in COLOR_REGEX.findall(joined):
-                candidates.add(c.title())
-            
-            if candidates:
-                print(f"[DEBUG] Extracted color names via OCR: {candidates}")
-                return list(candidates)
-            print("[DEBUG] No colors found via OCR, falling back to dominant color detection")
-                
         except Exception as e:
-            print(f"[WARNING] OCR-based color detection failed: {e}")
-    
+            log.warning("OCR-based colour detection failed", error=str(e))
+
     # Fallback: Extract dominant color and map to closest named color
-    print("[DEBUG] Attempting dominant color detection...")
     try:
-        from colorthief import ColorThief
-        
-        # Simple color name mapping (RGB values to color names)
-        COLOR_MAP = {
-            (0, 0, 0): 'Black',
-            (255, 255, 255): 'White',
-            (255, 0, 0): 'Red',
-            (0, 0, 255): 'Blue',
-            (0, 255, 0): 'Green',
-            (255, 255, 0): 'Yellow',
-            (255, 165, 0): 'Orange',
-            (128, 0, 128): 'Purple',
-            (255, 192, 203): 'Pink',
-            (165, 42, 42): 'Brown',
-            (128, 128, 128): 'Gray',
-            (0, 128, 0): 'Dark Green',
-            (0, 0, 128): 'Navy',
-            (128, 0, 0): 'Maroon',
-            (128, 128, 0): 'Olive'
-        }
-        print("[DEBUG] Using color map with", len(COLOR_MAP), "colors")
-        
-        # Get dominant color
-        color_thief = ColorThief(BytesIO(img_bytes))
-        dominant_rgb = color_thief.get_color(quality=3)
-        
-        # Find closest color from our map
-        def color_distance(c1, c2):
-            return sum((a - b) ** 2 for a, b in zip(c1, c2))
-            
-        closest_color = min(COLOR_MAP.items(), key=lambda x: color_distance(x[0], dominant_rgb))[1]
-        print(f"[DEBUG] Extracted color via dominant color: {closest_color}")
+        # Get dominant color unless the caller already has it
+        if dominant_rgb is None:
+            dominant_rgb = extract_palette(image, palette_size=1)["dominant_rgb"]
+
+        # Nearest named colour via the precomputed CIELAB lookup table
+        closest_color = get_color_namer().name(dominant_rgb)["name"]
+        log.debug("Colour named from the dominant colour", colour=closest_color)
         return [closest_color]
         
     except Exception as err:
-        print(f"[WARNING] Color detection failed: {err}")
+        log.warning("Colour detection failed", error=str(err))
         return []
 
-def is_tshirt_like_dimensions(width: int, height: int, min_size: int = 200) -> bool:
-    """Heuristic to check if an image has t-shirt-like dimensions."""
-    if height == 0:
-        return False
-    aspect_ratio = width / height
-    # T-shirts usually have a width-to-height ratio between 0.5 and 2.0
-    # and a minimum size to distinguish them from small icons or noise.
-    return (0.5 <= aspect_ratio <= 2.0 and width >= min_size and height >= min_size)
-
-def _create_tshirt_template():
-    """Generates an idealized t-shirt contour for template matching."""
-    # Create a simple t-shirt shape as a contour
-    template_points = np.array([
-        [100, 0], [150, 50], [250, 50], [300, 0],  # Neck and shoulders
-        [350, 50], [350, 200], [250, 250], [150, 250],  # Sleeves and side
-        [50, 200], [50, 50], [100, 50] # Other sleeve and side
-    ], dtype=np.int32)
-    
-    # Reshape to a format that OpenCV understands for contours
-    template_contour = np.array(template_points).reshape((-1, 1, 2))
-    return template_contour
+def _dominant_colors(image_bytes: bytes, pixels: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Dominant colour and palette using the engine selected in `options`.
+    `pixels` is the already decoded image (PIL image or RGB array) for the
+    NumPy engine; ColorThief always works from the encoded bytes.
+    """
+    if options["color_engine"] == "colorthief":
+        return colorthief_palette(image_bytes, options["palette_size"])
+    return extract_palette(pixels if pixels is not None else image_bytes, options["palette_size"])
 
-def _is_tshirt_like_shape_with_template(contour, template_contour, threshold=0.15):
+def _name_colours(colours: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Analyzes a contour using template matching to determine if its shape
-    resembles the t-shirt template. A stricter threshold is now used.
+    Name the dominant colour and every palette entry in one lookup, adding
+    "name" and "pantone" to the palette entries in place. Returns the naming
+    of the dominant colour ({"name", "hex", "pantone"}), or {} if there is none.
+    """
+    dominant = colours.get("dominant_rgb")
+    if not dominant:
+        return {}
+    palette = colours.get("palette") or []
+    named = get_color_namer().name_many([dominant] + [entry["rgb"] for entry in palette])
+    for entry, naming in zip(palette, named[1:]):
+        entry["name"] = naming["name"]
+        entry["pantone"] = naming.get("pantone", {}).get("code")
+    return named[0]
+
+def _image_colours(image_bytes: bytes, pixels: Any, options: Dict[str, Any],
+                   **context: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """
-    if cv2.contourArea(contour) < 500:
+    Palette and dominant colour naming of one image, as `_dominant_colors`
+    and `_name_colours`. An image the palette engine cannot read (odd
+    colour spaces, truncated streams) gets an empty palette rather than
+    failing its page.
+    """
+    try:
+        colours = _dominant_colors(image_bytes, pixels, options)
+        return colours, _name_colours(colours)
+    except Exception as e:
+        log.warning("Could not compute the image palette", error=str(e), **context)
+        return {"dominant_rgb": None, "palette": []}, {}
+
+class ExtractionRequestError(ValueError):
+    """Raised for invalid request parameters; the endpoints answer 400."""
+
+
+class PageRangeError(ExtractionRequestError):
+    """Raised when a `pages=` range does not match the uploaded PDF."""
+
+
+def _request_options(color_engine: Optional[str] = None, profile: Optional[str] = None) -> Dict[str, Any]:
+    """Validated per-request overrides of DEFAULT_EXTRACTION_OPTIONS: the profile's, then color_engine."""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in EXTRACTION_PROFILES:
+        raise ExtractionRequestError(f"profile must be one of {', '.join(EXTRACTION_PROFILES)}")
+    overrides = dict(EXTRACTION_PROFILES[profile])
+    if color_engine:
+        if color_engine not in COLOR_ENGINES:
+            raise ExtractionRequestError(f"color_engine must be one of {', '.join(COLOR_ENGINES)}")
+        overrides["color_engine"] = color_engine
+    return overrides
+
+
+def _parse_page_range(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a 1-based page range such as "1-3,5,8-" into sorted 0-based page indexes.
+    An empty or missing spec selects every page.
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start = int(start_str) if start_str.strip() else 1
+                end = int(end_str) if end_str.strip() else page_count
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise PageRangeError(f"Invalid page range: '{part}'")
+        if start < 1 or end < start or end > page_count:
+            raise PageRangeError(f"Page range '{part}' is outside 1-{page_count}")
+        selected.update(range(start - 1, end))
+
+    if not selected:
+        raise PageRangeError(f"Page range '{spec}' selects no pages")
+    return sorted(selected)
+
+
+def _pdf_page_count(pdf_path: str) -> int:
+    """Open the PDF only to count its pages."""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _shared_image_xrefs(pdf_path: str, page_indexes: List[int]) -> Dict[int, List[int]]:
+    """
+    For each selected page, the embedded-image xrefs already listed on an
+    earlier selected page. The merger would drop those images as duplicates,
+    so the page workers skip them instead. Only the xref table is read.
+    """
+    seen = set()
+    shared = {}
+    with fitz.open(pdf_path) as doc:
+        for page_index in sorted(page_indexes):
+            xrefs = [img[0] for img in doc[page_index].get_images(full=True)]
+            shared[page_index] = [xref for xref in xrefs if xref in seen]
+            seen.update(xrefs)
+    return shared
+
+
+def _embedded_candidates(page: fitz.Page, options: Dict[str, Any],
+                         skip_xrefs: Collection[int] = ()) -> Tuple[List[Tuple[int, tuple]], Dict[str, int]]:
+    """
+    Filter a page's embedded images on the xref table alone, before any
+    image stream is read: soft masks of other images, stencil masks (no
+    colour space), images smaller than `min_image_size` and xrefs handled
+    by an earlier page are dropped.
+
+    Returns:
+        ([(1-based index on the page, get_images entry)], {reason: skipped count})
+    """
+    # get_images(full=True): (xref, smask, width, height, bpc, colorspace, alt. colorspace, name, filter, referencer)
+    image_list = page.get_images(full=True)
+    masks = {img[1] for img in image_list if img[1]}
+    min_size = options["min_image_size"]
+    skipped = {"shared": 0, "mask": 0, "small": 0}
+    candidates = []
+    for img_index, img in enumerate(image_list, 1):
+        xref, width, height, colorspace = img[0], img[2], img[3], img[5]
+        if xref in skip_xrefs:
+            skipped["shared"] += 1
+        elif xref in masks or not colorspace:
+            skipped["mask"] += 1
+        elif min(width, height) < min_size:
+            skipped["small"] += 1
+        else:
+            candidates.append((img_index, img))
+    return candidates, skipped
+
+
+def _page_words(page: fitz.Page) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Word boxes of a page's text layer and the colour names they spell.
+
+    Returns:
+        (word_rects, colour_words): an (N, 4) array with the bbox of every
+        word, and [{"name": "Navy", "bbox": [x0, y0, x1, y1]}] for each colour
+        name COLOR_REGEX finds within a text line (multi-word names included)
+    """
+    words = page.get_text("words")
+    word_rects = np.array([w[:4] for w in words], dtype=np.float32).reshape(-1, 4)
+
+    lines: Dict[Tuple[int, int], List[int]] = {}
+    for i, word in enumerate(words):
+        lines.setdefault((word[5], word[6]), []).append(i)
+
+    colour_words = []
+    for indexes in lines.values():
+        indexes.sort(key=lambda i: words[i][7])
+        text, starts = "", []
+        for i in indexes:
+            starts.append(len(text))
+            text += words[i][4] + " "
+        for match in COLOR_REGEX.finditer(text):
+            covered = [i for i, start in zip(indexes, starts)
+                       if start < match.end() and start + len(words[i][4]) > match.start()]
+            box = word_rects[covered]
+            colour_words.append({
+                "name": match.group(1).title(),
+                "bbox": [float(box[:, 0].min()), float(box[:, 1].min()), float(box[:, 2].max()), float(box[:, 3].max())],
+            })
+    return word_rects, colour_words
+
+def _rect_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, M) gaps between (N, 4) and (M, 4) rectangles; 0 where they touch or overlap."""
+    dx = np.maximum(0, np.maximum(a[:, None, 0] - b[None, :, 2], b[None, :, 0] - a[:, None, 2]))
+    dy = np.maximum(0, np.maximum(a[:, None, 1] - b[None, :, 3], b[None, :, 1] - a[:, None, 3]))
+    return np.hypot(dx, dy)
+
+def _has_nearby_text(bbox: Optional[List[float]], word_rects: np.ndarray, max_distance: float) -> bool:
+    """True if any text-layer word lies on or within `max_distance` of `bbox`."""
+    if bbox is None or not len(word_rects):
         return False
+    return bool((_rect_distances(np.array([bbox], dtype=np.float32), word_rects) <= max_distance).any())
 
-    # Match shapes using a metric (e.g., Hu moments). Lower values mean a better match.
-    match_value = cv2.matchShapes(template_contour, contour, cv2.CONTOURS_MATCH_I1, 0.0)
-    print(f"Match value: {match_value}")
-    
-    return match_value < threshold
+def _inside_embedded(rect: fitz.Rect, placements: np.ndarray) -> bool:
+    """Whether `rect` (PDF points) is the subject of one of the embedded image placements (N, 4)."""
+    area = rect.width * rect.height
+    if not len(placements) or area <= 0:
+        return False
+    overlap_w = np.minimum(placements[:, 2], rect.x1) - np.maximum(placements[:, 0], rect.x0)
+    overlap_h = np.minimum(placements[:, 3], rect.y1) - np.maximum(placements[:, 1], rect.y0)
+    overlap = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+    placement_areas = (placements[:, 2] - placements[:, 0]) * (placements[:, 3] - placements[:, 1])
+    return bool(((overlap >= EMBEDDED_CONTAINMENT * area)
+                 & (area >= EMBEDDED_SUBJECT_FRACTION * placement_areas)).any())
 
-def _extract_from_pdf(pdf_bytes: bytes) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+
+def _link_text_colours(images: List[Dict[str, Any]], colour_words: List[Dict[str, Any]],
+                       max_distance: float) -> None:
+    """Add each text-layer colour word to the `text_colours` of the nearest image within `max_distance`."""
+    placed = [img for img in images if img.get("bbox")]
+    if not placed or not colour_words:
+        return
+    distances = _rect_distances(np.array([c["bbox"] for c in colour_words], dtype=np.float32),
+                                np.array([img["bbox"] for img in placed], dtype=np.float32))
+    nearest = distances.argmin(axis=1)
+    for colour, index, distance in zip(colour_words, nearest, distances[np.arange(len(nearest)), nearest]):
+        if distance <= max_distance and colour["name"] not in placed[index]["text_colours"]:
+            placed[index]["text_colours"].append(colour["name"])
+
+def _save_derivatives(source: Union[bytes, Image.Image], filename: str) -> Dict[str, Dict[str, Any]]:
     """
-    Extracts images and text colors from a PDF. It first attempts to extract
-    embedded images, then falls back to a robust rasterization and contour
-    detection method to capture all other visual elements.
-    
+    Write the thumbnail/preview derivatives of an extracted image next to it.
+
+    Returns:
+        {name: {"filename", "path", "width", "height", "format", "size_kb"}}
+        for each derivative written; empty if the image is already small
+    """
+    stem = os.path.splitext(filename)[0]
+    saved = {}
+    try:
+        derivatives = make_derivatives(source)
+    except Exception as e:
+        log.warning("Could not create derivatives", filename=filename, error=str(e))
+        return saved
+    for name, derivative in derivatives.items():
+        derivative_filename = derivative_name(stem, name, derivative["format"])
+        try:
+            with open(os.path.join(EXTRACTED_IMAGES_DIR, derivative_filename), "wb") as f:
+                f.write(derivative["data"])
+        except IOError as e:
+            log.error("Failed to save derivative", filename=derivative_filename, error=str(e))
+            continue
+        saved[name] = {
+            "filename": derivative_filename,
+            "path": f"/extracted_images/{derivative_filename}",
+            "width": derivative["width"],
+            "height": derivative["height"],
+            "format": derivative["format"].upper(),
+            "size_kb": len(derivative["data"]) / 1024,
+        }
+    return saved
+
+
+def _extract_page(pdf_path: str, page_index: int, options: Dict[str, Any] = None,
+                  skip_xrefs: Collection[int] = ()) -> Dict[str, Any]:
+    """
+    Extracts images and text colors from a single PDF page. It first attempts
+    to extract embedded images, then falls back to a robust rasterization and
+    contour detection method to capture all other visual elements.
+
+    Each call opens the document itself, so pages can be spread across
+    worker processes.
+
     Args:
-        pdf_bytes: Binary content of the PDF file
-        
+        pdf_path: Path of the PDF file on disk
+        page_index: 0-based index of the page to process
+        options: Extraction parameters (default: DEFAULT_EXTRACTION_OPTIONS)
+        skip_xrefs: Embedded images already extracted from an earlier page
+
     Returns:
-        Tuple containing:
-        - List of page data (text, colors, etc.)
-        - List of processed rows with images and metadata
+        Dict with the page data (text, colors, etc.) under "page" and the
+        processed row with images and metadata under "row"
     """
-    print(f"[DEBUG] Starting PDF extraction, PDF size: {len(pdf_bytes)} bytes")
-    
-    if not pdf_bytes or len(pdf_bytes) < 100:  # Minimum PDF header size
-        print("[ERROR] Invalid or empty PDF content")
-        return [], []
-        
-    processed_images = {}  # Use dict to deduplicate images
+    options = {**DEFAULT_EXTRACTION_OPTIONS, **(options or {})}
+    page_number = page_index + 1
+    # Exact and perceptual signatures of the images kept on this page
+    dedup_index = DedupIndex(max_distance=options["dedup_distance"])
     tshirt_images = []
     other_images = []
-    
-    # Create the t-shirt template once
-    tshirt_template = _create_tshirt_template()
-    
-    # Using a temporary file is more robust for libraries like PyMuPDF
-    tmp_pdf_path = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-            tmp_pdf.write(pdf_bytes)
-            tmp_pdf_path = tmp_pdf.name
-            print(f"[DEBUG] Saved PDF to temporary file: {tmp_pdf_path}")
-
-        with fitz.open(tmp_pdf_path) as doc:
-            if not doc.page_count:
-                print("[WARNING] PDF has no pages")
-                return [], []
-                
-            print(f"[DEBUG] Opened PDF with {doc.page_count} pages")
-            page = doc[0]  # Process only first page for now
-            
-            # --- 1. Extract Colors from Text (OCR) ---
-            print("\n[DEBUG] ====== TEXT EXTRACTION ======")
-            print("[DEBUG] Extracting text from PDF...")
-            try:
+
+    # Garment templates (descriptors precomputed once per process)
+    classifier = get_garment_classifier()
+    # Text regions of every image on the page, OCR'd in one tesseract call
+    ocr_batch = OcrBatch() if options["ocr"] and tesseract_available() else None
+    # Text-layer word boxes; images with vector text nearby are not OCR'd
+    word_rects = np.zeros((0, 4), dtype=np.float32)
+    colour_words = []
+    # Wall time per stage, returned with the page and recorded by the serving process
+    timer = StageTimer()
+
+    with timer.stage("open"):
+        doc = fitz.open(pdf_path)
+        page = doc[page_index]
+
+    with doc:
+        # --- 1. Extract Colors from Text (OCR) ---
+        try:
+            with timer.stage("text"):
                 full_text = page.get_text()
-                print(f"[DEBUG] Extracted text (first 1000 chars):\n{full_text[:1000]}...")
-                
                 color_matches = COLOR_REGEX.findall(full_text)
-                print(f"[DEBUG] Raw color matches: {color_matches}")
-                
-                unique_colors = list(dict.fromkeys([c.title() for c in color_matches if c.strip()]))
-                
-                page_data = {
-                    "page": 1,
-                    "text_colours": unique_colors,
-                }
-                print(f"[DEBUG] Extracted {len(unique_colors)} unique text colors: {unique_colors}")
-                
+            log.debug("Extracted page text", page=page_number, chars=len(full_text), colour_matches=len(color_matches))
+
+            unique_colors = list(dict.fromkeys([c.title() for c in color_matches if c.strip()]))
+
+            page_data = {
+                "page": page_number,
+                "text_colours": unique_colors,
+            }
+            if options["text_layer"]:
+                with timer.stage("text"):
+                    word_rects, colour_words = _page_words(page)
+            log.debug("Text colours", page=page_number, colours=unique_colors)
+
+        except Exception as e:
+            log.error("Error extracting text colours", page=page_number, error=str(e), exc_info=True)
+            page_data = {
+                "page": page_number,
+                "text_colours": [],
+                "error": f"Text extraction error: {str(e)}"
+            }
+
+        # --- 2. Extract only t-shirt images ---
+        # First, try to find t-shirt images in embedded images. Masks, icons
+        # and shared xrefs are filtered on metadata; only survivors are read.
+        image_list, skipped = _embedded_candidates(page, options, skip_xrefs)
+        page_data["embedded_skipped"] = skipped
+        tshirt_found = False
+
+        log.debug("Embedded images", page=page_number, candidates=len(image_list), skipped=skipped)
+
+        for img_index, img in image_list:
+            try:
+                xref = img[0]
+                with timer.stage("embedded_extract"):
+                    base_image = doc.extract_image(xref)
+                if not base_image or "image" not in base_image:
+                    log.warning("Could not extract image data", page=page_number, xref=xref)
+                    continue
+
+                image_bytes = base_image["image"]
+                if not image_bytes or len(image_bytes) < 10:  # Minimum size check
+                    log.warning("Empty or invalid image data", page=page_number, xref=xref)
+                    continue
+
+                width = base_image.get("width", 0)
+                height = base_image.get("height", 0)
+                ext = base_image.get("ext", "png").lower()
+
+                log.debug("Extracted embedded image", page=page_number, xref=xref, width=width, height=height,
+                          format=ext, bytes=len(image_bytes))
+
+                # Hash the raw buffer; near-duplicates are checked once decoded
+                img_hash = content_hash(image_bytes)
+                if dedup_index.find(img_hash) is not None:
+                    log.debug("Skipping duplicate image", page=page_number, xref=xref, content_hash=img_hash)
+                    continue
+
+                # Decode once; the signature, palette and OCR all reuse it
+                try:
+                    with timer.stage("decode"):
+                        pil_image = Image.open(BytesIO(image_bytes))
+                        pil_image.load()
+                        signature = image_signature(pil_image)
+                except Exception as e:
+                    log.warning("Could not decode image", page=page_number, xref=xref, error=str(e))
+                    pil_image = None
+                    signature = {"phash": None, "mean_rgb": None}
+                if dedup_index.find(None, signature["phash"], signature["mean_rgb"]) is not None:
+                    log.debug("Skipping near-duplicate image", page=page_number, xref=xref)
+                    continue
+
+                # Classify the silhouette of large enough images against the garment templates
+                garment = None
+                if pil_image is not None and min(width, height) >= options["min_embedded_size"]:
+                    with timer.stage("shape_match"):
+                        outline = garment_outline(pil_image)
+                        if outline is not None:
+                            garment = classifier.classify([outline], options["match_threshold"],
+                                                          options["fourier_threshold"])[0]
+
             except Exception as e:
-                print(f"[ERROR] Error extracting text colors: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                page_data = {
-                    "page": 1,
-                    "text_colours": [],
-                    "error": f"Text extraction error: {str(e)}"
-                }
-
-            # --- 2. Extract only t-shirt images ---
-            print("\n[DEBUG] ====== T-SHIRT IMAGE EXTRACTION ======")
-            print(f"[INFO] Attempting to extract t-shirt images from page {page.number + 1}")
-            
-            # First, try to find t-shirt images in embedded images
-            image_list = page.get_images(full=True)
-            tshirt_found = False
-            
-            print(f"[DEBUG] Found {len(image_list)} embedded images in PDF")
-            if image_list:
-                print(f"[DEBUG] Scanning embedded images for t-shirt designs...")
-            
-            if image_list:
-                for img_index, img in enumerate(image_list, 1):
-                    try:
-                        xref = img[0]
-                        print(f"[DEBUG] Extracting image {img_index} with xref {xref}")
-                        
-                        base_image = doc.extract_image(xref)
-                        if not base_image or "image" not in base_image:
-                            print(f"[WARNING] Could not extract image data for xref {xref}")
-                            continue
-                            
-                        image_bytes = base_image["image"]
-                        if not image_bytes or len(image_bytes) < 10:  # Minimum size check
-                            print(f"[WARNING] Empty or invalid image data for xref {xref}")
-                            continue
-                            
-                        width = base_image.get("width", 0)
-                        height = base_image.get("height", 0)
-                        ext = base_image.get("ext", "png").lower()
-                        
-                        print(f"[DEBUG] Extracted image {img_index}: {width}x{height}px, format: {ext}, size: {len(image_bytes)} bytes")
-                        
-                        # Simple hash to deduplicate images
-                        img_hash = uuid.uuid5(uuid.NAMESPACE_URL, str(image_bytes)).hex
-                        if img_hash in processed_images:
-                            print(f"[DEBUG] Skipping duplicate image with hash: {img_hash}")
-                            continue
-                            
-                        is_tshirt = is_tshirt_like_dimensions(width, height, min_size=200)
-                        
-                    except Exception as e:
-                        print(f"[ERROR] Error processing image {img_index}: {str(e)}")
-                        continue
-                    
-                    filename = f"embedded_{img_index}_{uuid.uuid4().hex[:6]}.{ext}"
-                    file_path = os.path.join(EXTRACTED_IMAGES_DIR, filename)
-                    
-                    try:
-                        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                        with open(file_path, "wb") as f:
-                            f.write(image_bytes)
-                    except IOError as e:
-                        print(f"[ERROR] Failed to save embedded image {filename}: {e}")
-                        continue  
-
-                    dominant_rgb = ColorThief(BytesIO(image_bytes)).get_color(quality=3)
-                    ocr_colours = _detect_color_names(image_bytes)
-                    
-                    image_data = {
-                        "filename": filename,
-                        "path": f"/extracted_images/{filename}",
-                        "width": width,
-                        "height": height,
-                        "format": ext.upper(),
-                        "size_kb": len(image_bytes) / 1024,
-                        "is_tshirt": is_tshirt,
-                        "aspect_ratio": round(width / height if height > 0 else 0, 2),
-                        "dominant_rgb": dominant_rgb,
-                        "ocr_colours": ocr_colours,
-                        "source": "embedded",
-                        "base64": f"data:image/png;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
-                    }
-                    if is_tshirt:
-                        tshirt_images.append(image_data)
-                    else:
-                        other_images.append(image_data)
+                log.error("Error processing embedded image", page=page_number, index=img_index, error=str(e))
+                continue
 
-                    processed_images[img_hash] = True
-                print(f"[INFO] Successfully extracted {len(tshirt_images) + len(other_images)} embedded images.")
+            filename = f"embedded_p{page_number}_{img_index}_{uuid.uuid4().hex[:6]}.{ext}"
+            file_path = os.path.join(EXTRACTED_IMAGES_DIR, filename)
 
-            # --- 3. Rasterize and find all contours to get all other visual elements ---
-            print("[INFO] Rasterizing page and detecting contours for all visual elements.")
-            
             try:
-                raster_bytes, raster_width, raster_height = render_page_as_image(page, zoom=3.0)
-                if not raster_bytes or len(raster_bytes) < 100:  # Minimum size check
-                    print("[WARNING] Rasterization produced empty or invalid image")
-                else:
-                    print(f"[DEBUG] Rasterized page to {raster_width}x{raster_height} image, {len(raster_bytes)} bytes")
-                
-                pil_img = Image.open(BytesIO(raster_bytes)).convert("RGB")
-                img_array = np.array(pil_img)
-                
-                # Use adaptive thresholding and find a hierarchical tree of contours
-                print("[DEBUG] Detecting contours...")
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-                blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-                thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-                
-                contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-                print(f"[DEBUG] Found {len(contours)} contours in the image")
-                
+                with timer.stage("file_write"):
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    with open(file_path, "wb") as f:
+                        f.write(image_bytes)
+            except IOError as e:
+                log.error("Failed to save embedded image", filename=filename, error=str(e))
+                continue
+
+            with timer.stage("palette"):
+                colours, naming = _image_colours(image_bytes, pil_image, options, page=page_number, xref=xref)
+                dominant_rgb = colours["dominant_rgb"]
+            derivatives = {}
+            if options["derivatives"] and pil_image is not None:
+                with timer.stage("derivatives"):
+                    derivatives = _save_derivatives(pil_image, filename)
+            image_id = f"img_{uuid.uuid4().hex[:8]}"
+            try:
+                placements = page.get_image_rects(xref)
+            except Exception:
+                placements = []
+            bbox = [round(v, 2) for v in placements[0]] if placements else None
+            if (ocr_batch is not None and pil_image is not None
+                    and not _has_nearby_text(bbox, word_rects, options["text_link_distance"])):
+                ocr_batch.add(image_id, pil_image)
+
+            image_data = {
+                "id": image_id,
+                "filename": filename,
+                "path": f"/extracted_images/{filename}",
+                "page": page_number,
+                "width": width,
+                "height": height,
+                "format": ext.upper(),
+                "size_kb": len(image_bytes) / 1024,
+                "garment_type": garment[0] if garment else None,
+                "garment_score": garment[1] if garment else None,
+                "aspect_ratio": round(width / height if height > 0 else 0, 2),
+                "dominant_rgb": dominant_rgb,
+                "dominant_color_name": naming.get("name", "Unknown"),
+                "dominant_pantone": naming.get("pantone"),
+                "palette": colours["palette"],
+                "ocr_colours": [],
+                "text_colours": [],
+                "bbox": bbox,
+                "source": "embedded",
+                "content_hash": img_hash,
+                "derivatives": derivatives,
+                **signature
+            }
+            if garment:
+                tshirt_images.append(image_data)
+            else:
+                other_images.append(image_data)
+
+            dedup_index.add(img_hash, signature["phash"], image_data, signature["mean_rgb"])
+        log.debug("Embedded images extracted", page=page_number, images=len(tshirt_images) + len(other_images))
+
+        # --- 3. Rasterize and find all contours to get all other visual elements ---
+        # Contours are found on a low-zoom render of the whole page; only the
+        # candidate rectangles are re-rendered at full zoom for cropping.
+        detect_zoom = options["detect_zoom"]
+        # Min sizes are given at crop zoom
+        scale = detect_zoom / options["zoom"]
+        min_size = options["min_raster_size"] * scale
+        contours, hierarchy = [], None
+        raster_width = raster_height = 0
+        if not options["rasterize"]:
+            log.debug("Rasterization disabled by the extraction profile", page=page_number)
+        else:
+            try:
+                # Whole page, or in tiles if it would not fit options["raster_memory_mb"]
+                contours, hierarchy, raster = page_contours(page, detect_zoom, options, timer, min_size)
+                raster_width, raster_height = raster["width"], raster["height"]
+                page_data["raster_tiles"] = raster["tiles"]
+                log.debug("Rasterized page", page=page_number, width=raster_width, height=raster_height,
+                          contours=len(contours), tiles=raster["tiles"], stitched=raster["stitched"])
+
             except Exception as e:
-                print(f"[ERROR] Error during page rasterization/contour detection: {str(e)}")
+                log.error("Error during page rasterization/contour detection", page=page_number, error=str(e))
                 contours = []
                 hierarchy = None
-            
-            # Process contours to find t-shirt images
-            for idx, contour in enumerate(contours, 1):
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Skip small or very large contours
-                if w < 100 or h < 100 or w > raster_width * 0.9 or h > raster_height * 0.9:
-                    continue
-                
-                # Skip if not t-shirt like dimensions
-                if not is_tshirt_like_dimensions(w, h, min_size=100):
-                    continue
-                        
-                # Use a stricter threshold for shape matching
-                if not _is_tshirt_like_shape_with_template(contour, tshirt_template, threshold=0.15):
-                    continue
-                        
-                print(f"[DEBUG] Found potential t-shirt at position ({x},{y}) with size {w}x{h}")
-                tshirt_found = True
-                
-                # Crop the original rasterized image to the contour's bounding box
-                cropped_img = pil_img.crop((x, y, x + w, y + h))
+
+        # Vectorized prefilter (hierarchy, size, aspect, area), then batched
+        # shape matching of the survivors
+        with timer.stage("shape_match"):
+            candidates, contour_stats = find_candidates(
+                contours, hierarchy, classifier,
+                min_size=min_size,
+                max_width=raster_width * options["max_page_fraction"],
+                max_height=raster_height * options["max_page_fraction"],
+                min_area=options["min_contour_area"] * scale ** 2,
+                hu_threshold=options["match_threshold"],
+                fourier_threshold=options["fourier_threshold"],
+            )
+        page_data["contour_ms"] = contour_stats["contour_ms"]
+        log.debug("Contour search", page=page_number, contours=contour_stats["contours"],
+                  shape_matched=contour_stats["prefiltered"], candidates=contour_stats["matched"],
+                  ms=contour_stats["contour_ms"])
+
+        # Every image placement on the page, including images extracted from an earlier page
+        placements = np.zeros((0, 4))
+        if candidates:
+            try:
+                placements = np.array([info["bbox"] for info in page.get_image_info()], dtype=float).reshape(-1, 4)
+            except Exception as e:
+                log.warning("Could not read image placements", page=page_number, error=str(e))
+
+        # Process candidates to find t-shirt images
+        for candidate in candidates:
+            idx = candidate["index"] + 1
+            x, y, w, h = candidate["bbox"]
+
+            garment = (candidate["garment_type"], candidate["score"])
+            tshirt_found = True
+
+            clip = fitz.Rect(x, y, x + w, y + h) / detect_zoom
+            if _inside_embedded(clip, placements):
+                log.debug("Skipping the subject of an embedded image", page=page_number, x=x, y=y)
+                continue
+
+            # Render just this region at full zoom, or as close to it as the memory budget allows
+            zoom = crop_zoom(clip, options["zoom"], options["raster_memory_mb"])
+            if zoom < options["zoom"]:
+                log.debug("Lowered the crop zoom to fit the raster memory budget", page=page_number,
+                          x=x, y=y, zoom=round(zoom, 2))
+            try:
+                with timer.stage("render"):
+                    crop_pixels, crop_pixmap = render_page_pixels(page, zoom=zoom, clip=clip)
+            except Exception as e:
+                log.error("Could not render candidate region", page=page_number, x=x, y=y, error=str(e))
+                continue
+            h, w = crop_pixels.shape[:2]
+
+            # Deduplicate on the raw crop pixels before paying for the PNG encode
+            img_hash = content_hash(crop_pixels)
+            if dedup_index.find(img_hash) is not None:
+                continue
+
+            # Crop the original rasterized image to the contour's bounding box
+            cropped_img = Image.fromarray(crop_pixels)
+            signature = image_signature(cropped_img)
+            if dedup_index.find(None, signature["phash"], signature["mean_rgb"]) is not None:
+                log.debug("Skipping near-duplicate crop", page=page_number, x=x, y=y)
+                continue
+
+            with timer.stage("encode"):
                 cropped_bytes_io = BytesIO()
                 cropped_img.save(cropped_bytes_io, format="PNG")
                 cropped_bytes = cropped_bytes_io.getvalue()
-                
-                img_hash = uuid.uuid5(uuid.NAMESPACE_URL, str(cropped_bytes)).hex
-                if img_hash in processed_images:
+
+            # Generate a unique filename and path for database requirements
+            filename = f"raster_p{page_number}_{idx}_{uuid.uuid4().hex[:6]}.png"
+            file_path = f"/extracted_images/{filename}"
+
+            # Save the crop so it can be served and referenced instead of inlined
+            try:
+                with timer.stage("file_write"):
+                    with open(os.path.join(EXTRACTED_IMAGES_DIR, filename), "wb") as f:
+                        f.write(cropped_bytes)
+            except IOError as e:
+                log.error("Failed to save raster crop", filename=filename, error=str(e))
+                continue
+
+            with timer.stage("palette"):
+                colours, naming = _image_colours(cropped_bytes, crop_pixels, options, page=page_number,
+                                                 filename=filename)
+                dominant_rgb = colours["dominant_rgb"]
+            derivatives = {}
+            if options["derivatives"]:
+                with timer.stage("derivatives"):
+                    derivatives = _save_derivatives(cropped_img, filename)
+            image_id = f"img_{uuid.uuid4().hex[:8]}"
+            bbox = [round(v, 2) for v in clip]
+            if ocr_batch is not None and not _has_nearby_text(bbox, word_rects, options["text_link_distance"]):
+                ocr_batch.add(image_id, crop_pixels)
+
+            image_metadata = {
+                "id": image_id,
+                "filename": filename,
+                "path": file_path,
+                "page": page_number,
+                "width": w,
+                "height": h,
+                "format": "PNG",
+                "size_kb": len(cropped_bytes) / 1024,
+                "garment_type": garment[0] if garment else None,
+                "garment_score": garment[1] if garment else None,
+                "aspect_ratio": round(w / h, 2) if h > 0 else 0,
+                "dominant_rgb": dominant_rgb,
+                "dominant_color_name": naming.get("name", "Unknown"),
+                "dominant_pantone": naming.get("pantone"),
+                "palette": colours["palette"],
+                "ocr_colours": [],
+                "text_colours": [],
+                "bbox": bbox,
+                "source": "rasterized",
+                "content_hash": img_hash,
+                "derivatives": derivatives,
+                **signature
+            }
+            if garment:
+                tshirt_images.append(image_metadata)
+            else:
+                other_images.append(image_metadata)
+            dedup_index.add(img_hash, signature["phash"], image_metadata, signature["mean_rgb"])
+
+
+        # --- 4. Colour names: text layer first, OCR for images without nearby text ---
+        _link_text_colours(tshirt_images + other_images, colour_words, options["text_link_distance"])
+
+        ocr_words = {}
+        if ocr_batch is not None and len(ocr_batch):
+            try:
+                ocr_words = ocr_batch.run(options["ocr_min_confidence"])
+            except Exception as e:
+                log.warning("OCR-based colour detection failed", page=page_number, error=str(e))
+        for img in tshirt_images + other_images:
+            # Fall back to the nearest named colour of the dominant colour
+            names = _colour_names_from_words(ocr_words.get(img["id"], []))
+            if not names and img["dominant_color_name"] != "Unknown":
+                names = [img["dominant_color_name"]]
+            img["ocr_colours"] = names
+        page_data["ocr_ms"] = round(ocr_batch.elapsed_ms, 1) if ocr_batch is not None else 0.0
+        page_data["ocr_images"] = ocr_batch.images if ocr_batch is not None else 0
+        if ocr_batch is not None:
+            timer.add("ocr", ocr_batch.elapsed_ms)
+
+    # Extract colors only from t-shirt images
+    all_colors = []
+
+    # Only process colors if we found a t-shirt
+    if tshirt_found and (tshirt_images or other_images):
+        # Add colors from t-shirt images first
+        for img in tshirt_images + other_images:
+            # Add dominant color
+            if 'dominant_rgb' in img and img['dominant_rgb']:
+                all_colors.append({
+                    'name': img.get('dominant_color_name', 'Unknown'),
+                    'source': 'image',
+                    'confidence': 0.9
+                })
+
+            # Add OCR colors
+            for color_name in img.get('ocr_colours', []):
+                all_colors.append({
+                    'name': color_name,
+                    'source': 'image_ocr',
+                    'confidence': 0.7
+                })
+
+    # Add colors from image extraction
+    for img in tshirt_images + other_images:
+        # Add dominant color
+        if 'dominant_rgb' in img and img['dominant_rgb']:
+            all_colors.append({
+                'name': 'Dominant Color',
+                'rgb': {'r': img['dominant_rgb'][0], 'g': img['dominant_rgb'][1], 'b': img['dominant_rgb'][2]},
+                'source': 'image',
+                'confidence': 0.8
+            })
+
+        # Add OCR-detected colors
+        for color_name in img.get('ocr_colours', []):
+            all_colors.append({
+                'name': color_name,
+                'source': 'image_ocr',
+                'confidence': 0.7
+            })
+
+    # Remove duplicates (same name and similar RGB if present)
+    unique_colors = []
+    seen = set()
+    for color in all_colors:
+        # Create a unique key for each color
+        if 'rgb' in color:
+            key = f"{color['name'].lower()}_{color['rgb']['r']}_{color['rgb']['g']}_{color['rgb']['b']}"
+        else:
+            key = color['name'].lower()
+
+        if key not in seen:
+            seen.add(key)
+            unique_colors.append(color)
+
+    # Update page data with colors
+    page_data['colors'] = unique_colors
+
+    row = {
+        "row_index": page_index,
+        "page": page_number,
+        "tshirt_images": tshirt_images,
+        "other_images": other_images,
+        "image_count": len(tshirt_images) + len(other_images)
+    }
+    page_data["stage_ms"] = timer.rounded()
+    log.debug("Page extracted", page=page_number, garment_images=len(tshirt_images),
+              other_images=len(other_images), stage_ms=page_data["stage_ms"])
+    return {"page": page_data, "row": row}
+
+
+def _get_upload_dedup_index():
+    """SQLite index used for cross-upload dedup, or None if DEDUP_INDEX_PATH is not set."""
+    global _upload_dedup_index
+    if _upload_dedup_index is None and DEDUP_INDEX_PATH:
+        _upload_dedup_index = PersistentDedupIndex(DEDUP_INDEX_PATH)
+    return _upload_dedup_index
+
+
+def _remove_extracted_file(filename: str) -> None:
+    try:
+        os.unlink(os.path.join(EXTRACTED_IMAGES_DIR, filename))
+    except OSError:
+        pass
+
+
+def _remove_extracted_image(img: Dict[str, Any]) -> None:
+    """Remove an extracted image and its derivatives."""
+    _remove_extracted_file(img["filename"])
+    for derivative in img.get("derivatives", {}).values():
+        _remove_extracted_file(derivative["filename"])
+
+
+def _existing_derivatives(img: Dict[str, Any], existing: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    The derivatives of `img` renamed after `existing` (a file stored by an
+    earlier upload), or None if any of them is missing on disk.
+    """
+    stem = os.path.splitext(existing)[0]
+    renamed = {}
+    for name, derivative in img.get("derivatives", {}).items():
+        filename = derivative_name(stem, name, derivative["format"].lower())
+        if not os.path.exists(os.path.join(EXTRACTED_IMAGES_DIR, filename)):
+            return None
+        renamed[name] = {**derivative, "filename": filename, "path": f"/extracted_images/{filename}"}
+    return renamed
+
+
+# Image fields that describe the stored file, reused with it by later uploads
+_FILE_FIELDS = ("width", "height", "aspect_ratio", "format", "size_kb", "content_hash", "phash", "mean_rgb")
+
+
+class _PageMerger:
+    """
+    Merges per-page results one at a time, in page order.
+
+    Images repeated on later pages (same bytes or near-identical dHash) are
+    dropped so each appears once per document. With DEDUP_INDEX_PATH set,
+    images already stored by an earlier upload reuse that upload's file.
+    """
+
+    def __init__(self, options: Dict[str, Any] = None):
+        options = {**DEFAULT_EXTRACTION_OPTIONS, **(options or {})}
+        self.dedup_distance = options["dedup_distance"]
+        self.document_index = DedupIndex(max_distance=self.dedup_distance)
+        self.upload_index = _get_upload_dedup_index()
+
+    def add(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        row = result["row"]
+        for group in ("tshirt_images", "other_images"):
+            kept = []
+            for img in row.get(group, []):
+                digest, phash, rgb = img.get("content_hash"), img.get("phash"), img.get("mean_rgb")
+                if self.document_index.find(digest, phash, rgb) is not None:
+                    log.debug("Dropping image repeated from an earlier page", filename=img["filename"])
+                    _remove_extracted_image(img)
                     continue
-                
-                # Generate a unique filename and path for database requirements
-                filename = f"raster_{idx}_{uuid.uuid4().hex[:6]}.png"
-                file_path = f"/extracted_images/{filename}"
-                
-                # Convert image bytes to base64
-                base64_image = base64.b64encode(cropped_bytes).decode('utf-8')
-                
-                dominant_rgb = ColorThief(BytesIO(cropped_bytes)).get_color(quality=3)
-                ocr_colours = _detect_color_names(cropped_bytes)
-                
-                image_metadata = {
-                    "id": f"img_{uuid.uuid4().hex[:8]}",
-                    "filename": filename,
-                    "path": file_path,
-                    "width": w,
-                    "height": h,
-                    "format": "PNG",
-                    "size_kb": len(cropped_bytes) / 1024,
-                    "is_tshirt": is_tshirt,
-                    "aspect_ratio": round(w / h, 2) if h > 0 else 0,
-                    "dominant_rgb": dominant_rgb,
-                    "ocr_colours": ocr_colours,
-                    "source": "rasterized",
-                    "base64": f"data:image/png;base64,{base64_image}"
-                }
-                if is_tshirt:
-                    tshirt_images.append(image_metadata)
-                else:
-                    other_images.append(image_metadata)
-                processed_images[img_hash] = True
-            
-            print(f"[INFO] Extracted {len(tshirt_images)} t-shirt images and {len(other_images)} other images.")
 
+                if self.upload_index is not None and digest:
+                    match = self.upload_index.find(digest, phash, rgb, images_dir=EXTRACTED_IMAGES_DIR,
+                                                   max_distance=self.dedup_distance)
+                    existing = match["filename"] if match else None
+                    if existing and existing != img["filename"]:
+                        _remove_extracted_file(img["filename"])
+                        # A near-duplicate may differ in size or format: describe the file actually served
+                        img.update(match)
+                        img["path"] = f"/extracted_images/{existing}"
+                        # Keep this upload's derivatives only if the earlier upload has none
+                        derivatives = _existing_derivatives(img, existing)
+                        if derivatives is not None:
+                            for derivative in img.get("derivatives", {}).values():
+                                _remove_extracted_file(derivative["filename"])
+                            img["derivatives"] = derivatives
+                    else:
+                        self.upload_index.add(digest, phash, img["filename"], rgb,
+                                              {field: img[field] for field in _FILE_FIELDS if field in img})
+
+                self.document_index.add(digest, phash, img, rgb)
+                kept.append(img)
+            row[group] = kept
+        row["image_count"] = len(row.get("tshirt_images", [])) + len(row.get("other_images", []))
+        _record_page_metrics(result)
+        return result
+
+
+def _record_page_metrics(result: Dict[str, Any]) -> None:
+    """Stage timings and counters of one extracted and merged page."""
+    page = result["page"]
+    _count_page(result["row"], "miss")
+    observe_stages(page.get("stage_ms", {}))
+    for reason, count in page.get("embedded_skipped", {}).items():
+        if count:
+            EMBEDDED_SKIPPED_TOTAL.labels(reason).inc(count)
 
-            # Extract colors only from t-shirt images
-            all_colors = []
-            
-            # Only process colors if we found a t-shirt
-            if tshirt_found and (tshirt_images or other_images):
-                # Add colors from t-shirt images first
-                for img in tshirt_images + other_images:
-                    # Add dominant color
-                    if 'dominant_rgb' in img and img['dominant_rgb']:
-                        all_colors.append({
-                            'name': img.get('dominant_color_name', 'Unknown'),
-                            'source': 'image',
-                            'confidence': 0.9
-                        })
-                    
-                    # Add OCR colors
-                    for color_name in img.get('ocr_colours', []):
-                        all_colors.append({
-                            'name': color_name,
-                            'source': 'image_ocr',
-                            'confidence': 0.7
-                        })
-            
-            # Add colors from image extraction
-            for img in tshirt_images + other_images:
-                # Add dominant color
-                if 'dominant_rgb' in img and img['dominant_rgb']:
-                    all_colors.append({
-                        'name': 'Dominant Color',
-                        'rgb': {'r': img['dominant_rgb'][0], 'g': img['dominant_rgb'][1], 'b': img['dominant_rgb'][2]},
-                        'source': 'image',
-                        'confidence': 0.8
-                    })
-                
-                # Add OCR-detected colors
-                for color_name in img.get('ocr_colours', []):
-                    all_colors.append({
-                        'name': color_name,
-                        'source': 'image_ocr',
-                        'confidence': 0.7
-                    })
-            
-            # Remove duplicates (same name and similar RGB if present)
-            unique_colors = []
-            seen = set()
-            for color in all_colors:
-                # Create a unique key for each color
-                if 'rgb' in color:
-                    key = f"{color['name'].lower()}_{color['rgb']['r']}_{color['rgb']['g']}_{color['rgb']['b']}"
-                else:
-                    key = color['name'].lower()
-                
-                if key not in seen:
-                    seen.add(key)
-                    unique_colors.append(color)
-            
-            # Update page data with colors
-            page_data['colors'] = unique_colors
-            
-            # Prepare the final output
-            processed_rows = [{
-                "row_index": 0,
-                "tshirt_images": tshirt_images,
-                "other_images": other_images,
-                "image_count": len(tshirt_images) + len(other_images)
-            }]
 
-            return [page_data], processed_rows
+def _count_page(row: Dict[str, Any], cache: str) -> None:
+    """Count a returned page and its images; `cache` is "hit" for pages replayed from the result cache."""
+    PAGES_TOTAL.labels(cache).inc()
+    for img in row.get("tshirt_images", []) + row.get("other_images", []):
+        IMAGES_TOTAL.labels(img.get("source", "unknown"), cache).inc()
 
+
+def _merge_page_results(results: List[Dict[str, Any]],
+                        options: Dict[str, Any] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Combine per-page results into (pages, processed_rows), ordered by page number."""
+    merger = _PageMerger(options)
+    ordered = [merger.add(r) for r in sorted(results, key=lambda r: r["page"]["page"])]
+    pages = [r["page"] for r in ordered]
+    processed_rows = [r["row"] for r in ordered]
+    return pages, processed_rows
+
+
+def _write_temp_pdf(pdf_bytes: bytes) -> str:
+    """Write the PDF to a temporary file so worker processes can open it by path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
+        tmp_pdf.write(pdf_bytes)
+        return tmp_pdf.name
+
+
+def _remove_temp_pdf(tmp_pdf_path: str) -> None:
+    try:
+        if os.path.exists(tmp_pdf_path):
+            os.unlink(tmp_pdf_path)
     except Exception as e:
-        print(f"[ERROR] Error in _extract_from_pdf: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.warning("Could not remove temporary file", path=tmp_pdf_path, error=str(e))
+
+
+def _extract_from_pdf(pdf: Union[bytes, str], pages: Optional[str] = None,
+                      options: Dict[str, Any] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Extracts images and text colors from every selected page of a PDF,
+    one page after another in the calling process. The HTTP endpoints use
+    `_iter_extraction` instead, which spreads pages across workers.
+
+    Args:
+        pdf: Path of the PDF file, or its binary content
+        pages: Optional 1-based page range, e.g. "1-3,5" (default: all pages)
+        options: Extraction parameters (default: DEFAULT_EXTRACTION_OPTIONS)
+
+    Returns:
+        Tuple containing:
+        - List of page data (text, colors, etc.), in page order
+        - List of processed rows with images and metadata, in page order
+    """
+    pdf_size = os.path.getsize(pdf) if isinstance(pdf, str) else len(pdf or b"")
+    log.debug("Starting PDF extraction", bytes=pdf_size)
+
+    if pdf_size < 100:  # Minimum PDF header size
+        log.error("Invalid or empty PDF content", bytes=pdf_size)
         return [], []
-        
+
+    # PyMuPDF and the page workers open the PDF by path
+    pdf_path = pdf if isinstance(pdf, str) else _write_temp_pdf(pdf)
+    try:
+        page_indexes = _parse_page_range(pages, _pdf_page_count(pdf_path))
+        shared = _shared_image_xrefs(pdf_path, page_indexes)
+        return _merge_page_results([_extract_page(pdf_path, i, options, shared[i]) for i in page_indexes], options)
+
+    except PageRangeError:
+        raise
+    except Exception as e:
+        log.error("PDF extraction failed", error=str(e), exc_info=True)
+        return [], []
+
     finally:
-        # Clean up temporary file if it exists
-        if tmp_pdf_path:
+        if pdf_path is not pdf:
+            _remove_temp_pdf(pdf_path)
+
+
+async def _iter_extraction(pdf: SpooledPdf, pages: Optional[str] = None,
+                           options: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async counterpart of `_extract_from_pdf` used by the endpoints, yielding
+    results page by page. A cached result for the same PDF and parameters is
+    replayed; otherwise the whole document holds one engine slot while each
+    selected page runs as its own task in the worker pool, so an N-page PDF
+    uses up to N cores, and the merged result is cached at the end.
+
+    The workers open `pdf.path` directly; the caller owns the file and
+    removes it once the iteration is over.
+
+    The first item is {"cache": "hit" | "miss" | "bypass", "pages": <number
+    of pages that will follow>}. It is yielded once
+    the pages are dispatched, so queue and page-range errors surface before
+    any output. Every following item is one merged {"page": ..., "row": ...}
+    result, in page order, as soon as that page and all before it are done.
+
+    Raises:
+        EngineBusyError: if the extraction queue is full
+        PageRangeError: if `pages` does not fit the document
+    """
+    options = {**DEFAULT_EXTRACTION_OPTIONS, **(options or {})}
+    # Results made without Tesseract are cached as OCR-less, not under the OCR key
+    options["ocr"] = options["ocr"] and await asyncio.to_thread(tesseract_available)
+    log.debug("Starting PDF extraction", bytes=pdf.size, sha256=pdf.sha256)
+
+    cache_key = None
+    if extraction_cache.enabled:
+        cache_key = ExtractionCache.make_key(pdf.sha256, {
+            "version": EXTRACTION_VERSION,
+            "pages": (pages or "").replace(" ", ""),
+            **options,
+        })
+        cached = await asyncio.to_thread(extraction_cache.get, cache_key, EXTRACTED_IMAGES_DIR)
+        if cached is not None:
+            CACHE_LOOKUPS_TOTAL.labels("hit").inc()
+            log.info("Extraction cache hit", sha256=pdf.sha256)
+            yield {"cache": "hit", "pages": len(cached["pages"])}
+            for page_data, row in zip(cached["pages"], cached["processed_rows"]):
+                _count_page(row, "hit")
+                yield {"page": page_data, "row": row}
+            return
+    cache_status = "miss" if cache_key else "bypass"
+    CACHE_LOOKUPS_TOTAL.labels(cache_status).inc()
+
+    if pdf.size < 100:  # Minimum PDF header size
+        log.error("Invalid or empty PDF content", bytes=pdf.size)
+        yield {"cache": cache_status, "pages": 0}
+        return
+
+    merged = []
+    with extraction_engine.slot():
+        tasks = []
+        stopped = False
+        try:
             try:
-                if os.path.exists(tmp_pdf_path):
-                    os.unlink(tmp_pdf_path)
-                    print(f"[DEBUG] Removed temporary file: {tmp_pdf_path}")
+                page_count = await asyncio.to_thread(_pdf_page_count, pdf.path)
             except Exception as e:
-                print(f"[WARNING] Could not remove temporary file {tmp_pdf_path}: {e}")
+                log.error("Could not open PDF", error=str(e))
+                yield {"cache": cache_status, "pages": 0}
+                return
+
+            page_indexes = _parse_page_range(pages, page_count)
+            shared = await asyncio.to_thread(_shared_image_xrefs, pdf.path, page_indexes)
+            log.debug("Dispatching pages to the worker pool", pages=len(page_indexes), page_count=page_count)
+            # A document keeps at most max_workers pages in the pool, submitting the next one as
+            # each finishes, so the documents behind a long one are not queued behind all its pages
+            next_pages = iter(page_indexes)
+
+            def submit_next(_: Optional[asyncio.Future] = None) -> None:
+                index = None if stopped else next(next_pages, None)
+                if index is None:
+                    return
+                task = asyncio.ensure_future(
+                    extraction_engine.run(_extract_page, pdf.path, index, options, shared[index]))
+                # Done callbacks run in the order they were added, so the next page is
+                # submitted before the merge loop below resumes on this one
+                task.add_done_callback(submit_next)
+                tasks.append(task)
+
+            for _ in range(min(extraction_engine.max_workers, len(page_indexes))):
+                submit_next()
+            yield {"cache": cache_status, "pages": len(page_indexes)}
+
+            merger = _PageMerger(options)
+            for position in range(len(page_indexes)):
+                result = await asyncio.to_thread(merger.add, await tasks[position])
+                merged.append(result)
+                yield result
+
+        finally:
+            # Pages not yet started are dropped if the client goes away
+            stopped = True
+            for task in tasks:
+                task.cancel()
+
+    if cache_key and merged:
+        processed_rows = [r["row"] for r in merged]
+        await asyncio.to_thread(
+            extraction_cache.put,
+            cache_key,
+            {"pages": [r["page"] for r in merged], "processed_rows": processed_rows},
+            _row_image_files(processed_rows)
+        )
+
+
+def _row_image_files(processed_rows: List[Dict[str, Any]]) -> List[str]:
+    """Local paths of every image file (and derivative) referenced by the processed rows."""
+    paths = []
+    for row in processed_rows:
+        for img in row.get("tshirt_images", []) + row.get("other_images", []):
+            if img.get("filename"):
+                paths.append(os.path.join(EXTRACTED_IMAGES_DIR, img["filename"]))
+            for derivative in img.get("derivatives", {}).values():
+                paths.append(os.path.join(EXTRACTED_IMAGES_DIR, derivative["filename"]))
+    return paths
+
+
+async def _extract_with_cache(pdf: SpooledPdf, pages: Optional[str] = None,
+                              options: Dict[str, Any] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], str]:
+    """
+    Run `_iter_extraction` to completion.
+
+    Returns:
+        (pages, processed_rows, cache_status) where cache_status is
+        "hit", "miss" or "bypass" (cache disabled)
+    """
+    results = _iter_extraction(pdf, pages, options)
+    header = await results.__anext__()
+    page_data, processed_rows = [], []
+    async for result in results:
+        page_data.append(result["page"])
+        processed_rows.append(result["row"])
+    return page_data, processed_rows, header["cache"]
+
+
+def _image_data_uri(filename: str) -> str:
+    """Read an extracted image from disk and return it as a base64 data URI."""
+    path = os.path.join(EXTRACTED_IMAGES_DIR, os.path.basename(filename))
+    mime_type = mimetypes.guess_type(path)[0] or "image/png"
+    with open(path, "rb") as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+
+def _image_reference(img: Dict[str, Any]) -> Dict[str, Any]:
+    """Image metadata with URLs instead of an inline payload (response_mode=reference)."""
+    return {
+        **img,
+        "url": img.get("path", ""),
+        "base64_url": f"/images/{img.get('filename', '')}/base64",
+    }
+
+
+def _row_reference(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Processed row listing image ids rather than repeating the image dicts."""
+    reference = {k: v for k, v in row.items() if k not in ("tshirt_images", "other_images")}
+    reference["tshirt_image_ids"] = [img.get("id") for img in row.get("tshirt_images", [])]
+    reference["other_image_ids"] = [img.get("id") for img in row.get("other_images", [])]
+    return reference
+
+
+def _inline_images(images: List[Dict[str, Any]],
+                   processed_rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Attach base64 payloads to images and rows (response_mode=inline), reading each file once."""
+    data_uris = {}
+
+    def with_base64(img: Dict[str, Any]) -> Dict[str, Any]:
+        filename = img.get("filename", "")
+        if filename not in data_uris:
+            try:
+                data_uris[filename] = _image_data_uri(filename)
+            except OSError as e:
+                log.warning("Could not read extracted image", filename=filename, error=str(e))
+                data_uris[filename] = ""
+        return {**img, "base64": data_uris[filename]}
+
+    inline_rows = [
+        {
+            **row,
+            "tshirt_images": [with_base64(img) for img in row.get("tshirt_images", [])],
+            "other_images": [with_base64(img) for img in row.get("other_images", [])],
+        }
+        for row in processed_rows
+    ]
+    return [with_base64(img) for img in images], inline_rows
+
+
+def _collect_assets(pages: List[Dict[str, Any]],
+                    processed_rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]]]:
+    """
+    Flatten extraction results for /extract-assets.
+
+    Returns:
+        (images, text_colors, colors)
+    """
+    # Extract all colors from pages and processed rows
+    colors = []
+    text_colors = []
+    images = []
+    seen_ids = set()
+
+    # Get colors from pages (text colors)
+    for page in pages:
+        for color in page.get('text_colours', []):
+            if color and color not in text_colors:
+                text_colors.append(color)
+
+    # Get colors and images from processed rows
+    for row in processed_rows:
+        # Add t-shirt images first, then other images
+        for group, confidence in (('tshirt_images', 0.9), ('other_images', 0.8)):
+            for img in row.get(group, []):
+                if img.get('id') in seen_ids:
+                    continue
+                seen_ids.add(img.get('id'))
+                images.append(img)
+                # Add dominant color from the image
+                if 'dominant_rgb' in img and img['dominant_rgb']:
+                    # Only store the color name
+                    color_name = img.get('dominant_color_name', 'Unknown')
+                    color = {
+                        'name': color_name,
+                        'source': 'image',
+                        'confidence': confidence
+                    }
+                    if img.get('dominant_pantone'):
+                        color['pantone'] = img['dominant_pantone']['code']
+                    colors.append(color)
+
+    # Add text colors to the colors list
+    for color_name in text_colors:
+        colors.append({
+            'name': color_name,
+            'source': 'text',  # This is a valid enum value
+            'confidence': 0.9
+        })
+
+    # Add OCR colors from images with 'image' source (not 'image_ocr')
+    for img in images:
+        for ocr_color in img.get('ocr_colours', []):
+            colors.append({
+                'name': ocr_color,
+                'source': 'image',  # Use 'image' instead of 'image_ocr' to match schema
+                'confidence': 0.7
+            })
+
+    return images, text_colors, colors
+
+
+def _stage_ms(pages: List[Dict[str, Any]], stage: str, cache_status: str) -> float:
+    """Total time of one extraction stage ("ocr_ms", "contour_ms") over a document; 0 on cache hits."""
+    if cache_status == "hit":
+        return 0.0
+    return round(sum(page.get(stage, 0.0) for page in pages), 1)
+
+
+def _assets_response(filename: str, file_size_kb: float, pages: List[Dict[str, Any]],
+                     processed_rows: List[Dict[str, Any]], cache_status: str) -> Dict[str, Any]:
+    """The /extract-assets response body before `_apply_response_mode`."""
+    images, text_colors, colors = _collect_assets(pages, processed_rows)
+    return {
+        "success": True,
+        "metadata": {
+            "filename": filename,
+            "file_size_kb": file_size_kb,
+            "cache": cache_status,
+            "ocr_ms": _stage_ms(pages, "ocr_ms", cache_status),
+            "contour_ms": _stage_ms(pages, "contour_ms", cache_status),
+        },
+        "colors": colors,
+        "text_colors": text_colors,
+        "images": images,
+        "pages": pages,  # Keep original data for debugging
+        "processed_rows": processed_rows  # Keep original data for debugging
+    }
+
+
+def _apply_response_mode(response_data: Dict[str, Any], response_mode: str) -> Dict[str, Any]:
+    """Embed base64 image data ("inline") or replace it with URLs ("reference")."""
+    images, processed_rows = response_data["images"], response_data["processed_rows"]
+    if response_mode == "reference":
+        images = [_image_reference(img) for img in images]
+        processed_rows = [_row_reference(row) for row in processed_rows]
+    else:
+        images, processed_rows = _inline_images(images, processed_rows)
+    return {
+        **response_data,
+        "metadata": {**response_data["metadata"], "response_mode": response_mode},
+        "images": images,
+        "processed_rows": processed_rows,
+    }
+
+
+def _ndjson_line(item: Dict[str, Any]) -> bytes:
+    return (json.dumps(item) + "\n").encode("utf-8")
+
+
+async def _stream_assets_ndjson(filename: str, pdf: SpooledPdf, page_range: Optional[str],
+                                options: Dict[str, Any] = None) -> StreamingResponse:
+    """
+    /extract-assets?response_mode=ndjson: one JSON object per line, emitted as
+    pages complete. Lines are typed: "metadata" first, then an "image" line
+    (reference form, no payload) per image and a "page" line per page, then a
+    final "summary" with the colour lists, or an "error" line.
+
+    The spooled PDF is removed once the response has been sent.
+    """
+    results = _iter_extraction(pdf, page_range, options)
+    # Runs up to the dispatch of the pages so 503/400 can still be returned
+    header = await results.__anext__()
+
+    async def lines():
+        yield _ndjson_line({
+            "type": "metadata",
+            "filename": filename,
+            "file_size_kb": pdf.size / 1024,
+            "cache": header["cache"],
+        })
+        pages, processed_rows = [], []
+        try:
+            async for result in results:
+                row = result["row"]
+                for img in row.get("tshirt_images", []) + row.get("other_images", []):
+                    yield _ndjson_line({"type": "image", **_image_reference(img)})
+                yield _ndjson_line({"type": "page", **result["page"], "image_count": row.get("image_count", 0)})
+                pages.append(result["page"])
+                processed_rows.append(row)
+        except Exception as e:
+            log.error("NDJSON extraction stream failed", error=str(e), exc_info=True)
+            yield _ndjson_line({"type": "error", "error": "Failed to process PDF", "details": str(e)})
+            return
+
+        images, text_colors, colors = _collect_assets(pages, processed_rows)
+        yield _ndjson_line({
+            "type": "summary",
+            "total_pages": len(pages),
+            "total_images": len(images),
+            "ocr_ms": _stage_ms(pages, "ocr_ms", header["cache"]),
+            "contour_ms": _stage_ms(pages, "contour_ms", header["cache"]),
+            "colors": colors,
+            "text_colors": text_colors,
+        })
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Extraction-Cache": header["cache"]},
+        background=BackgroundTask(pdf.remove)
+    )
+
+
+def _busy_response(err: EngineBusyError) -> JSONResponse:
+    """503 response telling the client to retry once the extraction queue drains."""
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Extraction queue is full", "retry_after": err.retry_after},
+        headers={"Retry-After": str(err.retry_after)}
+    )
+
+# --- Asynchronous extraction jobs ---
+
+# Persistent queue behind the /jobs endpoints
+job_store = JobStore()
+
+
+def _check_storage() -> str:
+    if not os.access(EXTRACTED_IMAGES_DIR, os.W_OK):
+        raise OSError(f"{EXTRACTED_IMAGES_DIR} is not writable")
+    return os.path.abspath(EXTRACTED_IMAGES_DIR)
+
+
+def _check_ocr() -> str:
+    if not tesseract_available():
+        raise RuntimeError("Tesseract is not installed; colour names come from the text layer and pixels only")
+    return "tesseract"
+
+
+# Dependency checks behind /readyz, run on demand and cached
+readiness = Readiness()
+readiness.add("storage", _check_storage)
+readiness.add("jobs", job_store.stats)
+readiness.add("ocr", _check_ocr, required=False)
+# Jobs run concurrently per service process; each already spreads its pages over the worker pool
+JOB_RUNNERS = max(1, int(os.getenv("EXTRACTION_JOB_RUNNERS", 2)))
+JOB_POLL_SECONDS = 2.0
+JOB_HEARTBEAT_SECONDS = 10.0
+MAX_JOB_ATTEMPTS = 3
+# Server-sent events: status poll interval and keep-alive comment interval
+JOB_EVENTS_INTERVAL = 0.5
+JOB_EVENTS_KEEPALIVE = 15.0
+
+_job_wakeup: Optional[asyncio.Event] = None
+_job_runners: List[asyncio.Task] = []
+_running_jobs: Dict[str, asyncio.Task] = {}
+_cancelled_jobs: set = set()
+
+
+async def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract one job's PDF, recording progress after every page, and return the response body."""
+    job_id = job["job_id"]
+    # The job store owns the spooled file and removes it when the job finishes
+    pdf = await asyncio.to_thread(spool_path, job_store.pdf_path(job_id))
+    results = _iter_extraction(pdf, job["pages"], job["options"])
+    header = await results.__anext__()
+    await asyncio.to_thread(job_store.progress, job_id, 0, header["pages"], header["cache"])
+
+    pages, processed_rows = [], []
+    async for result in results:
+        pages.append(result["page"])
+        processed_rows.append(result["row"])
+        await asyncio.to_thread(job_store.progress, job_id, len(pages))
+    return _assets_response(job["filename"], job["file_size_kb"], pages, processed_rows, header["cache"])
+
+
+async def _job_heartbeat(job_id: str, task: asyncio.Task) -> None:
+    """Keep the job's lease alive and stop it if it was cancelled from another process."""
+    while not task.done():
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        if await asyncio.to_thread(job_store.heartbeat, job_id) == "cancelled":
+            _cancelled_jobs.add(job_id)
+            task.cancel()
+
+
+async def _process_job(job: Dict[str, Any]) -> None:
+    job_id = job["job_id"]
+    if job["attempts"] > MAX_JOB_ATTEMPTS:
+        log.error("Job interrupted too often, giving up", job_id=job_id, attempts=MAX_JOB_ATTEMPTS)
+        await asyncio.to_thread(job_store.fail, job_id, f"Extraction was interrupted {MAX_JOB_ATTEMPTS} times")
+        return
+
+    log.info("Starting job", job_id=job_id, filename=job["filename"], attempt=job["attempts"])
+    task = asyncio.ensure_future(_run_job(job))
+    _running_jobs[job_id] = task
+    heartbeat = asyncio.ensure_future(_job_heartbeat(job_id, task))
+    try:
+        result = await task
+        await asyncio.to_thread(job_store.complete, job_id, result)
+        log.info("Job done", job_id=job_id, filename=result["metadata"]["filename"], images=len(result["images"]))
+    except asyncio.CancelledError:
+        if job_id not in _cancelled_jobs:
+            raise  # service shutting down; the job is requeued
+        log.info("Job cancelled", job_id=job_id)
+    except EngineBusyError as busy:
+        log.warning("Job postponed", job_id=job_id, reason=str(busy))
+        await asyncio.to_thread(job_store.requeue, job_id)
+        await asyncio.sleep(busy.retry_after)
+    except Exception as e:
+        log.error("Job failed", job_id=job_id, error=str(e), exc_info=True)
+        await asyncio.to_thread(job_store.fail, job_id, str(e))
+    finally:
+        heartbeat.cancel()
+        _running_jobs.pop(job_id, None)
+        _cancelled_jobs.discard(job_id)
+
+
+async def _job_runner() -> None:
+    """Take jobs from the queue one at a time until the service stops."""
+    while True:
+        try:
+            job = await asyncio.to_thread(job_store.claim)
+        except Exception as e:
+            log.error("Could not read the job queue", error=str(e))
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(_job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _job_wakeup.clear()
+            continue
+        await _process_job(job)
+
+
+def _job_response(job: Dict[str, Any], status_code: int = 200) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={**job, "links": job_links(job["job_id"])})
+
+
+async def _job_events(job_id: str) -> AsyncIterator[bytes]:
+    """Server-sent events: "progress" whenever the job changes, then its final status as the event name."""
+    last_state, last_sent = None, 0.0
+    while True:
+        job = await asyncio.to_thread(job_store.get, job_id)
+        if job is None:
+            return
+        state = (job["status"], job["pages_done"], job["pages_total"])
+        now = asyncio.get_running_loop().time()
+        if state != last_state:
+            last_state, last_sent = state, now
+            event = job["status"] if job["status"] in FINISHED_STATES else "progress"
+            yield f"event: {event}\ndata: {json.dumps(job)}\n\n".encode("utf-8")
+            if job["status"] in FINISHED_STATES:
+                return
+        elif now - last_sent >= JOB_EVENTS_KEEPALIVE:
+            last_sent = now
+            yield b": keep-alive\n\n"
+        await asyncio.sleep(JOB_EVENTS_INTERVAL)
 
 # ----------------------- API Endpoints -------------------------
 
+@app.on_event("startup")
+async def start_job_runners():
+    global _job_wakeup
+    _job_wakeup = asyncio.Event()
+    purged = await asyncio.to_thread(job_store.purge)
+    if purged:
+        log.info("Removed expired extraction jobs", jobs=purged)
+    _job_runners.extend(asyncio.ensure_future(_job_runner()) for _ in range(JOB_RUNNERS))
+
+@app.on_event("shutdown")
+async def shutdown_engine():
+    # Interrupted jobs go back to the queue and restart with the next runner
+    for job_id in list(_running_jobs):
+        job_store.requeue(job_id)
+    for runner in _job_runners:
+        runner.cancel()
+    extraction_engine.shutdown()
+
+@app.on_event("startup")
+async def start_warm_up():
+    # The heavy imports and first dependency checks run after the server accepts requests
+    warm_up(lambda: load_modules([cv2, np, fitz]), tesseract_available, readiness.status)
+
+@app.get("/livez")
+async def livez():
+    """Liveness: the process serves requests. Runs no dependency checks."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: storage and the job database are usable. OCR is reported but optional."""
+    status = await asyncio.to_thread(readiness.status)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/")
 async def root():
-    return {"message": "PDF Extractor API is running", "status": "ok"}
+    return {"message": "PDF Extractor API is running", "status": "ok", "engine": extraction_engine.stats()}
+
+@app.get("/stats")
+async def stats():
+    """Worker pool, result cache and job queue counters."""
+    return {"engine": extraction_engine.stats(), "cache": extraction_cache.stats(), "jobs": job_store.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage timings, page/image counters, request latency."""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/profiles")
+async def profiles():
+    """Extraction profiles accepted by ?profile=, with the options each resolves to."""
+    return {
+        "default": DEFAULT_PROFILE,
+        "profiles": {name: {**DEFAULT_EXTRACTION_OPTIONS, **overrides} for name, overrides in EXTRACTION_PROFILES.items()},
+    }
 
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"\n[REQUEST] {request.method} {request.url}")
-    print(f"[HEADERS] {dict(request.headers)}")
-    
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads from their Content-Length, before the body is received."""
+    content_length = request.headers.get("content-length", "")
+    # Multipart framing adds a little to the size of the PDF itself
+    if request.method == "POST" and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + 64 * 1024:
+        return JSONResponse(status_code=413,
+                            content={"error": f"PDF is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Request latency by route template (not raw path, which would include job ids and filenames)."""
+    started = time.perf_counter()
+    status = 500
     try:
         response = await call_next(request)
-        print(f"[RESPONSE] Status: {response.status_code}")
+        status = response.status_code
         return response
-    except Exception as e:
-        print(f"[ERROR] {str(e)}")
-        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.labels(request.method, route, str(status)).observe(elapsed)
+        log.debug("Request", method=request.method, path=request.url.path, status=status,
+                  ms=round(elapsed * 1000, 1))
 
 @app.post("/api/extract-pdf")
-async def extract_pdf(pdf: UploadFile = File(...)):
+async def extract_pdf(pdf: UploadFile = File(...), page_range: Optional[str] = Query(None, alias="pages"),
+                      color_engine: Optional[str] = None, profile: Optional[str] = None):
     """
     Compatible endpoint for LineSheets integration.
     Extracts images and returns them in the expected format.
+
+    Query Parameters:
+    - pages: Optional. 1-based page range such as "1-3,5" (default: all pages)
+    - color_engine: Optional. "numpy" (default) or "colorthief"
+    - profile: Optional. Extraction profile, e.g. "fast-preview", "balanced" or "full-fidelity" (see /profiles)
     """
     try:
         if pdf.content_type != "application/pdf":
             raise HTTPException(status_code=400, detail="File must be a PDF")
 
-        print(f"[INFO] Processing PDF via /api/extract-pdf: {pdf.filename}")
-        pdf_bytes = await pdf.read()
-        pages, processed_rows = _extract_from_pdf(pdf_bytes)
+        options = _request_options(color_engine, profile)
+        log.info("Processing PDF", endpoint="/api/extract-pdf", filename=pdf.filename)
+        with await spool_upload(pdf) as spooled:
+            pages, processed_rows, cache_status = await _extract_with_cache(spooled, page_range, options)
         
         # Extract images in the format expected by LineSheets
         all_images = []
@@ -582,142 +1742,90 @@ async def extract_pdf(pdf: UploadFile = File(...)):
                 "filename": pdf.filename,
                 "total_images": len(all_images),
                 "products": len(image_groups[0]),
-                "swatches": len(image_groups[1])
+                "swatches": len(image_groups[1]),
+                "cache": cache_status,
+                "ocr_ms": _stage_ms(pages, "ocr_ms", cache_status),
+                "contour_ms": _stage_ms(pages, "contour_ms", cache_status)
             }
         }
         
-        return JSONResponse(content=response_data)
+        return JSONResponse(content=response_data, headers={"X-Extraction-Cache": cache_status})
         
+    except EngineBusyError as busy:
+        log.warning("Request rejected, engine busy", endpoint="/api/extract-pdf", reason=str(busy))
+        return _busy_response(busy)
+    except UploadRejectedError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    except ExtractionRequestError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        print(f"[ERROR] /api/extract-pdf failed: {str(e)}")
+        log.error("Request failed", endpoint="/api/extract-pdf", error=str(e), exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"error": "Failed to process PDF", "details": str(e)}
         )
 
 @app.post("/extract-assets")
-async def extract_assets(pdf: UploadFile = File(...)):
+async def extract_assets(pdf: UploadFile = File(...), page_range: Optional[str] = Query(None, alias="pages"),
+                         response_mode: str = "inline", color_engine: Optional[str] = None,
+                         profile: Optional[str] = None):
     """
     Analyzes an uploaded PDF, extracts potential t-shirt images and color information.
+
+    Query Parameters:
+    - pages: Optional. 1-based page range such as "1-3,5" (default: all pages)
+    - response_mode: Optional. "inline" (default) embeds base64 image data,
+      "reference" returns only image URLs (base64 on demand from
+      /images/{filename}/base64), "ndjson" streams one JSON line per image/page
+    - color_engine: Optional. "numpy" (default) or "colorthief"
+    - profile: Optional. Extraction profile, e.g. "fast-preview", "balanced" or "full-fidelity" (see /profiles)
     
     Returns:
         JSONResponse: A JSON object containing metadata, extracted pages, and images.
     """
-    print("\n" + "="*80)
-    print("[DEBUG] ====== NEW PDF UPLOAD ======")
-    print(f"[DEBUG] File: {pdf.filename}")
-    print(f"[DEBUG] Content-Type: {pdf.content_type}")
-    print(f"[DEBUG] Current working directory: {os.getcwd()}")
-    print(f"[DEBUG] Extracted images directory: {os.path.abspath(EXTRACTED_IMAGES_DIR)}")
-    print("="*80 + "\n")
-    
     # Ensure the output directory exists
     os.makedirs(EXTRACTED_IMAGES_DIR, exist_ok=True)
-    print(f"[DEBUG] Output directory exists: {os.path.isdir(EXTRACTED_IMAGES_DIR)}")
-    print(f"[DEBUG] Output directory writable: {os.access(EXTRACTED_IMAGES_DIR, os.W_OK)}")
     try:
         if pdf.content_type != "application/pdf":
             raise HTTPException(status_code=400, detail="File must be a PDF")
 
-        print(f"[INFO] Processing PDF: {pdf.filename}")
-        pdf_bytes = await pdf.read()
-        pages, processed_rows = _extract_from_pdf(pdf_bytes)
+        if response_mode not in RESPONSE_MODES:
+            return JSONResponse(status_code=400, content={"error": f"response_mode must be one of {', '.join(RESPONSE_MODES)}"})
+
+        options = _request_options(color_engine, profile)
+        log.info("Processing PDF", endpoint="/extract-assets", filename=pdf.filename, response_mode=response_mode)
+        spooled = await spool_upload(pdf)
+        if response_mode == "ndjson":
+            try:
+                return await _stream_assets_ndjson(pdf.filename, spooled, page_range, options)
+            except BaseException:
+                spooled.remove()
+                raise
+        with spooled:
+            pages, processed_rows, cache_status = await _extract_with_cache(spooled, page_range, options)
         
-        # Log summary for debugging and monitoring
-        print("\n[EXTRACTION SUMMARY]")
-        print("=" * 70)
-        total_colors = sum(len(page.get('text_colours', [])) for page in pages)
-        total_images = sum(len(row.get('tshirt_images', [])) + len(row.get('other_images', [])) for row in processed_rows)
-        print(f"Total pages processed: {len(pages)}")
-        print(f"Total colors extracted: {total_colors}")
-        print(f"Total images extracted: {total_images}")
-        print("-" * 70)
+        log.info(
+            "Extraction summary", filename=pdf.filename, cache=cache_status, pages=len(pages),
+            text_colours=sum(len(page.get('text_colours', [])) for page in pages),
+            images=sum(len(row.get('tshirt_images', [])) + len(row.get('other_images', [])) for row in processed_rows),
+        )
         
-        # Extract all colors from pages and processed rows
-        colors = []
-        text_colors = []
-        images = []
+        response_data = _assets_response(pdf.filename, spooled.size / 1024, pages, processed_rows, cache_status)
+        response_data = await asyncio.to_thread(_apply_response_mode, response_data, response_mode)
         
-        # Get colors from pages (text colors)
-        for page in pages:
-            for color in page.get('text_colours', []):
-                if color and color not in text_colors:
-                    text_colors.append(color)
-                    
-        # Get colors and images from processed rows
-        for row in processed_rows:
-            # Add t-shirt images
-            for img in row.get('tshirt_images', []):
-                if img not in images:
-                    images.append(img)
-                    # Add dominant color from t-shirt images
-                    if 'dominant_rgb' in img and img['dominant_rgb']:
-                        rgb = img['dominant_rgb']
-                        # Only store the color name
-                        color_name = img.get('dominant_color_name', 'Unknown')
-                        colors.append({
-                            'name': color_name,
-                            'source': 'image',
-                            'confidence': 0.9
-                        })
-            
-            # Add other images
-            for img in row.get('other_images', []):
-                if img not in images:
-                    images.append(img)
-                    # Add dominant color from other images
-                    if 'dominant_rgb' in img and img['dominant_rgb']:
-                        rgb = img['dominant_rgb']
-                        # Only store the color name
-                        color_name = img.get('dominant_color_name', 'Unknown')
-                        colors.append({
-                            'name': color_name,
-                            'source': 'image',
-                            'confidence': 0.8
-                        })
-        
-        # Add text colors to the colors list
-        for color_name in text_colors:
-            colors.append({
-                'name': color_name,
-                'source': 'text',  # This is a valid enum value
-                'confidence': 0.9
-            })
-            
-        # Add OCR colors from images with 'image' source (not 'image_ocr')
-        for img in images:
-            for ocr_color in img.get('ocr_colours', []):
-                colors.append({
-                    'name': ocr_color,
-                    'source': 'image',  # Use 'image' instead of 'image_ocr' to match schema
-                    'confidence': 0.7
-                })
-        
-        # Prepare the response data
-        response_data = {
-            "success": True,
-            "metadata": {
-                "filename": pdf.filename,
-                "file_size_kb": len(pdf_bytes) / 1024,
-            },
-            "colors": colors,
-            "text_colors": text_colors,
-            "images": [
-                {**img, "base64": img.get("base64", "")} 
-                for img in images
-            ],
-            "pages": pages,  # Keep original data for debugging
-            "processed_rows": processed_rows  # Keep original data for debugging
-        }
-        
-        return JSONResponse(content=response_data)
+        return JSONResponse(content=response_data, headers={"X-Extraction-Cache": cache_status})
         
+    except EngineBusyError as busy:
+        log.warning("Request rejected, engine busy", endpoint="/extract-assets", reason=str(busy))
+        return _busy_response(busy)
+    except UploadRejectedError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    except ExtractionRequestError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        print(f"\n=== ERROR in /extract-assets ===")
         import traceback
         error_trace = traceback.format_exc()
-        print(error_trace)
-        print("=" * 70)
+        log.error("Request failed", endpoint="/extract-assets", error=str(e), exc_info=True)
         
         # Return error details in the response for debugging
         error_response = {
@@ -731,6 +1839,105 @@ async def extract_assets(pdf: UploadFile = File(...)):
         )
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/jobs")
+async def create_job(pdf: UploadFile = File(...), page_range: Optional[str] = Query(None, alias="pages"),
+                     color_engine: Optional[str] = None, profile: Optional[str] = None):
+    """
+    Queue a PDF for extraction and return its job id at once (202).
+
+    Poll GET /jobs/{job_id} or stream GET /jobs/{job_id}/events for per-page
+    progress, then fetch GET /jobs/{job_id}/result, which has the same body
+    as /extract-assets.
+
+    Query Parameters:
+    - pages: Optional. 1-based page range such as "1-3,5" (default: all pages)
+    - color_engine: Optional. "numpy" (default) or "colorthief"
+    - profile: Optional. Extraction profile, e.g. "fast-preview", "balanced" or "full-fidelity" (see /profiles)
+    """
+    if pdf.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    try:
+        options = _request_options(color_engine, profile)
+    except ExtractionRequestError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    try:
+        spooled = await spool_upload(pdf)
+    except UploadRejectedError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    try:
+        job = await asyncio.to_thread(job_store.create, pdf.filename, spooled, page_range, options)
+    except JobQueueFullError as e:
+        spooled.remove()
+        log.warning("Job rejected", reason=str(e))
+        return JSONResponse(status_code=503, content={"error": "Job queue is full", "retry_after": 60},
+                            headers={"Retry-After": "60"})
+    log.info("Queued job", job_id=job["job_id"], filename=pdf.filename)
+    if _job_wakeup is not None:
+        _job_wakeup.set()
+    return _job_response(job, status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and per-page progress of an extraction job."""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, response_mode: str = "reference"):
+    """
+    Result of a finished job, in the /extract-assets format. Returns 409
+    with the job status while it is queued or running, or if it failed.
+
+    Query Parameters:
+    - response_mode: Optional. "reference" (default) or "inline"
+    """
+    if response_mode not in ("inline", "reference"):
+        return JSONResponse(status_code=400, content={"error": "response_mode must be inline or reference"})
+    job = await asyncio.to_thread(job_store.get, job_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    result = job.pop("result")
+    if job["status"] != "done" or result is None:
+        return _job_response(job, status_code=409)
+    response_data = await asyncio.to_thread(_apply_response_mode, result, response_mode)
+    return JSONResponse(content={**response_data, "job": job})
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent event stream of a job's progress, ending with "done", "failed" or "cancelled"."""
+    if await asyncio.to_thread(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(_job_events(job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job. Pages already being extracted finish, the rest are dropped."""
+    if not await asyncio.to_thread(job_store.cancel, job_id):
+        job = await asyncio.to_thread(job_store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return _job_response(job, status_code=409)
+
+    task = _running_jobs.get(job_id)
+    if task is not None:
+        _cancelled_jobs.add(job_id)
+        task.cancel()
+    log.info("Cancelled job", job_id=job_id)
+    return _job_response(await asyncio.to_thread(job_store.get, job_id))
+
+@app.get("/images/{filename}/base64")
+async def get_image_base64(filename: str):
+    """Base64 data URI of one extracted image, for clients using response_mode=reference."""
+    filename = os.path.basename(filename)
+    if not os.path.isfile(os.path.join(EXTRACTED_IMAGES_DIR, filename)):
+        raise HTTPException(status_code=404, detail="Image not found")
+    data_uri = await asyncio.to_thread(_image_data_uri, filename)
+    return {"filename": filename, "base64": data_uri}
+
 @app.get("/extracted_images/{filename}")
 async def get_image(filename: str):
     """Serves an extracted image file by its filename."""
@@ -743,33 +1950,44 @@ async def get_image(filename: str):
     if not os.path.exists(image_path):
         raise HTTPException(status_code=404, detail="Image not found")
         
-    return FileResponse(image_path, media_type="image/png")
+    return FileResponse(image_path, media_type=mimetypes.guess_type(image_path)[0] or "image/png")
 
 # --- Example Image Extraction Endpoint (for testing a single image) ---
-def _extract_from_image(img_bytes: bytes) -> dict[str, Any]:
-    """Extract dominant colour and optional OCR colour names from a single image."""
-    dominant_rgb = ColorThief(BytesIO(img_bytes)).get_color(quality=3)
-    ocr_names = _detect_color_names(img_bytes)
+def _extract_from_image(img_bytes: bytes, options: Dict[str, Any] = None) -> dict[str, Any]:
+    """Extract dominant colour, palette and optional OCR colour names from a single image."""
+    options = {**DEFAULT_EXTRACTION_OPTIONS, **(options or {})}
+    pil_image = Image.open(BytesIO(img_bytes))
+    pil_image.load()
+    colours = _dominant_colors(img_bytes, pil_image, options)
+    naming = _name_colours(colours)
+    ocr_names = _detect_color_names(pil_image, options["ocr"], options["ocr_min_confidence"], colours["dominant_rgb"])
 
     return {
-        "dominant_rgb": dominant_rgb,
+        "dominant_rgb": colours["dominant_rgb"],
+        "dominant_color_name": naming.get("name", "Unknown"),
+        "dominant_pantone": naming.get("pantone"),
+        "palette": colours["palette"],
         "ocr_colours": ocr_names,
     }
 
 @app.post("/extract-image")
-async def extract_image(image: UploadFile = File(...)):
-    """Accept a single image file and return its dominant colour (and OCR colour names if available)."""
+async def extract_image(image: UploadFile = File(...), color_engine: Optional[str] = None,
+                        profile: Optional[str] = None):
+    """Accept a single image file and return its dominant colour and palette (and OCR colour names if available)."""
     if image.content_type not in {"image/png", "image/jpeg", "image/jpg"}:
         raise HTTPException(status_code=400, detail="Uploaded file must be a PNG or JPEG image")
 
     try:
+        options = _request_options(color_engine, profile)
         img_bytes = await image.read()
-        result = _extract_from_image(img_bytes)
+        result = await extraction_engine.submit(_extract_from_image, img_bytes, options)
         return JSONResponse(content=result)
+    except EngineBusyError as busy:
+        return _busy_response(busy)
+    except ExtractionRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as err:
-        import traceback
-        print("=== ERROR in /extract-image ===")
-        traceback.print_exc()
+        log.error("Request failed", endpoint="/extract-image", error=str(err), exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal error: {str(err)}")
 
 if __name__ == "__main__":
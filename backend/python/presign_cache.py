@@ -0,0 +1,134 @@
+"""
+In-memory cache of S3 presigned GET URLs.
+
+Signing is cheap, but every grid thumbnail was its own request to Flask that
+signed a fresh URL and answered with a 302, and a new URL also defeats the
+browser cache. Time is divided into fixed windows. Within a window, every
+request for the same (key, content type, expiry) gets the same URL. The URL is
+signed to stay valid for the requested expiry counted from the end of the
+window, so a cached URL is never handed out with less lifetime than asked
+for. Entries expire with their window, and the cache is bounded in size
+(least recently used first).
+
+Configuration (environment variables):
+    PRESIGN_CACHE_WINDOW  Window length in seconds (default: 300)
+    PRESIGN_CACHE_SIZE    Maximum number of cached URLs (default: 10000)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from observability import PRESIGN_LOOKUPS_TOTAL, PRESIGN_SECONDS
+
+CACHE_WINDOW = int(os.getenv("PRESIGN_CACHE_WINDOW", 300))
+CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", 10000))
+# SigV4 presigned URLs are valid for at most one week
+MAX_EXPIRES_IN = 604800
+# Recent signing latencies kept for the p95
+LATENCY_SAMPLES = 1000
+
+
+class PresignCache:
+    """
+    Usage:
+        cache = PresignCache(s3_client.generate_presigned_url, bucket)
+        url, max_age = cache.get("extracted_images/ab/ab12.png", expires_in=3600)
+    """
+
+    def __init__(self, sign: Callable[..., str], bucket: str, window: int = CACHE_WINDOW,
+                 max_entries: int = CACHE_SIZE, clock: Callable[[], float] = time.time):
+        self.sign = sign
+        self.bucket = bucket
+        self.window = max(1, window)
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        # (key, content type, expires_in, window index) -> (url, end of window)
+        self._entries: "OrderedDict[Tuple[str, Optional[str], int, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sign_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._sign_total_ms = 0.0
+        self.signed = 0
+
+    def _sign(self, key: str, content_type: Optional[str], expires_in: int) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ResponseContentType"] = content_type
+        started = time.perf_counter()
+        url = self.sign("get_object", Params=params, ExpiresIn=expires_in)
+        elapsed = (time.perf_counter() - started) * 1000
+        PRESIGN_SECONDS.observe(elapsed / 1000)
+        with self._lock:
+            self._sign_ms.append(elapsed)
+            self._sign_total_ms += elapsed
+            self.signed += 1
+        return url
+
+    def get(self, key: str, expires_in: int = 3600, content_type: Optional[str] = None) -> Tuple[str, int]:
+        """
+        Presigned URL for `key`, valid for at least `expires_in` seconds.
+
+        Returns:
+            (url, max_age): max_age is how long, in seconds, clients may keep
+            reusing this URL (the rest of the current window)
+        """
+        expires_in = max(1, min(int(expires_in), MAX_EXPIRES_IN))
+        now = self.clock()
+        # Short expiries get short windows, and the signed lifetime stays within the SigV4 limit
+        window = max(1, min(self.window, expires_in // 2, MAX_EXPIRES_IN - expires_in))
+        index = int(now // window)
+        window_end = (index + 1) * window
+        max_age = max(1, int(window_end - now))
+        cache_key = (key, content_type, expires_in, index)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                PRESIGN_LOOKUPS_TOTAL.labels("hit").inc()
+                return entry[0], max_age
+            self.misses += 1
+        PRESIGN_LOOKUPS_TOTAL.labels("miss").inc()
+
+        url = self._sign(key, content_type, min(expires_in + max_age, MAX_EXPIRES_IN))
+        with self._lock:
+            self._entries[cache_key] = (url, window_end)
+            self._expire(now)
+        return url, max_age
+
+    def _expire(self, now: float) -> None:
+        """
+        Drop least recently used entries beyond the size bound, and expired
+        entries at the old end of the LRU order. Caller holds the lock.
+        """
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if self._entries[oldest][1] > now:
+                break
+            del self._entries[oldest]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and signing latency, for monitoring and tuning."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            samples = sorted(self._sign_ms)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "window_seconds": self.window,
+                "signed": self.signed,
+                "sign_ms_avg": round(self._sign_total_ms / self.signed, 3) if self.signed else 0.0,
+                "sign_ms_p95": round(samples[int(0.95 * (len(samples) - 1))], 3) if samples else 0.0,
+            }
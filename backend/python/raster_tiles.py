@@ -0,0 +1,404 @@
+"""
+Contour detection on page renders within a memory budget.
+
+Detection renders the whole page at detect_zoom, then holds the pixmap, the
+grayscale, blurred and thresholded copies and findContours' working copy,
+about DETECT_BYTES_PER_PIXEL bytes per pixel. A large-format print layout
+takes several hundred megabytes at detect zoom, and a full-zoom crop of a
+large garment on it takes more. That is enough to get a worker OOM-killed.
+Pages whose render would not fit the budget are processed in tiles instead:
+
+1. The page is split into a grid of tiles that each fit the budget. Each
+   tile is rendered with a halo of TILE_HALO pixels around it, then
+   thresholded and searched for contours on its own.
+2. A contour is complete if it lies in the part of its tile where the
+   threshold equals that of a whole-page render, i.e. the halo minus the
+   blur and threshold neighbourhoods. Complete subtrees are kept once,
+   however many tiles see them.
+3. A contour cut by a tile border is a piece of a larger shape. Connected
+   components are matched across the overlaps of neighbouring tiles to
+   join the pieces. A shape that no tile sees whole, and that could still be
+   a candidate (not larger than max_page_fraction, not smaller than the
+   minimum size), is detected again on a render of only its bounding box.
+   That render uses a lower zoom if the box would not fit the budget.
+
+The result is one contour list with a RETR_TREE hierarchy in page render
+coordinates, as from a single findContours call. The one difference is
+that contours inside a shape too large to be a candidate (a page frame)
+become roots.
+
+Crops are bounded the same way: `crop_zoom` lowers the zoom of a candidate
+region whose render would not fit the budget.
+
+Configuration (environment variables):
+    RASTER_MEMORY_MB  Memory budget of one page or crop render, in MB (default: 256);
+                      the raster_memory_mb extraction option overrides it per profile
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from contour_search import contour_boxes, contour_depths
+from lazy_import import lazy_module
+from observability import StageTimer
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+fitz = lazy_module("fitz")  # PyMuPDF
+
+RASTER_MEMORY_MB = float(os.getenv("RASTER_MEMORY_MB", 256))
+
+# Peak bytes per pixel while detecting contours (pixmap and gray, then the
+# threshold, findContours' copy, component labels and the contours) and
+# while cropping (pixmap, PIL copy, PNG buffer, OCR grayscale)
+DETECT_BYTES_PER_PIXEL = 8
+CROP_BYTES_PER_PIXEL = 12
+# Overlap rendered around each tile (pixels at detect zoom); shapes smaller
+# than this that cross a tile border are still seen whole by one tile
+TILE_HALO = 256
+
+# (x0, y0, x1, y1) in page render pixels
+Box = Tuple[int, int, int, int]
+
+
+def render_page_pixels(page: fitz.Page, zoom: float = 3.0,
+                       clip: Optional[fitz.Rect] = None) -> Tuple[np.ndarray, fitz.Pixmap]:
+    """
+    Render a PDF page, or only the `clip` rectangle of it, straight into an
+    (H, W, 3) RGB array. The array is a view of the pixmap's samples (no PNG
+    round-trip, no copy), so keep the returned pixmap alive while using it.
+    """
+    mat = fitz.Matrix(zoom, zoom)
+    pix = page.get_pixmap(matrix=mat, clip=clip, alpha=False, colorspace=fitz.csRGB)
+    pixels = np.ndarray((pix.height, pix.width, pix.n), dtype=np.uint8,
+                        buffer=pix.samples_mv, strides=(pix.stride, pix.n, 1))
+    return pixels, pix
+
+
+def _budget_pixels(memory_mb: float, bytes_per_pixel: int) -> int:
+    return max(1, int(memory_mb * 1024 * 1024 / bytes_per_pixel))
+
+
+def crop_zoom(clip: fitz.Rect, zoom: float, memory_mb: float) -> float:
+    """`zoom`, lowered if rendering and encoding the `clip` region at it would exceed the budget."""
+    area = max(clip.width * clip.height, 1e-6)
+    return min(zoom, math.sqrt(_budget_pixels(memory_mb, CROP_BYTES_PER_PIXEL) / area))
+
+
+def _threshold(page: fitz.Page, zoom: float, clip: Optional[fitz.Rect], options: Dict[str, Any],
+               timer: StageTimer) -> Tuple[np.ndarray, int, int]:
+    """Adaptive threshold of a render, with the render's origin in device pixels."""
+    with timer.stage("render"):
+        pixels, pixmap = render_page_pixels(page, zoom=zoom, clip=clip)
+    origin_x, origin_y = pixmap.x, pixmap.y
+    with timer.stage("threshold"):
+        gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+        del pixels, pixmap
+        kernel = options["blur_kernel"]
+        blurred = cv2.GaussianBlur(gray, (kernel, kernel), 0)
+        del gray
+        thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                       options["threshold_block"], options["threshold_c"])
+    return thresh, origin_x, origin_y
+
+
+def _find_contours(thresh: np.ndarray, timer: StageTimer) -> Tuple[List[np.ndarray], Optional[np.ndarray]]:
+    with timer.stage("contours"):
+        contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return list(contours), hierarchy
+
+
+def page_contours(page: fitz.Page, zoom: float, options: Dict[str, Any], timer: StageTimer,
+                  min_size: float) -> Tuple[List[np.ndarray], Optional[np.ndarray], Dict[str, Any]]:
+    """
+    Contours of a page rendered at `zoom`, within options["raster_memory_mb"].
+
+    Args:
+        page: the page to render
+        zoom: detection zoom
+        options: extraction options (threshold parameters, max_page_fraction, raster_memory_mb)
+        timer: receives the render, threshold and contours stages
+        min_size: minimum width and height of a candidate; smaller shapes cut by tile borders are not stitched
+
+    Returns:
+        (contours, hierarchy, raster): as cv2.findContours(..., RETR_TREE, ...)
+        on the whole page render, and {"width", "height", "tiles", "stitched"}
+        (tiles is 1 for a whole-page render)
+    """
+    size = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    budget = _budget_pixels(options["raster_memory_mb"], DETECT_BYTES_PER_PIXEL)
+    if size.width * size.height <= budget:
+        thresh, _, _ = _threshold(page, zoom, None, options, timer)
+        height, width = thresh.shape[:2]
+        contours, hierarchy = _find_contours(thresh, timer)
+        return contours, hierarchy, {"width": width, "height": height, "tiles": 1, "stitched": 0}
+    return _TiledDetection(page, zoom, options, timer, budget, size.width, size.height, min_size).run()
+
+
+class _Units:
+    """Contour subtrees collected from tiles and regions, keyed on their root."""
+
+    def __init__(self):
+        self.units: Dict[Tuple[int, ...], Tuple[List[np.ndarray], np.ndarray]] = {}
+        self.nested_keys = set()
+
+    @staticmethod
+    def key(box: Box, points: int) -> Tuple[int, ...]:
+        return (*box, points)
+
+    def add(self, contours: List[np.ndarray], hierarchy: np.ndarray, members: np.ndarray,
+            boxes: np.ndarray) -> None:
+        """Add the subtree of `members` (indexes into contours, root first) with its hierarchy remapped."""
+        remap = np.full(len(contours), -1, dtype=np.int32)
+        remap[members] = np.arange(len(members), dtype=np.int32)
+        links = hierarchy[members]
+        local = np.where(links >= 0, remap[np.maximum(links, 0)], -1)
+        local[0, :2] = -1  # siblings of the root belong to other units
+        keys = [self.key(tuple(int(v) for v in boxes[i]), len(contours[i])) for i in members]
+        self.nested_keys.update(keys[1:])
+        self.units.setdefault(keys[0], ([contours[i] for i in members], local))
+
+    def discard_inside(self, outlines: List[Tuple[np.ndarray, Tuple[int, ...]]]) -> None:
+        """
+        Drop the units whose root lies inside or on one of the `outlines`
+        (contour, key of its own unit): they are nested in it on the whole page.
+        """
+        if not outlines or not self.units:
+            return
+        keys = list(self.units)
+        corners = np.array([key[:2] for key in keys])
+        for outline, own_key in outlines:
+            x0, y0, w, h = cv2.boundingRect(outline)
+            near = np.flatnonzero((corners[:, 0] >= x0) & (corners[:, 0] < x0 + w)
+                                  & (corners[:, 1] >= y0) & (corners[:, 1] < y0 + h))
+            for i in near:
+                key = keys[i]
+                if key == own_key or key not in self.units:
+                    continue
+                first = self.units[key][0][0][0][0]
+                if cv2.pointPolygonTest(outline, (float(first[0]), float(first[1])), False) >= 0:
+                    del self.units[key]
+
+    def merged(self) -> Tuple[List[np.ndarray], Optional[np.ndarray]]:
+        contours: List[np.ndarray] = []
+        links = []
+        for key, (unit_contours, unit_links) in self.units.items():
+            # A root seen elsewhere as a descendant is already part of that subtree
+            if key in self.nested_keys:
+                continue
+            links.append(np.where(unit_links >= 0, unit_links + len(contours), -1))
+            contours.extend(unit_contours)
+        if not contours:
+            return [], None
+        return contours, np.concatenate(links).reshape(1, -1, 4)
+
+
+class _TiledDetection:
+    def __init__(self, page: fitz.Page, zoom: float, options: Dict[str, Any], timer: StageTimer,
+                 budget: int, width: int, height: int, min_size: float):
+        self.page = page
+        self.zoom = zoom
+        self.options = options
+        self.timer = timer
+        self.budget = budget
+        self.width = width
+        self.height = height
+        self.min_size = min_size
+        self.max_width = width * options["max_page_fraction"]
+        self.max_height = height * options["max_page_fraction"]
+        # Pixels next to a render edge whose threshold differs from a whole-page render's
+        self.context = options["blur_kernel"] // 2 + options["threshold_block"] // 2 + 2
+        self.halo = max(TILE_HALO, 2 * self.context)
+        self.units = _Units()
+        # Root contours of the shapes detected again, with their unit keys
+        self.outlines: List[Tuple[np.ndarray, Tuple[int, ...]]] = []
+        # Connected components, numbered across tiles: parent links, bounding boxes, and whether
+        # a tile sees the component whole
+        self.parents: List[int] = []
+        self.boxes: Dict[int, Box] = {}
+        self.complete: Dict[int, bool] = {}
+
+    def _grid(self) -> List[List[Box]]:
+        """Tile cores covering the page, row by row; with its halo each tile fits the budget."""
+        halo = self.halo
+        side = max(int(math.sqrt(self.budget)) - 2 * halo, halo)
+        cols = math.ceil(self.width / side)
+        core_w = math.ceil(self.width / cols)
+        core_h = max(self.budget // (core_w + 2 * halo) - 2 * halo, halo)
+        rows = math.ceil(self.height / core_h)
+        core_h = math.ceil(self.height / rows)
+        return [[(c * core_w, r * core_h, min((c + 1) * core_w, self.width), min((r + 1) * core_h, self.height))
+                 for c in range(cols)] for r in range(rows)]
+
+    def _find(self, label: int) -> int:
+        while self.parents[label] != label:
+            self.parents[label] = self.parents[self.parents[label]]
+            label = self.parents[label]
+        return label
+
+    def _union(self, a: int, b: int) -> None:
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            self.parents[b] = a
+
+    def _reliable(self, x0: int, y0: int, x1: int, y1: int) -> Box:
+        """The part of a render that thresholds as on the whole page: page edges are real edges."""
+        c = self.context
+        return (x0 + c if x0 > 0 else 0, y0 + c if y0 > 0 else 0,
+                x1 - c if x1 < self.width else self.width, y1 - c if y1 < self.height else self.height)
+
+    def _join(self, strip: Tuple[np.ndarray, Box], labels: np.ndarray, origin: Tuple[int, int],
+              reliable: Box) -> None:
+        """Union the components that share pixels in the overlap of a neighbour's strip and this tile."""
+        strip_labels, (sx0, sy0, sx1, sy1) = strip
+        x0, y0 = max(sx0, reliable[0]), max(sy0, reliable[1])
+        x1, y1 = min(sx1, reliable[2]), min(sy1, reliable[3])
+        if x0 >= x1 or y0 >= y1:
+            return
+        a = strip_labels[y0 - sy0:y1 - sy0, x0 - sx0:x1 - sx0]
+        b = labels[y0 - origin[1]:y1 - origin[1], x0 - origin[0]:x1 - origin[0]]
+        shared = (a > 0) & (b > 0)
+        pairs = np.unique((a[shared].astype(np.int64) << 32) | b[shared])
+        for la, lb in zip((pairs >> 32).tolist(), (pairs & 0xFFFFFFFF).tolist()):
+            self._union(la, lb)
+
+    def _tile(self, core: Box, left: Optional[Tuple[np.ndarray, Box]],
+              above: Optional[Tuple[np.ndarray, Box]]) -> Tuple[Tuple[np.ndarray, Box], Tuple[np.ndarray, Box]]:
+        """Detect one tile; returns its label strips facing the right and lower neighbours."""
+        halo = self.halo
+        extent = (max(core[0] - halo, 0), max(core[1] - halo, 0),
+                  min(core[2] + halo, self.width), min(core[3] + halo, self.height))
+        thresh, ox, oy = _threshold(self.page, self.zoom, fitz.Rect(*extent) / self.zoom, self.options, self.timer)
+        th, tw = thresh.shape[:2]
+        # findContours ignores the outermost pixels; the component labels must agree with it
+        thresh[[0, -1], :] = 0
+        thresh[:, [0, -1]] = 0
+        contours, hierarchy = _find_contours(thresh, self.timer)
+        with self.timer.stage("stitch"):
+            count, labels = cv2.connectedComponents(thresh, connectivity=8, ltype=cv2.CV_32S)
+        del thresh
+        offset = len(self.parents)
+        self.parents.extend(range(offset, offset + count))
+        np.add(labels, offset, out=labels, where=labels > 0)  # 0 stays background
+        reliable = self._reliable(ox, oy, ox + tw, oy + th)
+
+        with self.timer.stage("stitch"):
+            if contours:
+                contours = [c + np.array([ox, oy], dtype=c.dtype) for c in contours]
+                self._collect(contours, hierarchy.reshape(-1, 4), labels, (ox, oy), reliable)
+            for strip in (left, above):
+                if strip is not None:
+                    self._join(strip, labels, (ox, oy), reliable)
+
+        # Overlaps with the next tile to the right and the next row, as far as they are reliable here
+        right = (max(core[2] - halo, reliable[0]), reliable[1], reliable[2], reliable[3])
+        below = (reliable[0], max(core[3] - halo, reliable[1]), reliable[2], reliable[3])
+        return tuple((labels[y0 - oy:y1 - oy, x0 - ox:x1 - ox].copy(), (x0, y0, x1, y1))
+                     for x0, y0, x1, y1 in (right, below))
+
+    def _collect(self, contours: List[np.ndarray], hierarchy: np.ndarray, labels: np.ndarray,
+                 origin: Tuple[int, int], reliable: Box) -> None:
+        boxes, _ = contour_boxes(contours)
+        boxes[:, 2:] += boxes[:, :2]
+        complete = ((boxes[:, 0] >= reliable[0]) & (boxes[:, 1] >= reliable[1])
+                    & (boxes[:, 2] <= reliable[2]) & (boxes[:, 3] <= reliable[3]))
+        parents = hierarchy[:, 3]
+        has_parent = parents >= 0
+        depths = contour_depths(hierarchy, len(contours))
+
+        # Subtree roots: complete contours under a cut one. Holes (odd depth) cannot be roots
+        # without changing which contours are outer, so their children are roots instead
+        top = complete & ~(has_parent & complete[np.maximum(parents, 0)])
+        hole = top & (depths % 2 == 1)
+        roots = (top & ~hole) | (has_parent & hole[np.maximum(parents, 0)])
+        root_of = np.where(roots, np.arange(len(contours)), -1)
+        for _ in range(int(depths.max())):
+            root_of = np.where((root_of < 0) & has_parent, root_of[np.maximum(parents, 0)], root_of)
+        order = np.argsort(root_of, kind="stable")
+        order = order[root_of[order] >= 0]
+        if len(order):
+            starts = np.flatnonzero(np.r_[True, root_of[order][1:] != root_of[order][:-1]])
+            for members in np.split(order, starts[1:]):
+                root = root_of[members[0]]
+                members = np.r_[root, members[members != root]]
+                self.units.add(contours, hierarchy, members, boxes)
+
+        # Outer contours, with the component each borders (their first point is one of its pixels)
+        for i in np.flatnonzero(depths % 2 == 0):
+            x, y = contours[i][0][0]
+            label = int(labels[y - origin[1], x - origin[0]])
+            if not label:
+                continue
+            box = tuple(int(v) for v in boxes[i])
+            previous = self.boxes.get(label)
+            self.boxes[label] = box if previous is None else (
+                min(box[0], previous[0]), min(box[1], previous[1]), max(box[2], previous[2]), max(box[3], previous[3]))
+            self.complete[label] = self.complete.get(label, False) or bool(complete[i])
+
+    def _shapes(self) -> List[Box]:
+        """Bounding boxes of the shapes that no tile saw whole and that may be candidates."""
+        shapes: Dict[int, List[Any]] = {}
+        for label, box in self.boxes.items():
+            root = self._find(label)
+            shape = shapes.setdefault(root, [box, False])
+            shape[0] = (min(box[0], shape[0][0]), min(box[1], shape[0][1]),
+                        max(box[2], shape[0][2]), max(box[3], shape[0][3]))
+            shape[1] = shape[1] or self.complete[label]
+        return [box for box, whole in shapes.values() if not whole
+                and self.min_size <= box[2] - box[0] <= self.max_width
+                and self.min_size <= box[3] - box[1] <= self.max_height]
+
+    def _detect_shape(self, box: Box) -> bool:
+        """Detect a shape again on a render of its bounding box; True if it was found."""
+        margin = self.context + 2
+        region = (max(box[0] - margin, 0), max(box[1] - margin, 0),
+                  min(box[2] + margin, self.width), min(box[3] + margin, self.height))
+        area = (region[2] - region[0]) * (region[3] - region[1])
+        zoom = self.zoom * min(1.0, math.sqrt(self.budget / area))
+        thresh, ox, oy = _threshold(self.page, zoom, fitz.Rect(*region) / self.zoom, self.options, self.timer)
+        contours, hierarchy = _find_contours(thresh, self.timer)
+        del thresh
+        if not contours:
+            return False
+        # Back to page render coordinates at detect zoom
+        factor = self.zoom / zoom
+        contours = [np.round((c + np.array([ox, oy])) * factor).astype(np.int32) for c in contours]
+        hierarchy = hierarchy.reshape(-1, 4)
+        corners, _ = contour_boxes(contours)
+        corners[:, 2:] += corners[:, :2]
+        depths = contour_depths(hierarchy, len(contours))
+        outer = np.flatnonzero(depths % 2 == 0)
+        error = np.abs(corners[outer] - np.array(box)).max(axis=1)
+        best = int(np.argmin(error))
+        if error[best] > 2 + 2 * factor:
+            return False
+
+        # The shape's subtree: every contour with it as an ancestor
+        root = outer[best]
+        ancestor = np.arange(len(contours))
+        inside = np.zeros(len(contours), dtype=bool)
+        for _ in range(int(depths.max())):
+            ancestor = np.where(ancestor >= 0, hierarchy[np.maximum(ancestor, 0), 3], -1)
+            inside |= ancestor == root
+        members = np.r_[root, np.flatnonzero(inside)]
+        self.units.add(contours, hierarchy, members, corners)
+        self.outlines.append((contours[root], _Units.key(tuple(int(v) for v in corners[root]), len(contours[root]))))
+        return True
+
+    def run(self) -> Tuple[List[np.ndarray], Optional[np.ndarray], Dict[str, Any]]:
+        grid = self._grid()
+        above: List[Optional[Tuple[np.ndarray, Box]]] = [None] * len(grid[0])
+        for row in grid:
+            left = None
+            for col, core in enumerate(row):
+                left, above[col] = self._tile(core, left, above[col])
+        del left, above
+
+        stitched = sum(self._detect_shape(box) for box in self._shapes())
+        self.units.discard_inside(self.outlines)
+        contours, hierarchy = self.units.merged()
+        return contours, hierarchy, {"width": self.width, "height": self.height,
+                                     "tiles": len(grid) * len(grid[0]), "stitched": stitched}
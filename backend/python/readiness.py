@@ -0,0 +1,117 @@
+"""
+Liveness and readiness of the services, with deferred dependency checks.
+
+The services used to check their dependencies while importing: a blocking
+S3 head_bucket call, a tesseract subprocess. A slow or unreachable
+dependency delayed the start or crashed it, and a replica that started
+with a failing dependency reported it until it was restarted. Checks now
+run on demand and are cached:
+
+- liveness (/livez) only says the process serves requests; it runs no
+  checks, so a slow dependency never gets a healthy replica restarted;
+- readiness (/readyz) runs the registered checks, a success is reused for
+  READINESS_TTL seconds and a failure for READINESS_RETRY seconds, so
+  probes and request handlers can ask as often as they like;
+- a check is required (the replica is not ready without it) or optional
+  (reported, e.g. OCR being unavailable, but the replica is still ready).
+
+Configuration (environment variables):
+    READINESS_TTL    Seconds a successful check is reused (default: 30)
+    READINESS_RETRY  Seconds a failed check is reused before it runs again (default: 5)
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from observability import get_logger
+
+log = get_logger("readiness")
+
+READINESS_TTL = float(os.getenv("READINESS_TTL", 30))
+READINESS_RETRY = float(os.getenv("READINESS_RETRY", 5))
+
+
+class _Check:
+    def __init__(self, fn: Callable[[], Any], required: bool):
+        self.fn = fn
+        self.required = required
+        self.lock = threading.Lock()
+        self.result: Optional[Dict[str, Any]] = None
+        self.expires = 0.0
+
+
+class Readiness:
+    """
+    Named dependency checks, run lazily and cached.
+
+    A check is a callable that returns a detail to report (anything JSON
+    serializable, or None) and raises when the dependency is unusable:
+
+        readiness = Readiness()
+        readiness.add("storage", check_storage)
+        readiness.add("ocr", check_ocr, required=False)
+        if not readiness.ok("storage"): ...
+    """
+
+    def __init__(self, ttl: float = READINESS_TTL, retry: float = READINESS_RETRY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.retry = retry
+        self._clock = clock
+        self._checks: Dict[str, _Check] = {}
+
+    def add(self, name: str, fn: Callable[[], Any], required: bool = True) -> None:
+        self._checks[name] = _Check(fn, required)
+
+    def check(self, name: str) -> Dict[str, Any]:
+        """Cached result of one check: {"ok", "required", "detail" | "error"}."""
+        check = self._checks[name]
+        # One caller runs an expired check; concurrent callers wait for its result
+        with check.lock:
+            if check.result is None or self._clock() >= check.expires:
+                was_ok = check.result is None or check.result["ok"]
+                try:
+                    check.result = {"ok": True, "required": check.required, "detail": check.fn()}
+                except Exception as e:
+                    check.result = {"ok": False, "required": check.required, "error": str(e)}
+                    # Logged when the check starts failing, not on every retry
+                    if was_ok:
+                        log.warning("Readiness check failed", check=name, required=check.required, error=str(e))
+                else:
+                    if not was_ok:
+                        log.info("Readiness check recovered", check=name)
+                check.expires = self._clock() + (self.ttl if check.result["ok"] else self.retry)
+            return check.result
+
+    def ok(self, name: str) -> bool:
+        return self.check(name)["ok"]
+
+    def status(self) -> Dict[str, Any]:
+        """{"ready": every required check passes, "checks": {name: result}}"""
+        checks = {name: self.check(name) for name in self._checks}
+        return {
+            "ready": all(result["ok"] for result in checks.values() if result["required"]),
+            "checks": checks,
+        }
+
+
+def warm_up(*tasks: Callable[[], Any], name: str = "warm-up") -> threading.Thread:
+    """
+    Run start-up work (deferred imports, first checks) in a daemon thread,
+    after the service already accepts requests. Failures are logged; a task
+    left undone simply runs on first use instead.
+    """
+    def run():
+        started = time.perf_counter()
+        for task in tasks:
+            try:
+                task()
+            except Exception as e:
+                log.warning("Warm-up task failed", task=getattr(task, "__name__", repr(task)), error=str(e))
+        log.info("Warm-up finished", ms=round((time.perf_counter() - started) * 1000, 1))
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,296 @@
+"""
+Parallel S3 upload stage for the Flask image extraction service.
+
+Uploading every extracted image with a blocking `put_object` inside the page
+loop costs one full round trip per image. Instead, images are handed to an
+`S3Uploader` as soon as they are extracted: a thread pool uploads them while
+the next pages are still being read, over one connection-pooled boto3 client.
+
+- Small images are sent with a single `put_object`; images above the
+  multipart threshold go through boto3's managed transfer (multipart upload).
+- Each image is retried with exponential backoff and jitter on throttling,
+  5xx and connection errors, on top of botocore's own retries.
+- `UploadBatch` collects the uploads of one request and reports their wall
+  time (`upload_ms`) once they have all finished.
+- With content-addressed keys (`content_key`), an `UploadIndex` remembers
+  which keys are already stored, so an image seen before, earlier in the same
+  PDF or in any earlier upload, skips `put_object` entirely. The index assumes
+  stored objects are not deleted; remove the index file if the bucket is
+  cleared.
+
+Configuration (environment variables):
+    S3_UPLOAD_WORKERS          Concurrent uploads (default: 16)
+    S3_MULTIPART_THRESHOLD_MB  Images from this size are uploaded in parts (default: 8)
+    S3_UPLOAD_ATTEMPTS         Attempts per image (default: 4)
+    S3_UPLOAD_INDEX            SQLite index of stored keys (default: s3_upload_index.sqlite,
+                               empty to disable)
+"""
+
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from observability import get_logger, S3_OBJECTS_TOTAL, STAGE_SECONDS
+
+log = get_logger("s3_uploader")
+
+UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", 16))
+MULTIPART_THRESHOLD = int(float(os.getenv("S3_MULTIPART_THRESHOLD_MB", 8)) * 1024 * 1024)
+UPLOAD_ATTEMPTS = int(os.getenv("S3_UPLOAD_ATTEMPTS", 4))
+UPLOAD_INDEX_PATH = os.getenv("S3_UPLOAD_INDEX", "s3_upload_index.sqlite")
+# First retry delay in seconds; doubled on every further attempt
+BACKOFF_BASE = 0.2
+
+# S3 error codes worth another attempt
+RETRYABLE_CODES = {
+    "RequestTimeout", "RequestTimeoutException", "SlowDown", "Throttling", "ThrottlingException",
+    "InternalError", "ServiceUnavailable", "503", "500",
+}
+
+
+def make_s3_client(access_key_id: Optional[str], secret_access_key: Optional[str], region: str,
+                   max_pool_connections: int = UPLOAD_WORKERS, endpoint_url: Optional[str] = None) -> Any:
+    """
+    boto3 S3 client whose connection pool is large enough for every upload
+    thread to keep its connection open (the botocore default is 10).
+    """
+    config = Config(
+        max_pool_connections=max(10, max_pool_connections),
+        retries={"max_attempts": 3, "mode": "adaptive"},
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=60,
+    )
+    return boto3.client(
+        "s3",
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        region_name=region,
+        endpoint_url=endpoint_url,
+        config=config,
+    )
+
+
+def content_key(prefix: str, data: bytes, ext: str) -> Tuple[str, str]:
+    """
+    Content-addressed key for an object: (key, sha256 hex digest). Identical
+    bytes always map to the same key, e.g. extracted_images/3f/3f9a....png.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{prefix}/{digest[:2]}/{digest}.{ext}", digest
+
+
+class UploadIndex:
+    """SQLite record of the keys already stored in each bucket."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                " bucket TEXT NOT NULL, key TEXT NOT NULL, size INTEGER, stored_at REAL,"
+                " PRIMARY KEY (bucket, key))"
+            )
+
+    def contains(self, bucket: str, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM objects WHERE bucket = ? AND key = ?", (bucket, key)).fetchone()
+        return row is not None
+
+    def add(self, bucket: str, key: str, size: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)", (bucket, key, size, time.time()))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        code = str(error.response.get("Error", {}).get("Code", ""))
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_CODES or status >= 500
+    return isinstance(error, (BotoConnectionError, HTTPClientError))
+
+
+class S3Uploader:
+    """
+    Thread pool uploading objects to one bucket.
+
+    Usage:
+        uploader = S3Uploader(s3_client, "bucket")
+        batch = uploader.batch()
+        batch.add("key", image_bytes, "image/jpeg", meta={"page": 1})
+        uploaded, failed = batch.wait()
+    """
+
+    def __init__(self, client: Any, bucket: str, max_workers: int = UPLOAD_WORKERS,
+                 multipart_threshold: int = MULTIPART_THRESHOLD, attempts: int = UPLOAD_ATTEMPTS,
+                 backoff: float = BACKOFF_BASE, index: Optional[UploadIndex] = None):
+        self.client = client
+        self.bucket = bucket
+        self.index = index
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.multipart_threshold = multipart_threshold
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=max(5 * 1024 * 1024, multipart_threshold // 2),
+            max_concurrency=4,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="s3-upload")
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.multipart_uploads = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes_uploaded = 0
+        self.skipped = 0
+        self.bytes_skipped = 0
+
+    def batch(self) -> "UploadBatch":
+        return UploadBatch(self)
+
+    def submit(self, key: str, body: bytes, content_type: str, **extra: Any) -> Future:
+        """Upload `body` to `key` in the background; the future resolves to the key."""
+        return self._executor.submit(self._upload, key, body, content_type, extra)
+
+    def is_stored(self, key: str) -> bool:
+        """Whether the index records `key` as already uploaded to this bucket."""
+        return self.index is not None and self.index.contains(self.bucket, key)
+
+    def _skip(self, size: int) -> None:
+        with self._lock:
+            self.skipped += 1
+            self.bytes_skipped += size
+        S3_OBJECTS_TOTAL.labels("skipped").inc()
+
+    def _put(self, key: str, body: bytes, content_type: str, extra: Dict[str, Any]) -> None:
+        if len(body) >= self.multipart_threshold:
+            self.client.upload_fileobj(
+                BytesIO(body), self.bucket, key,
+                ExtraArgs={"ContentType": content_type, **extra},
+                Config=self.transfer_config,
+            )
+            with self._lock:
+                self.multipart_uploads += 1
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type, **extra)
+
+    def _upload(self, key: str, body: bytes, content_type: str, extra: Dict[str, Any]) -> str:
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with STAGE_SECONDS.labels("s3_put").time():
+                    self._put(key, body, content_type, extra)
+                with self._lock:
+                    self.uploads += 1
+                    self.bytes_uploaded += len(body)
+                S3_OBJECTS_TOTAL.labels("uploaded").inc()
+                if self.index is not None:
+                    self.index.add(self.bucket, key, len(body))
+                return key
+            except Exception as e:
+                if attempt == self.attempts or not _is_retryable(e):
+                    with self._lock:
+                        self.failures += 1
+                    S3_OBJECTS_TOTAL.labels("failed").inc()
+                    raise
+                with self._lock:
+                    self.retries += 1
+                S3_OBJECTS_TOTAL.labels("retried").inc()
+                delay = self.backoff * (2 ** (attempt - 1))
+                log.warning("Upload failed, retrying", key=key, error=str(e), delay_s=round(delay, 2))
+                time.sleep(delay * random.uniform(0.5, 1.5))
+        raise RuntimeError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "multipart_uploads": self.multipart_uploads,
+                "retries": self.retries,
+                "failures": self.failures,
+                "bytes_uploaded": self.bytes_uploaded,
+                "skipped": self.skipped,
+                "bytes_skipped": self.bytes_skipped,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class UploadBatch:
+    """The uploads of one request, in submission order."""
+
+    def __init__(self, uploader: S3Uploader):
+        self.uploader = uploader
+        self._pending: List[Tuple[Dict[str, Any], Future]] = []
+        self._by_key: Dict[str, Future] = {}
+        self._started: Optional[float] = None
+        self.upload_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, key: str, body: bytes, content_type: str, meta: Dict[str, Any], **extra: Any) -> bool:
+        """
+        Start uploading `body`; `meta` is returned by `wait` with the outcome.
+        Returns False, without uploading, if `key` was already added to this
+        batch or is recorded in the uploader's index.
+        """
+        if self._started is None:
+            self._started = time.perf_counter()
+        future = self._by_key.get(key)
+        if future is None and self.uploader.is_stored(key):
+            future = Future()
+            future.set_result(key)
+            self._by_key[key] = future
+        if future is not None:
+            self.uploader._skip(len(body))
+            self._pending.append((meta, future))
+            return False
+        future = self.uploader.submit(key, body, content_type, **extra)
+        self._by_key[key] = future
+        self._pending.append((meta, future))
+        return True
+
+    def repeat(self, key: str, size: int, meta: Dict[str, Any]) -> None:
+        """
+        Add another `meta` for a key already added to this batch, sharing its
+        outcome. The body is not needed again, so callers need not keep it.
+        """
+        self.uploader._skip(size)
+        self._pending.append((meta, self._by_key[key]))
+
+    def wait(self) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Exception]]]:
+        """
+        Block until every upload has finished.
+
+        Returns:
+            (uploaded, failed): the `meta` of each successful upload, and
+            (meta, error) for each upload that failed after all attempts
+        """
+        uploaded, failed = [], []
+        for meta, future in self._pending:
+            try:
+                future.result()
+                uploaded.append(meta)
+            except Exception as e:
+                failed.append((meta, e))
+        if self._started is not None:
+            self.upload_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        self._pending = []
+        self._by_key = {}
+        return uploaded, failed
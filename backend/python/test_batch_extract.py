@@ -0,0 +1,39 @@
+"""
+Tests for offline batch extraction: retrying the documents of a worker process that died.
+"""
+import json
+import os
+import time
+
+import pytest
+
+import batch_extract
+
+pytest.importorskip("fitz")
+pytest.importorskip("fastapi")
+
+
+def _crash_on_poison(path, pages, options):
+    """Stands in for `_extract_document` in the worker processes."""
+    with batch_extract._running(path):
+        if path.endswith("poison.pdf"):
+            time.sleep(0.5)  # the next document queues up behind it
+            os._exit(1)
+    return {"path": path, "status": "ok"}
+
+
+def test_only_documents_a_dead_worker_had_started_count_an_attempt(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_extract, "_extract_document", _crash_on_poison)
+    # One charged attempt fails a document, so one wrongly charged document shows up in the summary
+    monkeypatch.setattr(batch_extract, "MAX_ATTEMPTS", 1)
+    paths = [str(tmp_path / name) for name in ("a.pdf", "poison.pdf", "b.pdf", "c.pdf")]
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    summary = batch_extract.run_batch(paths, str(output_dir), workers=1, options={}, options_key="{}")
+
+    with open(output_dir / batch_extract.RESULTS_FILE) as f:
+        results = {record["path"]: record for record in map(json.loads, f)}
+    assert (summary["ok"], summary["failed"]) == (3, 1)
+    assert results[paths[1]] == {**results[paths[1]], "status": "failed", "error": "Worker process died"}
+    assert not (output_dir / batch_extract.RUNNING_DIR).exists()
@@ -0,0 +1,106 @@
+"""
+Tests for the on-disk extraction result cache and how the extractor keys it.
+"""
+import asyncio
+import importlib
+import json
+import os
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+
+from extraction_cache import ExtractionCache
+
+
+def _put(cache, tmp_path, key, payload=b"x" * 1000):
+    image = tmp_path / f"{key}.png"
+    image.write_bytes(payload)
+    cache.put(key, {"pages": [key], "processed_rows": []}, [str(image)])
+
+
+def test_hit_restores_the_result_and_its_images(tmp_path):
+    cache = ExtractionCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    _put(cache, tmp_path, "a")
+    os.remove(tmp_path / "a.png")
+
+    assert cache.get("missing") is None
+    assert cache.get("a", restore_images_to=str(tmp_path / "served")) == {"pages": ["a"], "processed_rows": []}
+    assert (tmp_path / "served" / "a.png").read_bytes() == b"x" * 1000
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_make_key_depends_on_content_and_parameters():
+    key = ExtractionCache.make_key("abc", {"zoom": 3.0, "ocr": True})
+
+    assert ExtractionCache.make_key("abc", {"ocr": True, "zoom": 3.0}) == key
+    assert ExtractionCache.make_key("abd", {"zoom": 3.0, "ocr": True}) != key
+    assert ExtractionCache.make_key("abc", {"zoom": 2.0, "ocr": True}) != key
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = ExtractionCache(root=str(tmp_path / "cache"), max_bytes=2500)
+    _put(cache, tmp_path, "a")
+    _put(cache, tmp_path, "b")
+    os.utime(tmp_path / "cache" / "a", (1, 1))
+    os.utime(tmp_path / "cache" / "b", (2, 2))
+    assert cache.get("a") is not None  # now the most recently used
+
+    _put(cache, tmp_path, "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    # Entries larger than the whole cache are not stored
+    _put(cache, tmp_path, "huge", payload=b"x" * 5000)
+    assert cache.get("huge") is None and cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ExtractionCache(root=str(tmp_path / "cache"), max_bytes=0)
+    _put(cache, tmp_path, "a")
+
+    assert cache.get("a") is None
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.fixture
+def pdf_extractor(tmp_path, monkeypatch):
+    pytest.importorskip("fitz")
+    pytest.importorskip("fastapi")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("pdf_extractor")
+    os.makedirs(module.EXTRACTED_IMAGES_DIR, exist_ok=True)
+    monkeypatch.setattr(module, "extraction_cache", ExtractionCache(root=str(tmp_path / "cache"),
+                                                                    max_bytes=64 * 1024 * 1024))
+    return module
+
+
+def test_extraction_is_replayed_until_options_or_version_change(pdf_extractor, tmp_path, monkeypatch):
+    from synthetic_corpus import build_corpus
+    from upload_spool import spool_path
+
+    path = tmp_path / "sheet.pdf"
+    path.write_bytes(build_corpus(seed=3, pages=1, kinds=["jpeg"])["jpeg"])
+    pdf = spool_path(str(path))
+
+    def extract(options=None):
+        return asyncio.run(pdf_extractor._extract_with_cache(pdf, None, options))
+
+    pages, rows, status = extract()
+    assert status == "miss" and rows
+    # Served files are restored from the cache, not required to still exist
+    for name in os.listdir(pdf_extractor.EXTRACTED_IMAGES_DIR):
+        os.remove(os.path.join(pdf_extractor.EXTRACTED_IMAGES_DIR, name))
+    replayed = REGISTRY.get_sample_value("extraction_pages_total", {"cache": "hit"}) or 0
+    assert extract() == (*json.loads(json.dumps([pages, rows])), "hit")
+    assert REGISTRY.get_sample_value("extraction_pages_total", {"cache": "hit"}) == replayed + len(pages)
+    assert os.listdir(pdf_extractor.EXTRACTED_IMAGES_DIR)
+
+    assert extract({"zoom": 2.0})[2] == "miss"
+    assert extract({"zoom": 2.0})[2] == "hit"
+
+    monkeypatch.setattr(pdf_extractor, "EXTRACTION_VERSION", pdf_extractor.EXTRACTION_VERSION + 1)
+    assert extract()[2] == "miss"
@@ -0,0 +1,122 @@
+"""
+Tests for the persistent extraction job queue: claims, leases, cancellation and attempt counting.
+"""
+import asyncio
+import importlib
+import types
+
+import pytest
+
+import job_queue
+from job_queue import JobQueueFullError, JobStore
+
+
+class _Pdf:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_queue, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return JobStore(root=str(tmp_path / "jobs"), max_queued=2, lease_seconds=60)
+
+
+def _create(store, tmp_path, name="sheet.pdf"):
+    path = tmp_path / name
+    path.write_bytes(b"%PDF-1.4 test")
+    return store.create(name, _Pdf(str(path), path.stat().st_size), None, {"zoom": 3.0})
+
+
+def test_claims_the_oldest_queued_job_once(store, tmp_path, clock):
+    first = _create(store, tmp_path, "a.pdf")
+    clock[0] += 1
+    second = _create(store, tmp_path, "b.pdf")
+    with pytest.raises(JobQueueFullError):
+        _create(store, tmp_path, "c.pdf")
+
+    claimed = store.claim()
+    assert claimed["job_id"] == first["job_id"]
+    assert (claimed["status"], claimed["attempts"], claimed["options"]) == ("running", 1, {"zoom": 3.0})
+    assert store.claim()["job_id"] == second["job_id"]
+    assert store.claim() is None
+
+
+def test_reclaims_a_job_whose_lease_expired(store, tmp_path, clock):
+    job = _create(store, tmp_path)
+    store.claim()
+
+    clock[0] += 30
+    assert store.heartbeat(job["job_id"]) == "running"
+    clock[0] += 59
+    assert store.claim() is None  # the heartbeat renewed the lease
+
+    clock[0] += 61
+    reclaimed = store.claim()
+    assert reclaimed["job_id"] == job["job_id"] and reclaimed["attempts"] == 2
+
+
+def test_cancel_stops_queued_and_running_jobs_only(store, tmp_path):
+    queued = _create(store, tmp_path, "a.pdf")
+    running = _create(store, tmp_path, "b.pdf")
+    store.cancel(queued["job_id"])
+    assert store.claim()["job_id"] == running["job_id"]
+
+    assert store.cancel(running["job_id"])
+    assert store.heartbeat(running["job_id"]) == "cancelled"
+    assert not store.complete(running["job_id"], {"images": []})
+    assert not store.cancel(running["job_id"])
+    assert store.stats()["cancelled"] == 2
+    assert not (tmp_path / "jobs" / "uploads" / f"{running['job_id']}.pdf").exists()
+
+
+def test_busy_requeues_do_not_count_as_attempts(store, tmp_path):
+    job = _create(store, tmp_path)
+    for _ in range(10):
+        assert store.claim()["attempts"] == 1
+        store.requeue(job["job_id"])
+    assert store.get(job["job_id"])["status"] == "queued"
+
+
+@pytest.fixture
+def pdf_extractor(store, tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("pdf_extractor")
+    monkeypatch.setattr(module, "job_store", store)
+    return module
+
+
+def test_fails_a_job_after_repeated_crashes(pdf_extractor, store, tmp_path, clock, monkeypatch):
+    job = _create(store, tmp_path)
+
+    async def busy(job):
+        raise pdf_extractor.EngineBusyError(retry_after=0)
+
+    async def crash(job):
+        raise asyncio.CancelledError  # the runner died mid-extraction
+
+    # A job that only waited for the engine keeps its attempts
+    monkeypatch.setattr(pdf_extractor, "_run_job", busy)
+    for _ in range(pdf_extractor.MAX_JOB_ATTEMPTS + 2):
+        asyncio.run(pdf_extractor._process_job(store.claim()))
+    assert store.get(job["job_id"])["status"] == "queued"
+
+    monkeypatch.setattr(pdf_extractor, "_run_job", crash)
+    for attempt in range(1, pdf_extractor.MAX_JOB_ATTEMPTS + 1):
+        claimed = store.claim()
+        assert claimed["attempts"] == attempt
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(pdf_extractor._process_job(claimed))
+        clock[0] += store.lease_seconds + 1
+
+    asyncio.run(pdf_extractor._process_job(store.claim()))
+    failed = store.get(job["job_id"])
+    assert failed["status"] == "failed" and "interrupted" in failed["error"]
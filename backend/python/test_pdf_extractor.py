@@ -0,0 +1,127 @@
+"""
+Tests for the PDF extractor's de-duplication of images within and across uploads.
+"""
+import asyncio
+import importlib
+import io
+import os
+import sys
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from extraction_cache import ExtractionCache  # noqa: E402
+from extraction_engine import ExtractionEngine  # noqa: E402
+from image_dedup import PersistentDedupIndex, content_hash  # noqa: E402
+from upload_spool import spool_path  # noqa: E402
+from synthetic_corpus import build_corpus  # noqa: E402
+
+
+@pytest.fixture
+def pdf_extractor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("pdf_extractor")
+    os.makedirs(module.EXTRACTED_IMAGES_DIR, exist_ok=True)
+    return module
+
+
+def _images(rows):
+    return [img for row in rows for img in row["tshirt_images"] + row["other_images"]]
+
+
+def test_drops_raster_crops_of_embedded_images_subjects(pdf_extractor):
+    corpus = build_corpus(seed=7, pages=1, kinds=["jpeg", "a3_scan"])
+
+    _, catalog_rows = pdf_extractor._extract_from_pdf(corpus["jpeg"])
+    _, scan_rows = pdf_extractor._extract_from_pdf(corpus["a3_scan"])
+
+    # Six product shots: the garment in each is not returned a second time as a crop
+    assert [img["source"] for img in _images(catalog_rows)] == ["embedded"] * 6
+    # One full-page scan: its six garments are still cropped out of it
+    scan_sources = [img["source"] for img in _images(scan_rows)]
+    assert scan_sources.count("embedded") == 1 and scan_sources.count("rasterized") == 6
+
+
+def _stored_image(pdf_extractor, name, phash):
+    with open(os.path.join(pdf_extractor.EXTRACTED_IMAGES_DIR, name), "wb") as f:
+        f.write(name.encode())
+    return {"filename": name, "path": f"/extracted_images/{name}", "content_hash": name,
+            "phash": phash, "mean_rgb": (120, 40, 40), "derivatives": {}}
+
+
+def test_upload_index_uses_the_requests_dedup_distance(pdf_extractor, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_extractor, "_upload_dedup_index", PersistentDedupIndex(str(tmp_path / "dedup.sqlite")))
+    earlier = _stored_image(pdf_extractor, "earlier.png", "f0f0f0f0f0f0f0f0")
+    pdf_extractor._PageMerger().add({"page": {}, "row": {"other_images": [earlier]}})
+
+    def merge(profile, name):
+        # One bit away from the earlier upload's image
+        img = _stored_image(pdf_extractor, name, "f0f0f0f0f0f0f0f1")
+        merger = pdf_extractor._PageMerger(pdf_extractor._request_options(profile=profile))
+        return merger.add({"page": {}, "row": {"other_images": [img]}})["row"]["other_images"][0]["filename"]
+
+    assert merge("balanced", "near-match.png") == "earlier.png"
+    assert merge("fast-preview", "exact-only.png") == "exact-only.png"
+
+
+def _garment_sheet(image_format, size):
+    """One page with a product shot of the same garment, in the given format and pixel size."""
+    picture = Image.new("RGB", (600, 600), (230, 230, 230))
+    ImageDraw.Draw(picture).polygon(
+        [(150, 100), (250, 60), (350, 60), (450, 100), (520, 200), (440, 240), (420, 200),
+         (420, 540), (180, 540), (180, 200), (160, 240), (80, 200)], fill=(160, 40, 50))
+    buf = io.BytesIO()
+    picture.resize((size, size)).save(buf, image_format)
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(100, 100, 400, 400), stream=buf.getvalue())
+    return doc.tobytes()
+
+
+def test_upload_index_matches_describe_the_file_served(pdf_extractor, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_extractor, "_upload_dedup_index", PersistentDedupIndex(str(tmp_path / "dedup.sqlite")))
+    _, first_rows = pdf_extractor._extract_from_pdf(_garment_sheet("JPEG", 600))
+    # The same garment as a smaller PNG: near-identical, so the earlier JPEG is served
+    _, second_rows = pdf_extractor._extract_from_pdf(_garment_sheet("PNG", 500))
+
+    [first], [second] = _images(first_rows), _images(second_rows)
+    assert second["filename"] == first["filename"]
+    path = os.path.join(pdf_extractor.EXTRACTED_IMAGES_DIR, second["filename"])
+    with open(path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as image:
+        assert (second["width"], second["height"], second["format"]) == (*image.size, image.format) == \
+            (600, 600, "JPEG")
+    assert second["size_kb"] == len(data) / 1024
+    assert second["content_hash"] == content_hash(data) == first["content_hash"]
+
+
+def test_documents_keep_one_page_per_worker_in_flight(pdf_extractor, tmp_path, monkeypatch):
+    engine = ExtractionEngine(max_workers=2)
+    monkeypatch.setattr(pdf_extractor, "extraction_engine", engine)
+    monkeypatch.setattr(pdf_extractor, "extraction_cache", ExtractionCache(max_bytes=0))
+    running, peak = set(), []
+
+    async def run(fn, pdf_path, index, *args):
+        running.add(index)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (index % 3))  # pages finish out of order
+        running.discard(index)
+        return {"page": {"page_number": index + 1}, "row": {"tshirt_images": [], "other_images": []}}
+
+    monkeypatch.setattr(engine, "run", run)
+    doc = fitz.open()
+    for _ in range(7):
+        doc.new_page().insert_text((72, 72), "Line sheet")
+    path = tmp_path / "sheet.pdf"
+    path.write_bytes(doc.tobytes())
+
+    pages, _, _ = asyncio.run(pdf_extractor._extract_with_cache(spool_path(str(path)), None, {"ocr": False}))
+
+    assert [page["page_number"] for page in pages] == list(range(1, 8))
+    assert max(peak) == 2
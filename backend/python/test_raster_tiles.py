@@ -0,0 +1,64 @@
+"""
+Tests for tiled contour detection: shapes cut by tile borders are found once, where a whole-page render finds them.
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from contour_search import find_candidates  # noqa: E402
+from garment_classifier import get_garment_classifier  # noqa: E402
+from observability import StageTimer  # noqa: E402
+from raster_tiles import page_contours  # noqa: E402
+from synthetic_corpus import _TSHIRT  # noqa: E402
+
+
+@pytest.fixture
+def options(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return dict(importlib.import_module("pdf_extractor").DEFAULT_EXTRACTION_OPTIONS)
+
+
+def _draw_tshirt(page, x0, y0, size):
+    s = size / 400
+    outline = [fitz.Point(x0 + x * s, y0 + y * s) for x, y in _TSHIRT + _TSHIRT[:1]]
+    page.draw_polyline(outline, color=(0, 0, 0), fill=(0.7, 0.2, 0.2), width=1.5)
+
+
+def _candidates(page, options, memory_mb):
+    zoom = options["detect_zoom"]
+    scale = zoom / options["zoom"]
+    min_size = options["min_raster_size"] * scale
+    contours, hierarchy, raster = page_contours(page, zoom, {**options, "raster_memory_mb": memory_mb},
+                                                StageTimer(), min_size)
+    candidates, _ = find_candidates(
+        contours, hierarchy, get_garment_classifier(), min_size=min_size,
+        max_width=raster["width"] * options["max_page_fraction"],
+        max_height=raster["height"] * options["max_page_fraction"],
+        min_area=options["min_contour_area"] * scale ** 2, hu_threshold=options["match_threshold"],
+        fourier_threshold=options["fourier_threshold"],
+    )
+    return sorted(c["bbox"] for c in candidates), raster
+
+
+def test_shapes_across_tile_borders_are_found_once(options):
+    page = fitz.open().new_page(width=2000, height=1600)
+    # At 12 MB the 3000x2400 px detection render is 5x3 tiles with 600x800 px cores
+    _draw_tshirt(page, 300, 250, 1200)   # spans many tiles, wider than the halo: stitched
+    _draw_tshirt(page, 1550, 200, 300)   # across the x=2400 px border, seen whole within a halo
+    _draw_tshirt(page, 1600, 1000, 300)  # across the x=2400 px and y=1600 px borders
+
+    whole, whole_raster = _candidates(page, options, memory_mb=4096)
+    tiled, tiled_raster = _candidates(page, options, memory_mb=12)
+
+    assert whole_raster["tiles"] == 1
+    assert (tiled_raster["tiles"], tiled_raster["stitched"]) == (15, 1)
+    assert len(whole) == len(tiled) == 3
+    for a, b in zip(whole, tiled):
+        assert max(abs(u - v) for u, v in zip(a, b)) <= 2
@@ -0,0 +1,270 @@
+"""
+Tests for the parallel S3 upload stage, against moto's in-memory S3.
+"""
+import importlib
+import io
+import sys
+
+import pytest
+
+moto = pytest.importorskip("moto")
+fitz = pytest.importorskip("fitz")
+
+from botocore.exceptions import ClientError
+
+import s3_uploader
+from presign_cache import PresignCache
+from readiness import Readiness
+from s3_uploader import S3Uploader, UploadIndex, content_key, make_s3_client
+
+BUCKET = "test-line-sheets"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("S3_BUCKET_NAME", BUCKET)
+    with moto.mock_aws():
+        client = make_s3_client("testing", "testing", "us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _sample_pdf(pages=2, images_per_page=2, colour=lambda page_num, i: (40 * page_num, 60 * i, 200)):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        for i in range(images_per_page):
+            pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+            pix.set_rect(pix.irect, colour(page_num, i))
+            page.insert_image(fitz.Rect(50 + 100 * i, 50, 130 + 100 * i, 130), pixmap=pix)
+    return doc.tobytes()
+
+
+def _post_pdf(client, pdf_bytes):
+    return client.post("/api/extract-pdf", data={"pdf": (io.BytesIO(pdf_bytes), "sheet.pdf")},
+                       content_type="multipart/form-data")
+
+
+@pytest.fixture
+def image_extraction(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(s3_uploader, "UPLOAD_INDEX_PATH", str(tmp_path / "index.sqlite"))
+    sys.modules.pop("image_extraction", None)
+    return importlib.import_module("image_extraction")
+
+
+def test_uploads_small_and_multipart_objects(s3):
+    uploader = S3Uploader(s3, BUCKET, max_workers=4, multipart_threshold=5 * 1024 * 1024)
+    batch = uploader.batch()
+    large = b"x" * (6 * 1024 * 1024)
+    batch.add("a/small.png", b"small", "image/png", meta={"key": "a/small.png"})
+    batch.add("a/large.jpeg", large, "image/jpeg", meta={"key": "a/large.jpeg"})
+
+    uploaded, failed = batch.wait()
+
+    assert [m["key"] for m in uploaded] == ["a/small.png", "a/large.jpeg"]
+    assert failed == []
+    assert batch.upload_ms > 0
+    assert s3.get_object(Bucket=BUCKET, Key="a/large.jpeg")["Body"].read() == large
+    assert s3.head_object(Bucket=BUCKET, Key="a/small.png")["ContentType"] == "image/png"
+    assert uploader.stats()["multipart_uploads"] == 1
+
+
+class _FlakyClient:
+    """Delegates to a real client after failing the first `failures` put_object calls."""
+
+    def __init__(self, client, failures, code="SlowDown"):
+        self.client = client
+        self.failures = failures
+        self.code = code
+
+    def put_object(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ClientError({"Error": {"Code": self.code}, "ResponseMetadata": {"HTTPStatusCode": 503}},
+                              "PutObject")
+        return self.client.put_object(**kwargs)
+
+
+def test_retries_throttled_uploads(s3):
+    uploader = S3Uploader(_FlakyClient(s3, failures=2), BUCKET, attempts=3, backoff=0.01)
+    batch = uploader.batch()
+    batch.add("retry.png", b"data", "image/png", meta={"key": "retry.png"})
+
+    uploaded, failed = batch.wait()
+
+    assert len(uploaded) == 1 and not failed
+    assert uploader.stats()["retries"] == 2
+    assert s3.get_object(Bucket=BUCKET, Key="retry.png")["Body"].read() == b"data"
+
+
+def test_gives_up_after_all_attempts(s3):
+    uploader = S3Uploader(_FlakyClient(s3, failures=5), BUCKET, attempts=2, backoff=0.01)
+    batch = uploader.batch()
+    batch.add("lost.png", b"data", "image/png", meta={"key": "lost.png"})
+
+    uploaded, failed = batch.wait()
+
+    assert uploaded == [] and failed[0][0]["key"] == "lost.png"
+    assert uploader.stats()["failures"] == 1
+
+
+def test_batch_and_index_skip_stored_keys(s3, tmp_path):
+    uploader = S3Uploader(s3, BUCKET, index=UploadIndex(str(tmp_path / "index.sqlite")))
+    key, digest = content_key("extracted_images", b"same bytes", "png")
+    assert key == f"extracted_images/{digest[:2]}/{digest}.png"
+
+    batch = uploader.batch()
+    assert batch.add(key, b"same bytes", "image/png", meta={"n": 1})
+    assert not batch.add(key, b"same bytes", "image/png", meta={"n": 2})
+    assert len(batch.wait()[0]) == 2
+
+    later = uploader.batch()
+    assert not later.add(key, b"same bytes", "image/png", meta={"n": 3})
+    later.repeat(key, len(b"same bytes"), meta={"n": 4})
+    assert later.wait()[0] == [{"n": 3}, {"n": 4}]
+    assert uploader.stats()["uploads"] == 1 and uploader.stats()["skipped"] == 3
+
+
+def test_extract_pdf_endpoint_uploads_every_image(s3, image_extraction):
+    client = image_extraction.app.test_client()
+
+    response = _post_pdf(client, _sample_pdf())
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [(img["page"], img["index"]) for img in data["images"]] == [(1, 1), (1, 2), (2, 1), (2, 2)]
+    assert data["upload_failures"] == 0
+    assert "upload_ms" in data
+    for img in data["images"]:
+        s3.head_object(Bucket=BUCKET, Key=img["key"])
+
+
+def test_reuploads_and_repeated_images_skip_put_object(s3, image_extraction):
+    client = image_extraction.app.test_client()
+    # The same swatch on both pages
+    pdf_bytes = _sample_pdf(colour=lambda page_num, i: (200, 60 * i, 40))
+
+    first = _post_pdf(client, pdf_bytes).get_json()
+    second = _post_pdf(client, pdf_bytes).get_json()
+
+    keys = [img["key"] for img in first["images"]]
+    assert len(set(keys)) == 2 and first["deduplicated"] == 2
+    assert [img["key"] for img in second["images"]] == keys
+    assert second["deduplicated"] == 4
+    assert image_extraction.s3_uploader.stats()["uploads"] == 2
+    assert s3.list_objects_v2(Bucket=BUCKET)["KeyCount"] == 2
+
+
+def test_images_shared_across_pages_are_read_once(s3, image_extraction, monkeypatch):
+    client = image_extraction.app.test_client()
+    doc = fitz.open(stream=_sample_pdf(pages=1, images_per_page=1), filetype="pdf")
+    xref = doc[0].get_images()[0][0]
+    for _ in range(2):
+        doc.new_page().insert_image(fitz.Rect(50, 50, 130, 130), xref=xref)
+    extracted = []
+    monkeypatch.setattr(fitz.Document, "extract_image",
+                        lambda self, x, original=fitz.Document.extract_image: extracted.append(x) or original(self, x))
+
+    data = _post_pdf(client, doc.tobytes()).get_json()
+
+    assert extracted == [xref]
+    assert [(img["page"], img["deduplicated"]) for img in data["images"]] == [(1, False), (2, True), (3, True)]
+    assert len({img["key"] for img in data["images"]}) == 1
+    assert image_extraction.s3_uploader.stats()["uploads"] == 1
+
+
+def test_presign_cache_reuses_urls_within_a_window(s3):
+    now = [1000.0]
+    cache = PresignCache(s3.generate_presigned_url, BUCKET, window=300, clock=lambda: now[0])
+
+    url, max_age = cache.get("a.png", expires_in=3600)
+    assert cache.get("a.png", expires_in=3600)[0] == url
+    assert max_age == 200
+    assert cache.get("a.png", expires_in=3600, content_type="image/png")[0] != url
+
+    # A new window signs again
+    now[0] = 1300.0
+    cache.get("a.png", expires_in=3600)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["signed"]) == (1, 3, 3)
+
+
+def test_presign_batch_endpoint(s3, image_extraction):
+    client = image_extraction.app.test_client()
+    keys = ["extracted_images/aa/a.png", "extracted_images/bb/b.png"]
+
+    response = client.post("/api/images/presign", json={"keys": keys + keys[:1], "expires_in": 600})
+    again = client.post("/api/images/presign", json={"keys": keys})
+
+    assert response.status_code == 200
+    urls = response.get_json()["urls"]
+    assert sorted(urls) == sorted(keys) and all(BUCKET in url for url in urls.values())
+    assert client.post("/api/images/presign", json={"keys": "a.png"}).status_code == 400
+    redirect = client.get(f"/api/image/{keys[0]}?expires_in=600")
+    assert redirect.status_code == 302 and redirect.headers["Location"] == urls[keys[0]]
+    assert redirect.headers["Cache-Control"].startswith("private, max-age=")
+    assert again.status_code == 200
+    assert client.get("/stats").get_json()["presign"]["hits"] == 1
+    metrics = client.get("/metrics").get_data(as_text=True)
+    for sample in ('presign_cache_lookups_total{result="hit"}', 'presign_cache_lookups_total{result="miss"}',
+                   "presign_sign_seconds_count"):
+        assert sample in metrics
+
+
+def test_uploads_derivatives_once_per_image(s3, image_extraction, monkeypatch):
+    client = image_extraction.app.test_client()
+    doc = fitz.open()
+    page = doc.new_page()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1200, 600), False)
+    pix.set_rect(pix.irect, (30, 90, 160))
+    page.insert_image(fitz.Rect(50, 50, 450, 250), pixmap=pix)
+    pdf_bytes = doc.tobytes()
+
+    first = _post_pdf(client, pdf_bytes).get_json()
+    derivatives = first["images"][0]["derivatives"]
+    assert {name: (d["width"], d["height"]) for name, d in derivatives.items()} == \
+        {"thumb": (256, 128), "preview": (1024, 512)}
+    for d in derivatives.values():
+        assert d["key"].startswith(first["images"][0]["key"].rsplit(".", 1)[0] + "_")
+        assert s3.head_object(Bucket=BUCKET, Key=d["key"])["ContentType"] == d["type"]
+
+    # Stored derivatives are not encoded again
+    monkeypatch.setattr(image_extraction, "make_derivatives", lambda *args: pytest.fail("re-encoded"))
+    second = _post_pdf(client, pdf_bytes).get_json()
+    assert second["images"][0]["derivatives"] == derivatives
+    assert image_extraction.s3_uploader.stats()["uploads"] == 3
+
+
+def test_metrics_endpoint_reports_stages_and_uploads(s3, image_extraction):
+    client = image_extraction.app.test_client()
+    _post_pdf(client, _sample_pdf())
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200 and response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    for stage in ("open", "embedded_extract", "s3_put", "upload_wait"):
+        assert f'extraction_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/extract-pdf",status="200"}' in text
+    assert 's3_objects_total{outcome="uploaded"}' in text
+
+
+def test_readiness_probes_check_the_bucket_lazily(s3, image_extraction):
+    client = image_extraction.app.test_client()
+
+    assert client.get("/livez").status_code == 200
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and ready.get_json()["checks"]["s3"]["detail"] == BUCKET
+
+    # Failures are retried sooner than successes are re-checked
+    now, calls = [0.0], []
+    readiness = Readiness(ttl=30, retry=5, clock=lambda: now[0])
+    readiness.add("s3", lambda: calls.append(1) or image_extraction.check_s3())
+    s3.delete_bucket(Bucket=BUCKET)
+    assert not readiness.ok("s3") and readiness.status()["ready"] is False
+    now[0] = 6.0
+    s3.create_bucket(Bucket=BUCKET)
+    assert readiness.ok("s3") and readiness.ok("s3") and len(calls) == 2
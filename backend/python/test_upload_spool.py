@@ -0,0 +1,41 @@
+"""
+Tests for spooling uploads to disk: hashing and the header and size checks.
+"""
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+from upload_spool import UploadRejectedError, spool_upload
+
+PDF = b"%PDF-1.4\n" + b"x" * 5000
+
+
+class _Upload:
+    """The part of FastAPI's UploadFile that spooling uses."""
+
+    def __init__(self, file):
+        self.file = file
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+
+def test_spools_and_hashes_uploads(tmp_path):
+    with asyncio.run(spool_upload(_Upload(io.BytesIO(PDF)), directory=str(tmp_path))) as spooled:
+        assert (spooled.size, spooled.sha256) == (len(PDF), hashlib.sha256(PDF).hexdigest())
+        with open(spooled.path, "rb") as f:
+            assert f.read() == PDF
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("data, status", [(b"GIF89a" + b"x" * 2000, 400), (PDF, 413)])
+def test_rejected_uploads_leave_nothing_behind(tmp_path, data, status):
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    with pytest.raises(UploadRejectedError) as err:
+        asyncio.run(spool_upload(_Upload(io.BytesIO(data)), max_bytes=4096, directory=str(spool_dir)))
+    assert err.value.status_code == status
+    assert os.listdir(spool_dir) == []
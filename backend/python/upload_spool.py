@@ -0,0 +1,129 @@
+"""
+Streaming ingest of uploaded PDFs.
+
+`await upload.read()` pulls the whole PDF into memory, and the extractor then
+wrote those bytes back to a temporary file so PyMuPDF and the worker
+processes could open it by path. Instead, the upload is copied to a spool
+file in fixed-size chunks. While the chunks stream past, the SHA-256 (the
+result cache key) is computed, the `%PDF-` header is checked on the first
+chunk and the size limit is enforced. Memory per request stays at one chunk
+whatever the size of the PDF, and the extractor opens the spool file by path.
+
+Starlette has already spooled a large multipart file to an anonymous
+temporary file by the time the handler runs, so its bytes are written twice.
+The copy is deliberate: the spool file has to outlive the request, for jobs
+and streamed responses, and the anonymous file cannot be linked by name.
+
+Configuration (environment variables):
+    MAX_UPLOAD_MB     Largest PDF accepted, in MB (default: 200)
+    UPLOAD_SPOOL_DIR  Directory for spool files (default: the system temp directory)
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Any, Optional
+
+CHUNK_SIZE = 1024 * 1024
+# The PDF header may be preceded by junk, but must start within the first KB
+HEADER_WINDOW = 1024
+PDF_MAGIC = b"%PDF-"
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", 200)) * 1024 * 1024)
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+class UploadRejectedError(ValueError):
+    """The upload is not an acceptable PDF. `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpooledPdf:
+    """A PDF on disk with its size and SHA-256, removed by `remove()` or on leaving a `with` block."""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def remove(self) -> None:
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "SpooledPdf":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.remove()
+
+
+def _check_header(head: bytes) -> None:
+    if PDF_MAGIC not in head[:HEADER_WINDOW]:
+        raise UploadRejectedError("File is not a PDF")
+
+
+def _too_large(max_bytes: int) -> UploadRejectedError:
+    return UploadRejectedError(f"PDF is larger than {max_bytes // (1024 * 1024)} MB", status_code=413)
+
+
+async def spool_upload(upload: Any, max_bytes: int = MAX_UPLOAD_BYTES,
+                       directory: Optional[str] = SPOOL_DIR) -> SpooledPdf:
+    """
+    Copy an upload (anything with an async `read(size)`, such as FastAPI's
+    UploadFile) to a spool file chunk by chunk.
+
+    Raises:
+        UploadRejectedError: if the file does not start like a PDF (400) or
+        exceeds `max_bytes` (413); nothing is left on disk
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            head = b""
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < HEADER_WINDOW:
+                    head += chunk[:HEADER_WINDOW]
+                    if len(head) >= HEADER_WINDOW:
+                        _check_header(head)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+            _check_header(head)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledPdf(path, size, digest.hexdigest())
+
+
+def spool_path(path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledPdf:
+    """
+    Wrap a PDF already on disk (a job upload, a file from an archive) without
+    copying it, hashing it in chunks. The caller decides whether to `remove()` it.
+
+    Raises:
+        UploadRejectedError: as `spool_upload`
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER_WINDOW))
+        f.seek(0)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+    return SpooledPdf(path, size, digest.hexdigest())